@@ -0,0 +1,240 @@
+"""Offline microbenchmarks of the request pipeline building blocks.
+
+Nothing here needs a database: handlers run against the in-memory connection
+of the tests. Results can be saved as a JSON baseline and later runs compared
+against it, see the `microbench` command in `cli.py`; it runs from a checkout,
+this isn't installed with the package.
+"""
+import asyncio
+import platform
+import statistics
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Iterator, Sequence, cast
+from unittest.mock import patch
+
+import msgspec
+from quart import session
+from returns.future import FutureResult
+from returns.io import IOSuccess
+from returns.result import Success
+
+from yet_another_flask_template.app import app
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.context import Context, app_context, quartify, read_only
+from yet_another_flask_template.database import PooledEngine, engines
+from yet_another_flask_template.modules.core.auth import AuthorizedContext, authorized_context, get_claims_from_token, make_token, user_claims
+from yet_another_flask_template.modules.core.mappers import entry_decoder, user_decoder
+from yet_another_flask_template.modules.core.pagination import to_list_response
+from yet_another_flask_template.modules.core.queries import get_categories
+from yet_another_flask_template.modules.core.schemas import CreateItemResponse, Entry, ListResponse, NewEntryRequest, PageQuery, User
+from yet_another_flask_template.serialization import decode_json, decode_json_items
+from yet_another_flask_template.types import QuartResponse
+
+from tests.fakes import FakeConnection, FakePool, FakeResult
+
+
+DEFAULT_ROWS = (10_000, 100_000, 1_000_000)
+DEFAULT_THRESHOLD = 0.25
+
+
+class BenchResult(msgspec.Struct):
+    number: int
+    rounds: int
+    median_ns: float
+    min_ns: float
+
+
+class BenchReport(msgspec.Struct):
+    python: str
+    machine: str
+    created: float
+    results: dict[str, BenchResult]
+
+
+@dataclass(frozen=True)
+class Benchmark:
+    """`fn(number)` runs the measured operation `number` times"""
+    name: str
+    fn: Callable[[int], Any]
+    number: int
+    rounds: int = 5
+    is_async: bool = False
+
+
+@dataclass(frozen=True)
+class Comparison:
+    name: str
+    baseline_ns: float
+    current_ns: float
+
+    @property
+    def change(self) -> float:
+        return self.current_ns / self.baseline_ns - 1
+
+
+def repeat(fn: Callable[[], Any]) -> Callable[[int], None]:
+    def run(number: int) -> None:
+        for _ in range(number):
+            fn()
+
+    return run
+
+
+class UnrecordedConnection(FakeConnection):
+    """Doesn't compile the statements to SQL and keep them, that would be most of what's measured"""
+
+    async def execute(self, statement: Any, parameters: Any = None) -> FakeResult:
+        return FakeResult(self.responder("", parameters))
+
+
+@contextmanager
+def fake_database(rows: list[tuple]) -> Iterator[None]:
+    pooled = cast(PooledEngine, FakePool(UnrecordedConnection(lambda sql, parameters: rows)))
+
+    with patch.object(engines, "get", lambda config, host=None: Success(pooled)):
+        yield
+
+
+@app_context
+def _noop_handler(ctx: Context) -> QuartResponse:
+    return FutureResult.from_value(CreateItemResponse(id=1))
+
+
+@app_context
+@read_only
+def _query_handler(ctx: Context) -> QuartResponse:
+    page = PageQuery(limit=10)
+    return get_categories(ctx, page).map(to_list_response(page))
+
+
+@authorized_context
+@read_only
+def _authorized_handler(ctx: AuthorizedContext) -> QuartResponse:
+    return FutureResult.from_value(CreateItemResponse(id=ctx.user.id))
+
+
+def handler_benchmark(
+    handler: Callable[[], Awaitable[Any]],
+    rows: list[tuple],
+    token: str | None = None,
+) -> Callable[[int], Awaitable[None]]:
+    async def run(number: int) -> None:
+        with fake_database(rows):
+            async with app.test_request_context("/", method="GET"):
+                if token is not None:
+                    session["token"] = token
+
+                for _ in range(number):
+                    await handler()
+
+    return run
+
+
+def collect_benchmarks(rows: Sequence[int] = DEFAULT_ROWS) -> list[Benchmark]:
+    config = Config()
+    token_ctx = type("TokenContext", (), {"conf": config})()
+    user = User(id=1, username="user", secure_password="x" * 60, email="user@example.com")
+    claims = user_claims(user)
+    token = make_token(token_ctx, claims)
+
+    entry_json = msgspec.json.encode(NewEntryRequest(title="title", description="description " * 10, links="https://example.com", keywords="a b c"))
+    entries_json = b"[" + b",".join([entry_json] * 1000) + b"]"
+    entries = [
+        Entry(id=i, title="title", description="description " * 10, keywords="a b c", links="https://example.com", category_id=1, is_deleted=False)
+        for i in range(1000)
+    ]
+    category_rows = [(i, "image.png", "name", "description", None) for i in range(10)]
+
+    benchmarks = [
+        Benchmark("decode_json/entry", repeat(lambda: decode_json(NewEntryRequest, entry_json)), number=10_000),
+        Benchmark("decode_json_items/1000", repeat(lambda: decode_json_items(NewEntryRequest, entries_json)), number=100),
+        Benchmark("quartify/1000_entries", repeat(lambda: quartify(IOSuccess(ListResponse(results=entries)))), number=100),
+        Benchmark("jsonify/1000_entries", repeat(lambda: app.json.response(entries)), number=100),
+        Benchmark("user_decoder/decode", repeat(lambda: user_decoder.decode((1, "user", "x" * 60, "user@example.com"))), number=100_000),
+        Benchmark("make_token", repeat(lambda: make_token(token_ctx, claims)), number=10_000),
+        Benchmark("get_claims_from_token", repeat(lambda: get_claims_from_token(token_ctx, token)), number=10_000),
+        Benchmark("app_context/noop", handler_benchmark(_noop_handler, []), number=1000, is_async=True),
+        Benchmark("app_context/query", handler_benchmark(_query_handler, category_rows), number=1000, is_async=True),
+        Benchmark("authorized_context/noop", handler_benchmark(_authorized_handler, [], token), number=1000, is_async=True),
+    ]
+
+    for count in rows:
+        records = [(i, "title", "description", "a b c", "https://example.com", 1, False) for i in range(count)]
+        benchmarks.append(
+            Benchmark(
+                f"entry_decoder/decode_all/{count}",
+                repeat(lambda records=records: entry_decoder.decode_all(records)),
+                number=max(1, 100_000 // count),
+                rounds=3 if count >= 1_000_000 else 5,
+            )
+        )
+
+    return benchmarks
+
+
+def run_benchmark(bench: Benchmark, loop: asyncio.AbstractEventLoop) -> BenchResult:
+    def run_once() -> float:
+        started = time.perf_counter_ns()
+        if bench.is_async:
+            loop.run_until_complete(bench.fn(bench.number))
+        else:
+            bench.fn(bench.number)
+        return (time.perf_counter_ns() - started) / bench.number
+
+    run_once()  # warm up caches and lazily built state
+    timings = [run_once() for _ in range(bench.rounds)]
+
+    return BenchResult(
+        number=bench.number,
+        rounds=bench.rounds,
+        median_ns=statistics.median(timings),
+        min_ns=min(timings),
+    )
+
+
+def run(
+    benchmarks: Sequence[Benchmark],
+    on_result: Callable[[str, BenchResult], None] | None = None,
+) -> BenchReport:
+    loop = asyncio.new_event_loop()
+    results: dict[str, BenchResult] = {}
+
+    try:
+        for bench in benchmarks:
+            results[bench.name] = run_benchmark(bench, loop)
+            if on_result is not None:
+                on_result(bench.name, results[bench.name])
+    finally:
+        loop.close()
+
+    return BenchReport(
+        python=platform.python_version(),
+        machine=platform.machine(),
+        created=time.time(),
+        results=results,
+    )
+
+
+def save_report(report: BenchReport, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(msgspec.json.format(msgspec.json.encode(report)))
+
+
+def load_report(path: str) -> BenchReport:
+    with open(path, "rb") as f:
+        return msgspec.json.decode(f.read(), type=BenchReport)
+
+
+def compare(baseline: BenchReport, current: BenchReport) -> list[Comparison]:
+    """Compares medians of the benchmarks present in both reports"""
+    return [
+        Comparison(name, baseline.results[name].median_ns, result.median_ns)
+        for name, result in current.results.items()
+        if name in baseline.results
+    ]
+
+
+def regressions(comparisons: Sequence[Comparison], threshold: float = DEFAULT_THRESHOLD) -> list[Comparison]:
+    return [c for c in comparisons if c.change > threshold]
@@ -0,0 +1,9 @@
+#!/bin/sh
+set -e
+
+# Metrics of the previous run's processes would be summed up with the new ones
+METRICS_DIR="${PROMETHEUS_MULTIPROC_DIR:-/server/.metrics}"
+mkdir -p "${METRICS_DIR}"
+find "${METRICS_DIR}" -mindepth 1 -delete
+
+exec /usr/local/bin/docker-entrypoint.sh "$@"
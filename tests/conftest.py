@@ -0,0 +1,41 @@
+import pytest
+from returns.result import Success
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import engines
+from yet_another_flask_template.modules.core.auth import make_token, token_cache, user_claims
+from yet_another_flask_template.modules.core.schemas import User
+
+from .fakes import FakeConnection, FakeContext, FakePool
+
+USER = User(id=1, username="user", secure_password="", email="user@example.com")
+
+
+@pytest.fixture
+def conn() -> FakeConnection:
+    return FakeConnection()
+
+
+@pytest.fixture
+def ctx(conn: FakeConnection) -> FakeContext:
+    return FakeContext(conn, conn)
+
+
+@pytest.fixture
+def database(monkeypatch: pytest.MonkeyPatch, conn: FakeConnection) -> FakeConnection:
+    """Every pool the app asks for hands out `conn`"""
+    monkeypatch.setattr(engines, "get", lambda config, host=None: Success(FakePool(conn)))
+    return conn
+
+
+@pytest.fixture
+def token() -> str:
+    token_cache.clear()
+    return make_token(FakeContext(FakeConnection(), FakeConnection(), Config()), user_claims(USER))
+
+
+@pytest.fixture
+def app(database: FakeConnection):
+    from yet_another_flask_template.app import app
+
+    return app
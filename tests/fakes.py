@@ -0,0 +1,121 @@
+"""In-memory stand-ins for the database connections, the tests run without Postgres"""
+import asyncio
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from returns.io import IOResult
+from returns.unsafe import unsafe_perform_io
+
+from yet_another_flask_template.config import Config
+
+# Gets the statement as SQL and its parameters, returns the rows or raises
+Responder = Callable[[str, Any], list[tuple]]
+
+
+class FakeResult:
+    # No driver cursor, `fetch_structs` falls back to `fetchall`
+    cursor = None
+
+    def __init__(self, rows: list[tuple]) -> None:
+        self.rows = rows
+        # Rows a DML statement changed, the responder returns one per row
+        self.rowcount = len(rows)
+
+    def close(self) -> None:
+        pass
+
+    def scalars(self) -> list[Any]:
+        return [row[0] for row in self.rows]
+
+    def scalar(self) -> Any:
+        return self.rows[0][0] if self.rows else None
+
+    def first(self) -> Any:
+        return self.rows[0] if self.rows else None
+
+    def fetchone(self) -> Any:
+        return self.first()
+
+    def fetchall(self) -> list[tuple]:
+        return self.rows
+
+    def __iter__(self):
+        return iter(self.rows)
+
+
+class FakeConnection:
+    """Answers every statement through `responder` and records them"""
+
+    def __init__(self, responder: Responder = lambda sql, parameters: []) -> None:
+        self.responder = responder
+        self.statements: list[tuple[str, Any]] = []
+        self.options: dict[str, Any] = {}
+        self.savepoints = 0
+        self.rolled_back = 0
+        self.commits = 0
+        self.closed = 0
+
+    async def execute(self, statement: Any, parameters: Any = None) -> FakeResult:
+        sql = str(statement)
+        if parameters is None and hasattr(statement, "compile"):
+            # Values bound in the statement itself, e.g. by `.values()` or `==`
+            parameters = statement.compile().params
+        self.statements.append((sql, parameters))
+        return FakeResult(self.responder(sql, parameters))
+
+    @asynccontextmanager
+    async def begin_nested(self) -> AsyncIterator[None]:
+        self.savepoints += 1
+        try:
+            yield
+        except Exception:
+            self.rolled_back += 1
+            raise
+
+    async def execution_options(self, **options: Any) -> "FakeConnection":
+        self.options.update(options)
+        return self
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+    async def close(self) -> None:
+        self.closed += 1
+
+    def sql(self) -> list[str]:
+        return [sql for sql, _ in self.statements]
+
+
+class FakePool:
+    """Stands in for `PooledEngine`, every checkout gets the same connection"""
+
+    def __init__(self, conn: FakeConnection) -> None:
+        self.conn = conn
+
+    async def connect(self) -> FakeConnection:
+        return self.conn
+
+
+@dataclass(frozen=True)
+class FakeContext:
+    db_conn: FakeConnection
+    replica_conn: FakeConnection
+    conf: Config = field(default_factory=Config)
+    session: dict[str, Any] = field(default_factory=dict)
+
+
+def run(awaitable: Awaitable[Any]) -> Any:
+    """Runs a `FutureResult` or coroutine to its (unwrapped from IO) result"""
+    async def wait() -> Any:
+        return await awaitable
+
+    result = asyncio.run(wait())
+    return unsafe_perform_io(result) if isinstance(result, IOResult) else result
+
+
+async def sign_in(client: Any, token: str) -> Any:
+    """Puts the auth token into the session of a Quart test client"""
+    async with client.session_transaction() as session:
+        session["token"] = token
+    return client
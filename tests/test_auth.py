@@ -0,0 +1,165 @@
+import asyncio
+import time
+from collections import namedtuple
+
+from prometheus_client import REGISTRY
+from returns.pipeline import is_successful
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.modules.core.auth import (
+    VerifiedToken,
+    fresh_claims,
+    get_claims_from_token,
+    make_token,
+    secure_password,
+    verify_token,
+)
+from yet_another_flask_template.modules.core.queries import change_user_password, deactivate_user, get_user_by_name
+from yet_another_flask_template.modules.core.schemas import UserClaims
+
+from .fakes import FakeConnection, FakeContext, run, sign_in
+
+CLAIMS = UserClaims(id=1, username="user", email="user@example.com", token_version=3)
+State = namedtuple("State", "token_version is_active")
+Updated = namedtuple("Updated", "id token_version")
+UserRow = namedtuple("UserRow", "id username password email token_version")
+
+
+def state_responder(token_version: int, is_active: bool):
+    return lambda sql, parameters: [State(token_version, is_active)]
+
+
+def expired(auth_time: float) -> VerifiedToken:
+    now = time.time()
+    return VerifiedToken(CLAIMS, now - 120, now - 60, int(auth_time))
+
+
+def test_token_round_trip():
+    ctx = FakeContext(FakeConnection(), FakeConnection())
+
+    verified = verify_token(ctx, make_token(ctx, CLAIMS, auth_time=1000)).unwrap()
+
+    assert verified.claims == CLAIMS
+    assert verified.auth_time == 1000
+    assert verified.expires_at - verified.not_before == ctx.conf.TOKEN_TTL
+
+
+def test_expired_token_is_refused_by_claims_check():
+    ctx = FakeContext(FakeConnection(), FakeConnection(), Config(TOKEN_TTL=-60))
+
+    result = get_claims_from_token(ctx, make_token(ctx, CLAIMS))
+
+    assert result.failure().description == "Signature has expired"
+
+
+def test_unexpired_claims_are_used_without_a_query():
+    conn = FakeConnection()
+    now = time.time()
+    verified = VerifiedToken(CLAIMS, now - 60, now + 60, int(now))
+
+    claims = run(fresh_claims(FakeContext(conn, conn), verified)).unwrap()
+
+    assert claims == CLAIMS
+    assert conn.statements == []
+
+
+def test_expired_claims_are_refreshed_with_the_same_auth_time():
+    conn = FakeConnection(state_responder(token_version=3, is_active=True))
+    ctx = FakeContext(conn, conn)
+    auth_time = time.time() - 3600
+
+    claims = run(fresh_claims(ctx, expired(auth_time))).unwrap()
+
+    assert claims == CLAIMS
+    reissued = verify_token(ctx, ctx.session["token"]).unwrap()
+    assert reissued.claims == CLAIMS
+    assert reissued.auth_time == int(auth_time)
+    assert reissued.expires_at > time.time()
+
+
+def test_bumped_token_version_revokes_the_token():
+    conn = FakeConnection(state_responder(token_version=4, is_active=True))
+    ctx = FakeContext(conn, conn)
+
+    result = run(fresh_claims(ctx, expired(time.time())))
+
+    assert result.failure().description == "Token has been revoked"
+    assert "token" not in ctx.session
+
+
+def test_deactivated_user_is_not_refreshed():
+    conn = FakeConnection(state_responder(token_version=3, is_active=False))
+    ctx = FakeContext(conn, conn)
+
+    result = run(fresh_claims(ctx, expired(time.time())))
+
+    assert result.failure().description == "User has been deactivated"
+    assert "token" not in ctx.session
+
+
+def test_refresh_ends_after_refresh_ttl():
+    conn = FakeConnection(state_responder(token_version=3, is_active=True))
+    ctx = FakeContext(conn, conn, Config(TOKEN_REFRESH_TTL=600))
+
+    result = run(fresh_claims(ctx, expired(time.time() - 601)))
+
+    assert result.failure().description == "Signature has expired"
+    assert conn.statements == []
+
+
+def timed_calls(query: str) -> float:
+    return REGISTRY.get_sample_value("yaft_db_query_duration_seconds_count", {"query": query, "outcome": "ok"}) or 0.0
+
+
+def test_password_change_and_deactivation_bump_the_token_version():
+    conn = FakeConnection(lambda sql, parameters: [Updated(1, 4)])
+    ctx = FakeContext(conn, conn)
+    bumps = timed_calls("bump_token_version")
+
+    assert run(change_user_password(ctx, 1, "hashed")).unwrap() == 4
+    assert run(deactivate_user(ctx, 1)).unwrap() == 4
+
+    # Timed once, as part of the queries that bump it
+    assert timed_calls("bump_token_version") == bumps
+
+    password, bump, deactivate, second_bump = conn.statements
+    assert password[1]["password"] == "hashed"
+    assert deactivate[1]["is_active"] is False
+    for sql, _ in (bump, second_bump):
+        assert "SET token_version=(" in sql
+
+
+def test_deactivated_users_cannot_sign_in():
+    conn = FakeConnection()
+
+    result = run(get_user_by_name(FakeContext(conn, conn), "user"))
+
+    assert not is_successful(result)
+    assert "is_active IS NOT false" in conn.sql()[0]
+
+
+def test_password_change_reissues_the_token_with_the_new_version(app, database: FakeConnection, token: str):
+    hashed = run(secure_password(FakeContext(database, database), "old")).unwrap()
+
+    def responder(sql: str, parameters: dict) -> list[tuple]:
+        if sql.startswith("SELECT"):
+            return [UserRow(1, "user", hashed, "user@example.com", 0)]
+        return [Updated(1, 1)]
+
+    database.responder = responder
+
+    async def change(password: str) -> tuple[int, str | None]:
+        client = await sign_in(app.test_client(), token)
+        response = await client.put("/password/", json={"password": password, "new_password": "new"})
+        async with client.session_transaction() as session:
+            return response.status_code, session.get("token")
+
+    status, kept = asyncio.run(change("wrong"))
+    assert status == 401
+    assert kept == token
+    assert not any(sql.startswith("UPDATE") for sql in database.sql())
+
+    status, reissued = asyncio.run(change("old"))
+    assert status == 200
+    assert reissued != token
+    assert verify_token(FakeContext(database, database), reissued).unwrap().claims.token_version == 1
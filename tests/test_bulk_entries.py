@@ -0,0 +1,114 @@
+import asyncio
+from collections import namedtuple
+
+import msgspec
+from returns.pipeline import is_successful
+from sqlalchemy.exc import DataError
+
+from yet_another_flask_template.modules.core.queries import create_entries_returning_ids
+from yet_another_flask_template.modules.core.schemas import NewEntryRequest
+from yet_another_flask_template.serialization import decode_json_items
+
+from .fakes import FakeConnection, FakeContext, run, sign_in
+
+IdRow = namedtuple("IdRow", "id")
+
+
+def entry(title: str = "Entry") -> dict:
+    return {"title": title, "description": "d", "links": "https://example.com", "keywords": "k"}
+
+
+def insert_responder(sql: str, rows: list[dict] | None) -> list[tuple]:
+    """Fails the whole insert if any row is "bad", like a constraint would"""
+    if sql.startswith("SELECT") and '"education.category"' in sql:
+        return [IdRow(1)]
+    if not sql.startswith('INSERT INTO "education.entry"'):
+        return []
+    if any(row["title"] == "bad" for row in rows or []):
+        raise DataError("INSERT", rows, Exception("value too long"))
+    return [(100 + i,) for i in range(len(rows or []))]
+
+
+def errors(items: list) -> dict[int, str]:
+    return {i: item.failure().error_code for i, item in enumerate(items) if not is_successful(item)}
+
+
+def test_decode_array_keeps_valid_items():
+    body = msgspec.json.encode([entry(), {"title": 1}, entry("x" * 121)])
+
+    items = decode_json_items(NewEntryRequest, body).unwrap()
+
+    assert is_successful(items[0])
+    assert errors(items) == {1: "validation_failed", 2: "validation_failed"}
+
+
+def test_decode_ndjson_reports_malformed_lines_as_validation_errors():
+    body = b"\n".join([msgspec.json.encode(entry()), b"not json", msgspec.json.encode(entry())])
+
+    items = decode_json_items(NewEntryRequest, body, ndjson=True).unwrap()
+
+    assert errors(items) == {1: "validation_failed"}
+
+
+def test_decode_malformed_array_fails_as_a_whole():
+    result = decode_json_items(NewEntryRequest, b"[{")
+
+    assert result.failure().error_code == "validation_failed"
+
+
+def test_decode_rejects_too_many_items_before_decoding_them():
+    body = msgspec.json.encode([{"not": "an entry"}] * 3)
+
+    result = decode_json_items(NewEntryRequest, body, max_items=2)
+
+    assert result.failure().error_code == "validation_failed"
+    assert "At most 2" in result.failure().description
+
+
+def test_failed_chunk_is_retried_row_by_row():
+    conn = FakeConnection(insert_responder)
+    entries = [NewEntryRequest(**entry()), NewEntryRequest(**entry("bad")), NewEntryRequest(**entry())]
+
+    results = run(create_entries_returning_ids(FakeContext(conn, conn), 1, entries)).unwrap()
+
+    assert [r.unwrap() for r in (results[0], results[2])] == [100, 100]
+    assert errors(results) == {1: "server_error"}
+    # The chunk, then each row under a savepoint of its own
+    assert conn.savepoints == 4
+    assert conn.rolled_back == 2
+
+
+def test_missing_category_fails_before_any_insert():
+    conn = FakeConnection()
+    entries = [NewEntryRequest(**entry())] * 3
+
+    result = run(create_entries_returning_ids(FakeContext(conn, conn), 1, entries))
+
+    assert result.failure().status_code == 404
+    assert len(conn.statements) == 1
+    assert conn.savepoints == 0
+
+
+def test_bulk_endpoint_maps_errors_to_item_indexes(app, database: FakeConnection, token: str):
+    database.responder = insert_responder
+    body = b"\n".join([
+        msgspec.json.encode(entry()),
+        b"not json",
+        msgspec.json.encode(entry("bad")),
+        msgspec.json.encode(entry()),
+    ])
+
+    async def post() -> tuple[int, dict]:
+        client = await sign_in(app.test_client(), token)
+        response = await client.post(
+            "/categories/1/entries/bulk/",
+            data=body,
+            headers={"Content-Type": "application/x-ndjson"},
+        )
+        return response.status_code, msgspec.json.decode(await response.get_data())
+
+    status, response = asyncio.run(post())
+
+    assert status == 200
+    assert response["ids"] == [100, None, None, 100]
+    assert [(e["index"], e["error_code"]) for e in response["errors"]] == [(1, "validation_failed"), (2, "server_error")]
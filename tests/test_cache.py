@@ -0,0 +1,82 @@
+from types import SimpleNamespace
+
+import pytest
+
+from yet_another_flask_template import cache
+from yet_another_flask_template.cache import NotifiedCache, TTLCache
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> SimpleNamespace:
+    """Time of the caches, moved forward by the tests"""
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+def test_ttl_cache_expires_items_and_evicts_the_least_recently_used(clock: SimpleNamespace):
+    ttl_cache: TTLCache[str, int] = TTLCache(maxsize=2, ttl=10)
+    ttl_cache.set("a", 1)
+    ttl_cache.set("b", 2, ttl=20)
+    ttl_cache.get("a")
+    ttl_cache.set("c", 3)
+
+    assert ttl_cache.get("b") is None
+    assert ttl_cache.get("a") == 1
+
+    clock.now = 15
+    assert ttl_cache.get("a") is None
+    assert ttl_cache.get("c") is None
+
+
+def test_value_read_before_an_invalidation_is_not_stored(clock: SimpleNamespace):
+    notified: NotifiedCache[str, int] = NotifiedCache(maxsize=10, ttl=60, fallback_ttl=1)
+    generation = notified.generation
+
+    notified.on_notify("categories")
+    notified.set("list", 1, generation)
+
+    assert notified.get("list") is None
+
+
+def test_notification_clears_the_cache(clock: SimpleNamespace):
+    notified: NotifiedCache[str, int] = NotifiedCache(maxsize=10, ttl=60, fallback_ttl=1)
+    notified.set("list", 1, notified.generation)
+
+    notified.on_notify("categories")
+
+    assert notified.get("list") is None
+    notified.set("list", 2, notified.generation)
+    assert notified.get("list") == 2
+
+
+def test_entries_live_for_the_fallback_ttl_without_a_listener(clock: SimpleNamespace):
+    notified: NotifiedCache[str, int] = NotifiedCache(maxsize=10, ttl=60, fallback_ttl=1)
+    notified.set("list", 1, notified.generation)
+
+    clock.now = 2
+    assert notified.get("list") is None
+
+    notified.on_connect()
+    notified.set("list", 1, notified.generation)
+    clock.now = 30
+    assert notified.get("list") == 1
+
+
+def test_connection_changes_invalidate_what_was_read_before(clock: SimpleNamespace):
+    notified: NotifiedCache[str, int] = NotifiedCache(maxsize=10, ttl=60, fallback_ttl=1)
+    notified.on_connect()
+    generation = notified.generation
+    notified.set("list", 1, generation)
+
+    # Notifications sent while disconnected are lost
+    notified.on_disconnect()
+    assert notified.get("list") is None
+    assert notified.listeners == 0
+
+    notified.set("list", 1, generation)
+    assert notified.get("list") is None
+
+    notified.set("list", 1, notified.generation)
+    clock.now = 2
+    assert notified.get("list") is None
@@ -0,0 +1,95 @@
+import asyncio
+import gzip
+import zlib
+
+import pytest
+from quart import Quart, Response, request
+
+from yet_another_flask_template.compression import Compressor
+
+BODY = b'{"results": [' + b",".join([b'{"id": 1, "title": "entry"}'] * 100) + b"]}"
+
+
+@pytest.fixture
+def compressor() -> Compressor:
+    compressor = Compressor(min_size=1024, level=6, cache_size=16, cache_ttl=60)
+    # The same preference whether zstandard is installed or not
+    compressor.encoders.pop("zstd", None)
+    return compressor
+
+
+def compress(compressor: Compressor, accept_encoding: str | None, response: Response) -> Response:
+    app = Quart(__name__)
+    headers = {} if accept_encoding is None else {"Accept-Encoding": accept_encoding}
+
+    async def run() -> Response:
+        async with app.test_request_context("/", headers=headers):
+            return await compressor.compress(request, response)
+
+    return asyncio.run(run())
+
+
+def json_response(body: bytes = BODY, etag: str | None = None) -> Response:
+    response = Response(body, mimetype="application/json")
+    if etag is not None:
+        response.set_etag(etag)
+    return response
+
+
+def body_of(response: Response) -> bytes:
+    return asyncio.run(response.get_data())
+
+
+@pytest.mark.parametrize("accept_encoding, encoding", [
+    ("gzip, deflate", "gzip"),
+    ("deflate", "deflate"),
+    ("gzip;q=0.5, deflate", "deflate"),
+    ("gzip;q=0, deflate", "deflate"),
+    ("*", "gzip"),
+    ("gzip;q=0, deflate;q=0", None),
+    ("br", None),
+    (None, None),
+])
+def test_encoding_is_negotiated(compressor: Compressor, accept_encoding: str | None, encoding: str | None):
+    response = compress(compressor, accept_encoding, json_response())
+
+    assert response.headers.get("Content-Encoding") == encoding
+    assert response.headers["Vary"] == "Accept-Encoding"
+    decompress = {"gzip": gzip.decompress, "deflate": zlib.decompress, None: lambda body: body}[encoding]
+    assert decompress(body_of(response)) == BODY
+
+
+def test_small_bodies_are_sent_as_they_are(compressor: Compressor):
+    response = compress(compressor, "gzip", json_response(b'{"id": 1}'))
+
+    assert "Content-Encoding" not in response.headers
+    assert "Vary" not in response.headers
+    assert body_of(response) == b'{"id": 1}'
+
+
+@pytest.mark.parametrize("response", [
+    Response(BODY, status=201, mimetype="application/json"),
+    Response(BODY, mimetype="image/png"),
+    Response(BODY, mimetype="application/json", headers={"Content-Encoding": "gzip"}),
+])
+def test_other_responses_are_passed_through(compressor: Compressor, response: Response):
+    encoding = response.headers.get("Content-Encoding")
+
+    assert body_of(compress(compressor, "gzip", response)) == BODY
+    assert response.headers.get("Content-Encoding") == encoding
+
+
+def test_tagged_bodies_are_compressed_once(compressor: Compressor):
+    calls: list[bytes] = []
+    encode = compressor.encoders["gzip"]
+    compressor.encoders["gzip"] = lambda body: calls.append(body) or encode(body)
+
+    first = compress(compressor, "gzip", json_response(etag="v1"))
+    second = compress(compressor, "gzip", json_response(etag="v1"))
+    compress(compressor, "gzip", json_response(BODY + b" ", etag="v2"))
+    compress(compressor, "gzip", json_response())
+
+    assert body_of(first) == body_of(second)
+    assert second.get_etag() == ("v1", True)
+    # The first tagged body once, then the other tagged body and the untagged one
+    assert len(calls) == 3
@@ -0,0 +1,55 @@
+import asyncio
+import gzip
+
+import msgspec
+
+from .fakes import FakeConnection, sign_in
+
+ENTRY_ROWS = [(i, f"Entry {i}", "description " * 20, "k", "https://example.com", 1, False) for i in range(1, 21)]
+
+
+def listing_responder(sql: str, parameters: dict | None) -> list[tuple]:
+    if "education.list_version" in sql:
+        return [(3,)]
+    if "education.entry" in sql:
+        return ENTRY_ROWS
+    return []
+
+
+def test_compressed_200_and_304_carry_the_same_validator(app, database: FakeConnection, token: str):
+    database.responder = listing_responder
+
+    async def get_twice():
+        client = await sign_in(app.test_client(), token)
+        full = await client.get("/categories/1/entries/?limit=20", headers={"Accept-Encoding": "gzip"})
+        body = await full.get_data()
+        etag = full.headers["ETag"]
+        again = await client.get(
+            "/categories/1/entries/?limit=20",
+            headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+        )
+        return full, body, again
+
+    full, body, again = asyncio.run(get_twice())
+
+    assert full.status_code == 200
+    assert full.headers["Content-Encoding"] == "gzip"
+    assert len(msgspec.json.decode(gzip.decompress(body))["results"]) == 20
+    assert full.headers["ETag"].startswith('W/"entries:1-3-')
+    assert again.status_code == 304
+    assert again.headers["ETag"] == full.headers["ETag"]
+
+
+def test_other_pages_get_other_tags(app, database: FakeConnection, token: str):
+    database.responder = listing_responder
+
+    async def tags():
+        client = await sign_in(app.test_client(), token)
+        return [
+            (await client.get(f"/categories/1/entries/?limit={limit}")).headers["ETag"]
+            for limit in (10, 20)
+        ]
+
+    first, second = asyncio.run(tags())
+
+    assert first != second
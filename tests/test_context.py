@@ -0,0 +1,96 @@
+import time
+from typing import Any
+
+import pytest
+from returns.result import Failure, Success
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.context import PRIMARY_PIN_KEY, clean_context, replica_connection
+from yet_another_flask_template.database import LazyConnection, engines
+from yet_another_flask_template.errors import NotFoundException
+from yet_another_flask_template.modules.core.queries import get_token_state
+
+from .fakes import FakeConnection, FakeContext, FakePool, run
+
+REPLICAS = Config(DB_REPLICA_HOSTS=["replica-1", "replica-2"])
+
+
+@pytest.fixture
+def hosts(monkeypatch: pytest.MonkeyPatch) -> list[str | None]:
+    """Hosts the app asked for pools of"""
+    hosts: list[str | None] = []
+
+    def get(config: Config, host: str | None = None):
+        hosts.append(host)
+        return Success(FakePool(FakeConnection()))
+
+    monkeypatch.setattr(engines, "get", get)
+    return hosts
+
+
+def primary() -> LazyConnection:
+    return LazyConnection(FakePool(FakeConnection()))
+
+
+def test_primary_is_read_without_replicas(hosts: list[str | None]):
+    conn = primary()
+
+    assert replica_connection(Config(), {}, conn).unwrap() is conn
+    assert hosts == []
+
+
+def test_pinned_session_reads_from_the_primary(hosts: list[str | None]):
+    conn = primary()
+
+    replica = replica_connection(REPLICAS, {PRIMARY_PIN_KEY: time.time() + 5}, conn).unwrap()
+
+    assert replica is conn
+    assert hosts == []
+
+
+@pytest.mark.parametrize("session", [{}, {PRIMARY_PIN_KEY: time.time() - 1}])
+def test_unpinned_session_reads_from_a_replica(hosts: list[str | None], session: dict):
+    conn = primary()
+
+    replica = replica_connection(REPLICAS, session, conn).unwrap()
+
+    assert replica is not conn
+    assert replica.read_only
+    assert hosts[0] in REPLICAS.DB_REPLICA_HOSTS
+
+
+def test_committed_write_pins_the_session_to_the_primary():
+    written = FakeConnection()
+    ctx = FakeContext(LazyConnection(FakePool(written)), LazyConnection(FakePool(FakeConnection()), read_only=True), REPLICAS)
+    run(ctx.db_conn.execute("UPDATE x"))
+    run(ctx.replica_conn.execute("SELECT x"))
+
+    run(clean_context(ctx, Success(None)))
+
+    assert written.commits == 1
+    assert time.time() < ctx.session[PRIMARY_PIN_KEY] <= time.time() + REPLICAS.DB_REPLICA_PIN_SECONDS
+    assert not ctx.replica_conn.acquired
+
+
+@pytest.mark.parametrize("read_only, result", [
+    # Nothing was committed
+    (False, Failure(NotFoundException())),
+    (True, Success(None)),
+])
+def test_session_is_not_pinned_without_a_commit(read_only: bool, result: Any):
+    conn = LazyConnection(FakePool(FakeConnection()), read_only=read_only)
+    ctx = FakeContext(conn, conn, REPLICAS)
+    run(conn.execute("SELECT x"))
+
+    run(clean_context(ctx, result))
+
+    assert PRIMARY_PIN_KEY not in ctx.session
+
+
+def test_token_state_is_read_from_the_primary():
+    db_conn, replica_conn = FakeConnection(), FakeConnection()
+
+    run(get_token_state(FakeContext(db_conn, replica_conn), 1))
+
+    assert len(db_conn.statements) == 1
+    assert replica_conn.statements == []
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+from returns.future import FutureResult
+
+from yet_another_flask_template.context import app_context, autocommit, read_only
+from yet_another_flask_template.database import LazyConnection
+from yet_another_flask_template.modules.core.schemas import CreateItemResponse
+
+from .fakes import FakeConnection, FakePool, run
+
+
+class CountingPool(FakePool):
+    def __init__(self, conn: FakeConnection) -> None:
+        super().__init__(conn)
+        self.checkouts = 0
+
+    async def connect(self) -> FakeConnection:
+        self.checkouts += 1
+        return await super().connect()
+
+
+def test_connection_is_checked_out_by_the_first_query_only(conn: FakeConnection):
+    pool = CountingPool(conn)
+    lazy = LazyConnection(pool)
+
+    assert run(lazy.release(commit=True)) is False
+    assert pool.checkouts == 0
+
+    run(lazy.execute("SELECT 1"))
+    run(lazy.execute("SELECT 2"))
+
+    assert lazy.acquired
+    assert pool.checkouts == 1
+
+
+@pytest.mark.parametrize("read_only, autocommit, isolation", [
+    (False, False, None),
+    (True, False, "AUTOCOMMIT"),
+    (False, True, "AUTOCOMMIT"),
+])
+def test_read_only_and_autocommit_connections_skip_the_transaction(conn: FakeConnection, read_only: bool, autocommit: bool, isolation: str | None):
+    lazy = LazyConnection(FakePool(conn), read_only=read_only, autocommit=autocommit)
+    run(lazy.execute("SELECT 1"))
+
+    committed = run(lazy.release(commit=True))
+
+    assert conn.options.get("isolation_level") == isolation
+    assert committed is (isolation is None)
+    assert conn.commits == (1 if isolation is None else 0)
+    assert conn.closed == 1
+
+
+def test_release_without_commit_closes_to_roll_back(conn: FakeConnection):
+    lazy = LazyConnection(FakePool(conn))
+    run(lazy.execute("UPDATE x"))
+
+    assert run(lazy.release(commit=False)) is False
+    assert conn.commits == 0
+    assert conn.closed == 1
+    # Released once, a second release has nothing left to do
+    assert run(lazy.release(commit=True)) is False
+    assert conn.closed == 1
+    assert not lazy.acquired
+
+
+@pytest.mark.parametrize("marker, isolation, commits", [
+    (lambda fn: fn, None, 1),
+    (read_only, "AUTOCOMMIT", 0),
+    (autocommit, "AUTOCOMMIT", 0),
+])
+def test_markers_choose_how_handlers_connect(app, database: FakeConnection, marker, isolation: str | None, commits: int):
+    @app_context
+    @marker
+    def handler(ctx) -> FutureResult:
+        async def query() -> CreateItemResponse:
+            await ctx.db_conn.execute("SELECT 1")
+            return CreateItemResponse(id=1)
+
+        return FutureResult.from_value(None).bind_awaitable(lambda _: query())
+
+    async def call() -> int:
+        async with app.test_request_context("/"):
+            _, status = await handler()
+            return status
+
+    assert asyncio.run(call()) == 200
+    assert database.options.get("isolation_level") == isolation
+    assert database.commits == commits
+    assert database.closed == 1
@@ -0,0 +1,156 @@
+import asyncio
+
+import pytest
+from returns.future import FutureResult
+from returns.result import Result, Success
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import engines
+from yet_another_flask_template.errors import ServerErrorException
+from yet_another_flask_template.modules.core.jobs import JobWorker, retry_delay
+from yet_another_flask_template.modules.core.schemas import Job
+
+from .fakes import FakeConnection
+
+CONFIG = Config(JOB_BACKOFF_BASE=5.0, JOB_MAX_BACKOFF=60.0)
+
+
+class ConnectionPerCheckout:
+    """Stands in for `PooledEngine`, every checkout gets a new connection"""
+
+    def __init__(self) -> None:
+        self.connections: list[FakeConnection] = []
+
+        # Attempts of the job in the table, bumped by another worker's claim
+        self.attempts: int | None = None
+
+    def respond(self, sql: str, parameters: dict) -> list[tuple]:
+        if "RETURNING" in sql:
+            return [(7, "test", None, 1, 3)]
+        if self.attempts is not None and parameters.get("attempts_1", self.attempts) != self.attempts:
+            return []
+        # One changed row
+        return [()]
+
+    async def connect(self) -> FakeConnection:
+        conn = FakeConnection(self.respond)
+        self.connections.append(conn)
+        return conn
+
+
+@pytest.fixture
+def pool(monkeypatch: pytest.MonkeyPatch) -> ConnectionPerCheckout:
+    pool = ConnectionPerCheckout()
+    monkeypatch.setattr(engines, "get", lambda config, host=None: Success(pool))
+    return pool
+
+
+def job(attempts: int = 1, max_attempts: int = 3) -> Job:
+    return Job(id=7, kind="test", payload=None, attempts=attempts, max_attempts=max_attempts)
+
+
+def succeed(ctx, payload) -> FutureResult[None, ServerErrorException]:
+    return FutureResult.from_value(None)
+
+
+def fail(ctx, payload) -> FutureResult[None, ServerErrorException]:
+    return FutureResult.from_failure(ServerErrorException())
+
+
+def written_status(conn: FakeConnection) -> str | None:
+    _, parameters = conn.statements[-1]
+    return parameters.get("status")
+
+
+@pytest.mark.parametrize("attempts, delay", [(1, 5.0), (2, 10.0), (4, 40.0), (5, 60.0), (20, 60.0)])
+def test_retry_delay_backs_off_exponentially_up_to_the_maximum(attempts: int, delay: float):
+    assert retry_delay(CONFIG, attempts) == delay
+
+
+def test_claim_takes_the_lease_in_autocommit(pool: ConnectionPerCheckout):
+    worker = JobWorker(CONFIG, {})
+
+    claimed = asyncio.run(worker.claim(2))
+
+    assert claimed == [job()]
+    conn, = pool.connections
+    assert conn.options == {"isolation_level": "AUTOCOMMIT"}
+    assert conn.sql()[0].startswith('UPDATE "education.job" SET status')
+    assert conn.commits == 0
+
+
+def test_successful_job_is_deleted_in_its_own_transaction(pool: ConnectionPerCheckout):
+    worker = JobWorker(CONFIG, {"test": succeed})
+
+    asyncio.run(worker._execute(job()))
+
+    conn, = pool.connections
+    assert conn.options == {}
+    assert conn.sql()[0].startswith('DELETE FROM "education.job"')
+    assert conn.commits == 1
+
+
+def test_failed_job_is_retried_with_backoff(pool: ConnectionPerCheckout):
+    worker = JobWorker(CONFIG, {"test": fail})
+
+    asyncio.run(worker._execute(job(attempts=2)))
+
+    # The handler failed before any query, so the attempt took no connection
+    reschedule, = pool.connections
+    assert reschedule.options == {"isolation_level": "AUTOCOMMIT"}
+    assert written_status(reschedule) == "queued"
+    # Only rows of this attempt are rescheduled
+    assert reschedule.statements[-1][1]["attempts_1"] == 2
+
+
+def test_job_fails_after_its_last_attempt(pool: ConnectionPerCheckout):
+    worker = JobWorker(CONFIG, {"test": fail})
+
+    asyncio.run(worker._execute(job(attempts=3)))
+
+    reschedule, = pool.connections
+    assert written_status(reschedule) == "failed"
+
+
+def test_unknown_kind_is_retried(pool: ConnectionPerCheckout):
+    worker = JobWorker(CONFIG, {})
+
+    asyncio.run(worker._execute(job()))
+
+    reschedule, = pool.connections
+    assert written_status(reschedule) == "queued"
+    assert "No handler" in reschedule.statements[-1][1]["last_error"]
+
+
+def test_expired_lease_is_not_run_again(pool: ConnectionPerCheckout):
+    ran = []
+    worker = JobWorker(CONFIG, {"test": lambda ctx, payload: ran.append(payload) or succeed(ctx, payload)})
+
+    # Claimed once more after the last attempt's lease ran out
+    asyncio.run(worker._execute(job(attempts=4)))
+
+    assert ran == []
+    reschedule, = pool.connections
+    assert written_status(reschedule) == "failed"
+    assert "Lease expired" in reschedule.statements[-1][1]["last_error"]
+
+
+def test_job_taken_over_by_another_worker_is_rolled_back(pool: ConnectionPerCheckout):
+    def write(ctx, payload) -> FutureResult[None, ServerErrorException]:
+        async def side_effect() -> Result[None, ServerErrorException]:
+            await ctx.db_conn.execute("UPDATE side_effect", {})
+            return Success(None)
+
+        return FutureResult(side_effect())
+
+    worker = JobWorker(CONFIG, {"test": write})
+    # Its lease ran out, another worker claimed it for its second attempt
+    pool.attempts = 2
+
+    asyncio.run(worker._execute(job(attempts=1)))
+
+    attempt, reschedule = pool.connections
+    assert attempt.sql()[0] == "UPDATE side_effect"
+    assert attempt.commits == 0
+    # Nor is the other worker's attempt rescheduled
+    assert reschedule.statements[-1][1]["attempts_1"] == 1
@@ -0,0 +1,67 @@
+import asyncio
+from collections import Counter, defaultdict
+from typing import Any
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.loadtest import AsgiTransport, TrafficRequest, client_address, generate_traffic, replay
+from yet_another_flask_template.modules.core.rate_limit import client_ip
+
+from .fakes import FakeConnection
+from .test_rate_limit import bucket_responder
+
+
+class RecordingTransport:
+    def __init__(self) -> None:
+        self.requests: list[tuple[int, str, Any]] = []
+
+    async def request(self, user: int, method: str, path: str, body: Any) -> tuple[int, bytes]:
+        self.requests.append((user, path, body))
+        return 200, b'{"id": 1}'
+
+
+def test_sign_ins_stay_within_the_rate_limits():
+    config = Config()
+    traffic = generate_traffic(users=20, requests=5000)
+
+    sign_ins = Counter(request.user for request in traffic if request.route == "POST /sign_in/")
+
+    assert max(sign_ins.values()) <= config.SIGN_IN_RATE_USER_BURST
+    # No user shares its address with another, or with a trusted proxy
+    addresses = {client_ip(client_address(user), None, config.TRUSTED_PROXIES) for user in range(20)}
+    assert len(addresses) == 20
+
+
+def test_every_replay_signs_up_new_users():
+    traffic = generate_traffic(users=2, requests=10)
+    usernames: list[set[str]] = []
+
+    for run in ("first", "second"):
+        transport = RecordingTransport()
+        asyncio.run(replay(transport, traffic, run))
+        usernames.append({body["username"] for _, path, body in transport.requests if path == "/sign_up/"})
+
+    assert usernames == [{"loadtest-0-0-first", "loadtest-0-1-first"}, {"loadtest-0-0-second", "loadtest-0-1-second"}]
+
+
+def test_in_process_users_are_limited_by_their_own_address(app, database: FakeConnection):
+    database.responder = bucket_responder(2.0)
+    traffic = [
+        TrafficRequest("POST /sign_in/", "POST", "/sign_in/", user, {"username": f"user-{user}", "password": "password"})
+        for user in (0, 1)
+    ]
+
+    async def sign_in() -> list[int]:
+        async with app.test_app() as test_app:
+            samples, _ = await replay(AsgiTransport(test_app), traffic)
+        return [sample.status for sample in samples]
+
+    # No such users, but only after the rate limits let them through
+    assert asyncio.run(sign_in()) == [404, 404]
+
+    keys: dict[str, list[str]] = defaultdict(list)
+    for sql, parameters in database.statements:
+        if "education.rate_limit" in sql:
+            kind, value = parameters["key"].split(":", 1)
+            keys[kind].append(value)
+    assert sorted(keys["sign_in_ip"]) == [client_address(0), client_address(1)]
+    assert sorted(keys["sign_in_user"]) == ["user-0", "user-1"]
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from werkzeug.datastructures import MultiDict
+
+from yet_another_flask_template.modules.core.metadata import entry_table
+from yet_another_flask_template.modules.core.pagination import (
+    MAX_PAGE_SIZE,
+    MAX_SEARCH_OFFSET,
+    page_from_args,
+    paginate,
+    search_from_args,
+    to_list_response,
+    to_search_response,
+)
+from yet_another_flask_template.modules.core.schemas import PageQuery, SearchQuery
+
+
+def items(*ids: int) -> list[SimpleNamespace]:
+    return [SimpleNamespace(id=id_) for id_ in ids]
+
+
+def sql(page: PageQuery) -> str:
+    stmt = paginate(entry_table.select(), entry_table.c.id, page)
+    compiled = stmt.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    return " ".join(str(compiled).split())
+
+
+def test_page_arguments_are_read_with_defaults():
+    page = page_from_args(MultiDict({"after": "42", "stream": "true"})).unwrap()
+
+    assert page == PageQuery(limit=100, after=42, stream=True)
+    assert page_from_args(MultiDict()).unwrap() == PageQuery(limit=100)
+
+
+@pytest.mark.parametrize("args", [
+    {"limit": "0"},
+    {"limit": str(MAX_PAGE_SIZE + 1)},
+    {"limit": "ten"},
+    {"after": "abc"},
+    {"after": "1.5"},
+])
+def test_invalid_page_arguments_are_rejected(args: dict):
+    result = page_from_args(MultiDict(args))
+
+    assert result.failure().error_code == "validation_failed"
+
+
+def test_after_cursor_is_a_keyset_condition():
+    assert 'WHERE "education.entry".id > 42 ORDER BY "education.entry".id LIMIT 11' in sql(PageQuery(limit=10, after=42))
+    assert "WHERE" not in sql(PageQuery(limit=10))
+
+
+def test_streamed_page_has_no_limit():
+    assert "LIMIT" not in sql(PageQuery(limit=10, stream=True))
+
+
+def test_extra_row_gives_the_next_cursor():
+    page = PageQuery(limit=2)
+
+    more = to_list_response(page, items(3, 5, 8))
+    last = to_list_response(page, items(3, 5))
+
+    assert [item.id for item in more.results] == [3, 5]
+    assert more.next_cursor == 5
+    assert len(last.results) == 2
+    assert last.next_cursor is None
+
+
+@pytest.mark.parametrize("args, error", [
+    ({}, "q must not be empty"),
+    ({"q": "  "}, "q must not be empty"),
+    ({"q": "python", "limit": str(MAX_PAGE_SIZE + 1)}, f"limit must be between 1 and {MAX_PAGE_SIZE}"),
+    ({"q": "python", "offset": "-1"}, f"offset must be between 0 and {MAX_SEARCH_OFFSET}"),
+    ({"q": "python", "offset": str(MAX_SEARCH_OFFSET + 1)}, f"offset must be between 0 and {MAX_SEARCH_OFFSET}"),
+])
+def test_invalid_search_arguments_are_rejected(args: dict, error: str):
+    assert search_from_args(MultiDict(args)).failure().description == error
+
+
+def test_search_cursor_is_the_next_offset():
+    search = SearchQuery(q="python", limit=2, offset=4)
+
+    assert to_search_response(search, items(1, 2, 3)).next_cursor == 6
+    assert to_search_response(search, items(1, 2)).next_cursor is None
@@ -0,0 +1,90 @@
+import pytest
+
+from yet_another_flask_template.plans import (
+    PlanCase,
+    PlanReport,
+    StatementPlan,
+    cost_regressions,
+    is_explainable,
+    seq_scans,
+    unexpected_seq_scans,
+)
+
+# Root of `EXPLAIN (FORMAT JSON)` output, trimmed to the keys that are read
+CLAIM_JOBS_PLAN = {
+    "Node Type": "ModifyTable",
+    "Total Cost": 2.05,
+    "Plans": [
+        {
+            "Node Type": "Nested Loop",
+            "Plans": [
+                {"Node Type": "HashAggregate", "Plans": [
+                    {"Node Type": "Limit", "Plans": [
+                        {"Node Type": "LockRows", "Plans": [
+                            {"Node Type": "Seq Scan", "Relation Name": "education.job"},
+                        ]},
+                    ]},
+                ]},
+                {"Node Type": "Seq Scan", "Relation Name": "education.job"},
+            ],
+        },
+    ],
+}
+GET_ENTRIES_PLAN = {
+    "Node Type": "Limit",
+    "Total Cost": 208.89,
+    "Plans": [
+        {"Node Type": "Index Scan", "Relation Name": "education.entry", "Index Name": "ix_entry_live_category_id_id"},
+    ],
+}
+
+
+def report(**cases: list[StatementPlan]) -> PlanReport:
+    return PlanReport(created=0.0, cases=cases)
+
+
+def plan(cost: float, *scans: str) -> StatementPlan:
+    return StatementPlan(sql="SELECT 1", total_cost=cost, seq_scans=list(scans))
+
+
+def test_seq_scans_are_found_in_nested_plans():
+    assert seq_scans(CLAIM_JOBS_PLAN) == ["education.job", "education.job"]
+    assert seq_scans(GET_ENTRIES_PLAN) == []
+
+
+@pytest.mark.parametrize("sql, explainable", [
+    ("SELECT 1", True),
+    ("\n  with t as (select 1) select * from t", True),
+    ('UPDATE "education.job" SET status=$1', True),
+    ("SAVEPOINT sa_savepoint_1", False),
+    ("RELEASE SAVEPOINT sa_savepoint_1", False),
+])
+def test_only_dml_is_explained(sql: str, explainable: bool):
+    assert is_explainable(sql) is explainable
+
+
+def test_seq_scans_outside_the_allowed_tables_are_reported():
+    cases = [PlanCase("claim_jobs", lambda ctx, s: None, frozenset({"education.job"})), PlanCase("get_entries", lambda ctx, s: None)]
+    plans = report(claim_jobs=[plan(2.05, "education.job")], get_entries=[plan(1.0, "education.entry")])
+
+    problems = unexpected_seq_scans(plans, cases)
+
+    assert [(p.case, p.message) for p in problems] == [("get_entries", "Seq Scan on education.entry")]
+
+
+def test_costs_past_the_threshold_are_regressions():
+    baseline = report(get_entries=[plan(100.0)], get_categories=[plan(10.0)], new_case=[])
+    current = report(get_entries=[plan(149.0)], get_categories=[plan(16.0)], unknown=[plan(1e9)])
+
+    problems = cost_regressions(baseline, current, threshold=0.5)
+
+    assert [(p.case, p.message) for p in problems] == [("get_categories", "Cost 10.00 -> 16.00")]
+
+
+def test_changed_statement_count_is_a_regression():
+    baseline = report(create_entry=[plan(0.01), plan(0.01)])
+    current = report(create_entry=[plan(0.01)])
+
+    problems = cost_regressions(baseline, current)
+
+    assert [p.message for p in problems] == ["Sends 1 statement(s), 2 in the baseline"]
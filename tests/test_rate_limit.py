@@ -0,0 +1,109 @@
+import asyncio
+from collections import namedtuple
+
+import msgspec
+import pytest
+from returns.pipeline import is_successful
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.modules.core.rate_limit import RateLimit, check_rate_limit, client_ip
+
+from .fakes import FakeConnection, FakeContext, run
+
+PROXIES = Config().TRUSTED_PROXIES
+Bucket = namedtuple("Bucket", "tokens")
+
+
+def bucket_responder(tokens: float):
+    def respond(sql: str, parameters: dict | None) -> list[tuple]:
+        if "education.rate_limit" in sql:
+            return [Bucket(tokens)]
+        return []
+    return respond
+
+
+@pytest.mark.parametrize("remote_addr, forwarded_for, expected", [
+    # Connected directly, whatever it claims
+    ("203.0.113.7", "198.51.100.1", "203.0.113.7"),
+    # Through nginx
+    ("172.17.0.1", "198.51.100.1", "198.51.100.1"),
+    # The client's own X-Forwarded-For is passed on by nginx, to the left
+    ("172.17.0.1", "10.0.0.1, 198.51.100.1", "198.51.100.1"),
+    ("172.17.0.1", "192.0.2.9, 10.0.0.5", "192.0.2.9"),
+    ("127.0.0.1", None, "127.0.0.1"),
+    ("172.17.0.1", "not an address", "not an address"),
+    (None, None, "unknown"),
+])
+def test_client_ip_trusts_forwarded_hops_of_proxies_only(remote_addr, forwarded_for, expected):
+    assert client_ip(remote_addr, forwarded_for, PROXIES) == expected
+
+
+def test_retry_after_waits_for_a_whole_token():
+    limit = RateLimit("test", burst=5, per_minute=1.0)
+
+    assert limit.retry_after(-1.0) == 120
+    assert limit.retry_after(0.5) == 30
+    assert limit.retry_after(0.999) == 1
+
+
+def test_key_truncates_long_subjects():
+    limit = RateLimit("test", burst=5, per_minute=1.0)
+
+    assert limit.key("x" * 1000) == "test:" + "x" * 256
+
+
+def test_bucket_statement_refills_by_elapsed_time_and_caps_at_burst():
+    conn = FakeConnection(bucket_responder(3.0))
+    limit = RateLimit("test", burst=5, per_minute=30.0)
+
+    run(check_rate_limit(FakeContext(conn, conn), limit, "subject", None))
+
+    sql, parameters = conn.statements[0]
+    assert "ON CONFLICT (key) DO UPDATE" in sql
+    assert "greatest(least(" in sql
+    assert parameters["key"] == "test:subject"
+    # A fresh bucket starts full, minus the token taken now
+    assert parameters["tokens"] == 4
+    assert 0.5 in parameters.values()
+    assert -1 in parameters.values()
+
+
+def test_check_passes_while_tokens_are_left():
+    conn = FakeConnection(bucket_responder(0.0))
+
+    result = run(check_rate_limit(FakeContext(conn, conn), RateLimit("test", 5, 1.0), "subject", "value"))
+
+    assert result.unwrap() == "value"
+
+
+def test_check_rejects_empty_bucket_with_retry_after():
+    conn = FakeConnection(bucket_responder(-0.5))
+
+    result = run(check_rate_limit(FakeContext(conn, conn), RateLimit("test", 5, 1.0), "subject", "value"))
+
+    assert not is_successful(result)
+    assert result.failure().status_code == 429
+    assert result.failure().headers() == {"Retry-After": "90"}
+
+
+def test_sign_in_limits_forwarded_client_in_autocommit(app, database: FakeConnection):
+    database.responder = bucket_responder(2.0)
+
+    async def sign_in():
+        response = await app.test_client().post(
+            "/sign_in/",
+            data=msgspec.json.encode({"username": "user", "password": "password"}),
+            headers={"Content-Type": "application/json", "X-Forwarded-For": "198.51.100.1"},
+            # From nginx on the docker bridge
+            scope_base={"client": ("172.17.0.1", 40000)},
+        )
+        return response.status_code
+
+    status = asyncio.run(sign_in())
+
+    keys = [parameters["key"] for sql, parameters in database.statements if "education.rate_limit" in sql]
+    # No such user, the attempt still took its tokens
+    assert status == 404
+    assert keys == ["sign_in_ip:198.51.100.1", "sign_in_user:user"]
+    assert database.options == {"isolation_level": "AUTOCOMMIT"}
+    assert database.commits == 0
@@ -0,0 +1,99 @@
+import asyncio
+from collections import namedtuple
+from datetime import timedelta
+
+import msgspec
+import pytest
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.modules.core.jobs import purge_deleted_entries
+from yet_another_flask_template.modules.core.queries import get_entries, get_subtree_entries, search_entries, soft_delete_entry
+from yet_another_flask_template.modules.core.schemas import PageQuery, SearchQuery
+
+from .fakes import FakeConnection, FakeContext, run, sign_in
+
+IdRow = namedtuple("IdRow", "id")
+LIVE = 'NOT "education.entry".is_deleted'
+
+
+def delete_responder(live: set[int]):
+    """Entries in `live` can be deleted, once"""
+    def respond(sql: str, parameters: dict) -> list[tuple]:
+        if sql.startswith('UPDATE "education.entry"'):
+            entry_id = parameters["id_1"]
+            if entry_id in live:
+                live.remove(entry_id)
+                return [IdRow(entry_id)]
+        return []
+    return respond
+
+
+def test_soft_delete_hides_the_entry_and_bumps_the_listing():
+    conn = FakeConnection(delete_responder({5}))
+
+    assert run(soft_delete_entry(FakeContext(conn, conn), 1, 5)).unwrap() == 5
+
+    (delete, parameters), (bump, scope) = conn.statements
+    assert LIVE in delete
+    assert parameters["is_deleted"] is True
+    assert "deleted_at=now()" in delete
+    assert bump.startswith('INSERT INTO "education.list_version"')
+    assert scope["scope"] == "entries:1"
+
+
+def test_deleting_a_deleted_entry_is_not_found():
+    conn = FakeConnection(delete_responder(set()))
+
+    result = run(soft_delete_entry(FakeContext(conn, conn), 1, 5))
+
+    assert result.failure().status_code == 404
+    # Nothing changed, the listing keeps its version
+    assert len(conn.statements) == 1
+
+
+def test_delete_endpoint_deletes_once(app, database: FakeConnection, token: str):
+    database.responder = delete_responder({5})
+
+    async def delete() -> tuple[int, bytes]:
+        client = await sign_in(app.test_client(), token)
+        response = await client.delete("/categories/1/entries/5/")
+        return response.status_code, await response.get_data()
+
+    assert asyncio.run(delete()) == (200, msgspec.json.encode({"id": 5}))
+    assert asyncio.run(delete())[0] == 404
+    assert database.commits == 1
+
+
+@pytest.mark.parametrize("query", [
+    lambda ctx: get_entries(ctx, 1, PageQuery(limit=10)),
+    lambda ctx: get_subtree_entries(ctx, 1, PageQuery(limit=10)),
+    lambda ctx: search_entries(ctx, SearchQuery(q="python", limit=10)),
+])
+def test_deleted_entries_are_not_listed_or_found(query):
+    conn = FakeConnection()
+
+    run(query(FakeContext(conn, conn)))
+
+    assert LIVE in conn.sql()[-1]
+
+
+@pytest.mark.parametrize("deleted, next_batch", [(2, True), (1, False)])
+def test_full_purge_batch_queues_the_next_one(deleted: int, next_batch: bool):
+    def respond(sql: str, parameters: dict) -> list[tuple]:
+        if sql.startswith('DELETE FROM "education.entry"'):
+            return [()] * deleted
+        if sql.startswith('INSERT INTO "education.job"'):
+            return [IdRow(9)]
+        return []
+
+    conn = FakeConnection(respond)
+    ctx = FakeContext(conn, conn, Config(ENTRY_PURGE_AFTER=60, ENTRY_PURGE_BATCH_SIZE=2))
+
+    assert run(purge_deleted_entries(ctx, None)).unwrap() == deleted
+
+    purge = conn.statements[0]
+    assert "is_deleted AND" in purge[0]
+    assert purge[1]["now_1"] == timedelta(seconds=60)
+    assert purge[1]["param_1"] == 2
+    queued = [parameters["kind"] for sql, parameters in conn.statements[1:]]
+    assert queued == (["purge_deleted_entries"] if next_batch else [])
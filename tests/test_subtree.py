@@ -0,0 +1,56 @@
+import asyncio
+
+import msgspec
+
+from yet_another_flask_template.modules.core.queries import MAX_CATEGORY_DEPTH, get_subtree_entries
+from yet_another_flask_template.modules.core.schemas import PageQuery
+
+from .fakes import FakeConnection, FakeContext, run, sign_in
+
+
+def entry_rows(category_ids: list[int]) -> list[tuple]:
+    return [(i, "title", "description", "keywords", "links", category_id, False) for i, category_id in enumerate(category_ids, 1)]
+
+
+def test_subtree_is_walked_by_a_single_recursive_query():
+    # Entries of the root, a child and a grandchild
+    conn = FakeConnection(lambda sql, parameters: entry_rows([1, 2, 3]))
+
+    entries = run(get_subtree_entries(FakeContext(conn, conn), 1, PageQuery(limit=10))).unwrap()
+
+    assert [entry.category_id for entry in entries] == [1, 2, 3]
+    [(sql, parameters)] = conn.statements
+    assert sql.startswith("WITH RECURSIVE category_tree")
+    assert "WHERE child.parent_id = category_tree.id AND category_tree.depth < " in sql
+    assert '"education.entry".category_id IN (SELECT category_tree.id' in sql
+    assert parameters["id_1"] == 1
+    assert MAX_CATEGORY_DEPTH in parameters.values()
+
+
+def test_subtree_query_count_doesnt_grow_with_the_tree(app, database: FakeConnection, token: str):
+    async def list_entries(category_ids: list[int]) -> tuple[int, dict]:
+        database.responder = lambda sql, parameters: entry_rows(category_ids)
+        database.statements.clear()
+        client = await sign_in(app.test_client(), token)
+        response = await client.get("/categories/1/subtree/entries/?limit=50")
+        return response.status_code, msgspec.json.decode(await response.get_data())
+
+    for categories in ([1], list(range(1, 41))):
+        status, body = asyncio.run(list_entries(categories))
+
+        assert status == 200
+        assert len(body["results"]) == len(categories)
+        assert len(database.statements) == 1
+
+
+def test_unknown_root_lists_no_entries(app, database: FakeConnection, token: str):
+    async def list_entries() -> tuple[int, dict]:
+        client = await sign_in(app.test_client(), token)
+        response = await client.get("/categories/999/subtree/entries/")
+        return response.status_code, msgspec.json.decode(await response.get_data())
+
+    status, body = asyncio.run(list_entries())
+
+    assert status == 200
+    assert body["results"] == []
+    assert database.statements[0][1]["id_1"] == 999
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.modules.core import warmup
+from yet_another_flask_template.modules.core.warmup import warm_connection, warmup_queries
+
+from .fakes import FakeConnection, FakePool
+
+
+class UnreachablePool:
+    def __init__(self) -> None:
+        self.checkouts = 0
+
+    async def connect(self) -> FakeConnection:
+        self.checkouts += 1
+        raise OSError("Connection refused")
+
+
+def test_connection_is_warmed_with_every_query(conn: FakeConnection):
+    queries = warmup_queries()
+
+    assert asyncio.run(warm_connection(Config(), FakePool(conn), queries)) is True
+    assert len(conn.statements) == len(queries)
+    assert conn.options == {"isolation_level": "AUTOCOMMIT"}
+    assert conn.closed == 1
+
+
+def test_warmup_stops_at_the_first_failed_checkout():
+    pool = UnreachablePool()
+
+    assert asyncio.run(warm_connection(Config(), pool, warmup_queries())) is False
+    assert pool.checkouts == 1
+
+
+def test_serving_doesnt_wait_past_the_warmup_timeout(monkeypatch: pytest.MonkeyPatch):
+    async def hang(config: Config) -> None:
+        await asyncio.sleep(60)
+
+    monkeypatch.setattr(warmup, "warm_queries", hang)
+
+    asyncio.run(asyncio.wait_for(warmup.warmup(Config(WARMUP_TIMEOUT=0.01)), 5))
@@ -1,10 +1,20 @@
+import time
 from dataclasses import asdict
 
-from quart import Quart
+from quart import Quart, Response, g, jsonify, request
 from quart_cors import cors
 
+from yet_another_flask_template.compression import Compressor
 from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import engines
+from yet_another_flask_template.listener import listeners
+from yet_another_flask_template.metrics import METRICS_CONTENT_TYPE, observe_request, render_metrics, server_timing_header, start_timings
+from yet_another_flask_template.modules.core.auth import password_pool, token_cache
 from yet_another_flask_template.modules.core.blueprint import create_blueprint as create_core_blueprint
+from yet_another_flask_template.modules.core.conditional import category_cache
+from yet_another_flask_template.modules.core.jobs import job_handlers, job_workers
+from yet_another_flask_template.modules.core.queries import CATEGORIES_CHANNEL
+from yet_another_flask_template.modules.core.warmup import warmup
 from yet_another_flask_template.serialization import MsgSpecJSONProvider, MsgSpecRequest
 
 Quart.request_class = MsgSpecRequest
@@ -14,6 +24,86 @@ def create_app(config: Config):
     app = Quart(__name__)
     app.config.update(asdict(config))
     cors(app, allow_origin=("http://localhost:5173",))
+
+    @app.before_serving
+    async def start_database():
+        await engines.start(config)
+
+    @app.before_serving
+    async def warm_up():
+        if config.WARMUP_ON_START:
+            # The blueprints are registered by now, the URL matcher is
+            # otherwise built by the first request
+            app.url_map.update()
+            await warmup(config)
+
+    @app.before_serving
+    async def start_listener():
+        listeners.start(config, {CATEGORIES_CHANNEL: category_cache})
+
+    @app.before_serving
+    async def start_job_worker():
+        if config.JOB_WORKER_IN_PROCESS:
+            job_workers.start(config, job_handlers)
+
+    @app.after_serving
+    async def stop_listener():
+        await listeners.stop()
+
+    @app.after_serving
+    async def stop_job_worker():
+        await job_workers.stop()
+
+    @app.after_serving
+    async def stop_database():
+        await engines.dispose()
+
+    @app.after_serving
+    async def stop_password_pool():
+        password_pool.shutdown()
+
+    @app.before_request
+    async def start_request_timer():
+        g.request_started = time.perf_counter()
+        g.timings = start_timings()
+
+    @app.after_request
+    async def record_request_metrics(response: Response) -> Response:
+        started = g.get("request_started")
+        if started is None:
+            return response
+
+        elapsed = time.perf_counter() - started
+        route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        observe_request(request.method, route, response.status_code, elapsed)
+        response.headers["Server-Timing"] = server_timing_header(g.timings, elapsed)
+        return response
+
+    compressor = Compressor.from_config(config)
+
+    # Registered after the metrics hook, so it runs before it and is timed
+    @app.after_request
+    async def compress_response(response: Response) -> Response:
+        return await compressor.compress(request, response)
+
+    # Internal only: unit answers these with 404 on the public listener,
+    # they're served on :9090, which isn't published (see unit-config.json)
+    @app.get("/metrics")
+    async def metrics():
+        return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+    @app.get("/_stats/pool/")
+    async def pool_stats():
+        return jsonify(engines.stats())
+
+    @app.get("/_stats/category_cache/")
+    async def category_cache_stats():
+        return jsonify(category_cache.stats())
+
+    @app.get("/_stats/token_cache/")
+    async def token_cache_stats():
+        return jsonify(token_cache.stats())
+
     return app
 
 # Make config
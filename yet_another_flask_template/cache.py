@@ -0,0 +1,123 @@
+"""In-process caching helpers."""
+import threading
+import time
+from collections import OrderedDict
+from typing import Generic, Hashable, TypeVar
+
+import msgspec
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheStats(msgspec.Struct):
+    size: int
+    maxsize: int
+    hits: int
+    misses: int
+
+
+class TTLCache(Generic[K, V]):
+    """Bounded LRU cache with per-item expiration.
+
+    Shared between nginx unit threads of the same process, so every
+    operation takes a lock.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            item = self._items.get(key)
+
+            if item is None or item[0] < time.monotonic():
+                self._items.pop(key, None)
+                self.misses += 1
+                return None
+
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[1]
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> V:
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            self._items[key] = (expires_at, value)
+            self._items.move_to_end(key)
+
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+        return value
+
+    def invalidate(self, key: K) -> None:
+        with self._lock:
+            self._items.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            size=len(self._items),
+            maxsize=self.maxsize,
+            hits=self.hits,
+            misses=self.misses,
+        )
+
+
+class NotifiedCache(Generic[K, V]):
+    """Cache kept coherent by change notifications, see `listener.py`.
+
+    While a listener is connected entries live for `ttl`, otherwise for the
+    short `fallback_ttl`. Values read before an invalidation are not stored,
+    so a fill racing with a change can't bring stale data back.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, fallback_ttl: float) -> None:
+        self.ttl = ttl
+        self.fallback_ttl = fallback_ttl
+        self.generation = 0
+        self.listeners = 0
+        self._lock = threading.Lock()
+        self._cache: TTLCache[K, V] = TTLCache(maxsize=maxsize, ttl=fallback_ttl)
+
+    def get(self, key: K) -> V | None:
+        return self._cache.get(key)
+
+    def set(self, key: K, value: V, generation: int) -> V:
+        """Stores the value read while the cache was at `generation`"""
+        with self._lock:
+            if generation == self.generation:
+                self._cache.set(key, value, ttl=self.ttl if self.listeners else self.fallback_ttl)
+        return value
+
+    def invalidate_all(self) -> None:
+        with self._lock:
+            self.generation += 1
+            self._cache.clear()
+
+    def on_notify(self, payload: str) -> None:
+        self.invalidate_all()
+
+    def on_connect(self) -> None:
+        # Notifications sent while disconnected are lost
+        with self._lock:
+            self.listeners += 1
+        self.invalidate_all()
+
+    def on_disconnect(self) -> None:
+        with self._lock:
+            self.listeners -= 1
+        self.invalidate_all()
+
+    def stats(self) -> CacheStats:
+        return self._cache.stats()
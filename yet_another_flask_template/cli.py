@@ -3,14 +3,305 @@ import click
 
 
 def make_alembic_config() -> AlembicConfig:
+    from yet_another_flask_template.config import load_config
+
+    url = load_config().db_url(engine="psycopg2").render_as_string(hide_password=False)
+
     alembic_cfg = AlembicConfig()
-    alembic_cfg.set_main_option("script_location", "app:module") # Uses app/module.py
-    alembic_cfg.set_main_option("sqlalchemy.url", "sqlalchemy-url")
-    alembic_cfg.set_main_option("version_table_schema", "public")
+    alembic_cfg.set_main_option("script_location", "yet_another_flask_template:migrations")
+    # Escaped, the options are interpolated by configparser
+    alembic_cfg.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    alembic_cfg.set_main_option("version_table_schema", "education")
     return alembic_cfg
 
 
 @click.group()
 def cli():
-    pass
+    """yaft: operational commands of yet-another-flask-template"""
+
+
+@cli.command()
+@click.argument("revision", default="head")
+@click.option("--sql", is_flag=True, help="Print the SQL instead of running it")
+def migrate(revision: str, sql: bool):
+    """Upgrades the database schema to REVISION"""
+    from alembic import command
+
+    command.upgrade(make_alembic_config(), revision, sql=sql)
+
+
+@cli.command()
+@click.option("--users", type=int, default=1_000_000, show_default=True)
+@click.option("--categories", type=int, default=20_000, show_default=True)
+@click.option("--entries", type=int, default=2_000_000, show_default=True)
+@click.option("--depth", type=int, default=6, show_default=True, help="Levels of the category tree")
+@click.option("--seed", "random_seed", type=int, default=0, show_default=True)
+def seed(users: int, categories: int, entries: int, depth: int, random_seed: int):
+    """Fills the database with fake data using COPY, see `seed.py`"""
+    import asyncio
+    import time
+
+    from yet_another_flask_template import seed as seeding
+    from yet_another_flask_template.config import load_config
+
+    started = time.perf_counter()
+
+    def show(table: str, rows: int) -> None:
+        click.echo(f"{table:<24} {rows:>10} rows  {time.perf_counter() - started:>8.1f}s")
+
+    size = seeding.SeedSize(users, categories, entries, depth, random_seed)
+    asyncio.run(seeding.seed(load_config(), size, on_table=show))
+    click.echo(f"Users sign in as seed-<id> with password {seeding.SEED_PASSWORD!r}")
+
+
+@cli.command()
+@click.option("--calls", type=int, default=200, show_default=True, help="Calls of every query function")
+@click.option("-k", "--filter", "pattern", default="", help="Only run query functions with this substring in the name")
+@click.option("--seed", "random_seed", type=int, default=0, show_default=True)
+def bench(calls: int, pattern: str, random_seed: int):
+    """Measures latency of the query functions against the database"""
+    import asyncio
+
+    from yet_another_flask_template import plans, querybench
+    from yet_another_flask_template.config import load_config
+
+    click.echo(f"{'query':<32} {'mean':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  (ms)")
+
+    def show(name: str, stats: querybench.QueryStats) -> None:
+        click.echo(
+            f"{name:<32} {stats.mean_ms:>8.2f} {stats.p50_ms:>8.2f} {stats.p95_ms:>8.2f} "
+            f"{stats.p99_ms:>8.2f} {stats.max_ms:>8.2f}"
+        )
+
+    cases = [case for case in plans.collect_cases() if pattern in case.name]
+    asyncio.run(querybench.run(load_config(), cases, calls, seed=random_seed, on_result=show))
+
+
+@cli.command()
+@click.argument("method")
+@click.argument("path")
+@click.option("--data", default=None, help="JSON body of the request")
+@click.option("--requests", type=int, default=100, show_default=True)
+@click.option("--user", "username", default=None, help="Sign in as this user first, e.g. a seeded one")
+@click.option("--password", default=None, help="Defaults to the password of seeded users")
+@click.option("--sort", default="cumulative", show_default=True, help="pstats sort key")
+@click.option("--limit", type=int, default=30, show_default=True, help="Functions to show")
+@click.option("--output", type=click.Path(dir_okay=False), help="Also dump the raw profile, e.g. for snakeviz")
+def profile(method: str, path: str, data: str | None, requests: int, username: str | None, password: str | None, sort: str, limit: int, output: str | None):
+    """Profiles requests to a handler in-process and prints the hotspots"""
+    import asyncio
+    import pstats
+
+    import msgspec
+
+    from yet_another_flask_template import profiling, seed as seeding
+
+    body = None if data is None else msgspec.json.decode(data)
+    profiler = asyncio.run(profiling.profile_requests(
+        method.upper(), path, body, requests, username, password or seeding.SEED_PASSWORD,
+    ))
+
+    if output:
+        profiler.dump_stats(output)
+
+    pstats.Stats(profiler).strip_dirs().sort_stats(sort).print_stats(limit)
+
+
+@cli.command()
+@click.argument("module", default="yet_another_flask_template.app")
+@click.option("--limit", type=int, default=20, show_default=True, help="Packages and modules to show")
+def importtime(module: str, limit: int):
+    """Shows what importing MODULE costs a fresh process, by package and by module"""
+    from yet_another_flask_template import profiling
+
+    times = profiling.import_times(module)
+    total = sum(t.self_us for t in times)
+    click.echo(f"{'total':<48} {total / 1000:>8.1f} ms")
+
+    click.echo(f"\n{'package':<48} {'ms':>8} {'share':>7}")
+    packages = profiling.top_level_times(times)
+    for package, us in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+        click.echo(f"{package:<48} {us / 1000:>8.1f} {us / total:>7.1%}")
+
+    click.echo(f"\n{'module':<48} {'self ms':>8} {'cumul ms':>9}")
+    for t in sorted(times, key=lambda t: -t.self_us)[:limit]:
+        click.echo(f"{t.module:<48} {t.self_us / 1000:>8.1f} {t.cumulative_us / 1000:>9.1f}")
+
+
+@cli.command()
+@click.option("--save", type=click.Path(dir_okay=False), help="Write results to this JSON baseline")
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False), help="Compare results with this JSON baseline")
+@click.option("--threshold", type=float, default=0.25, show_default=True, help="Allowed slowdown against the baseline")
+@click.option("-k", "--filter", "pattern", default="", help="Only run benchmarks with this substring in the name")
+@click.option("--rows", type=int, multiple=True, default=(10_000, 100_000, 1_000_000), show_default=True, help="Row counts for the mapper benchmarks")
+def microbench(save: str | None, baseline: str | None, threshold: float, pattern: str, rows: tuple[int, ...]):
+    """Runs the offline microbenchmarks, exits with 1 on regressions"""
+    try:
+        from benchmarks import microbench as bench
+    except ModuleNotFoundError as e:
+        if e.name not in ("benchmarks", "tests"):
+            raise
+        raise click.ClickException("Run it from the root of a checkout, the benchmarks aren't installed with the package")
+
+    def show(name: str, result: bench.BenchResult) -> None:
+        click.echo(f"{name:<40} {result.median_ns / 1000:>12.2f} us  (min {result.min_ns / 1000:.2f} us)")
+
+    selected = [b for b in bench.collect_benchmarks(rows) if pattern in b.name]
+    report = bench.run(selected, on_result=show)
+
+    if save:
+        bench.save_report(report, save)
+        click.echo(f"Saved baseline to {save}")
+
+    if baseline:
+        comparisons = bench.compare(bench.load_report(baseline), report)
+        for c in comparisons:
+            click.echo(f"{c.name:<40} {c.change:>+8.1%}")
+
+        slower = bench.regressions(comparisons, threshold)
+        if slower:
+            click.echo(f"{len(slower)} benchmark(s) are more than {threshold:.0%} slower than {baseline}", err=True)
+            raise SystemExit(1)
+
+
+@cli.command()
+@click.option("--save", type=click.Path(dir_okay=False), help="Write the plans to this JSON baseline")
+@click.option("--compare", "baseline", type=click.Path(exists=True, dir_okay=False), help="Compare estimated costs with this JSON baseline")
+@click.option("--threshold", type=float, default=0.5, show_default=True, help="Allowed cost growth against the baseline")
+@click.option("--analyze/--no-analyze", default=True, show_default=True, help="Refresh planner statistics first")
+def explain(save: str | None, baseline: str | None, threshold: float, analyze: bool):
+    """EXPLAINs every query against the database, exits with 1 on seq scans or cost regressions"""
+    import asyncio
+
+    from yet_another_flask_template import plans
+    from yet_another_flask_template.config import load_config
+
+    cases = plans.collect_cases()
+    report = asyncio.run(plans.run(load_config(), cases, analyze))
+
+    for name, statement_plans in report.cases.items():
+        for plan in statement_plans:
+            scans = f"  seq scan: {', '.join(plan.seq_scans)}" if plan.seq_scans else ""
+            click.echo(f"{name:<32} {plan.total_cost:>12.2f}{scans}")
+
+    if save:
+        plans.save_report(report, save)
+        click.echo(f"Saved baseline to {save}")
+
+    problems = plans.unexpected_seq_scans(report, cases)
+    if baseline:
+        problems += plans.cost_regressions(plans.load_report(baseline), report, threshold)
+
+    for problem in problems:
+        click.echo(f"{problem.case}: {problem.message}\n    {problem.sql}", err=True)
+
+    if problems:
+        raise SystemExit(1)
+
+
+@cli.group()
+def jobs():
+    """Background jobs, see `modules/core/jobs.py`"""
+
+
+@jobs.command("work")
+def jobs_work():
+    """Runs a worker until interrupted"""
+    import asyncio
+
+    from yet_another_flask_template.config import load_config
+    from yet_another_flask_template.modules.core import jobs
+
+    asyncio.run(jobs.work(load_config()))
+
+
+@jobs.command("enqueue")
+@click.argument("kind")
+@click.option("--payload", default="null", help="JSON payload of the job")
+@click.option("--delay", type=float, default=0.0, show_default=True, help="Seconds before the job may run")
+@click.option("--max-attempts", type=int, default=5, show_default=True)
+def jobs_enqueue(kind: str, payload: str, delay: float, max_attempts: int):
+    """Adds a job to the queue, for cron: `jobs enqueue purge_rate_limits`"""
+    import asyncio
+
+    import msgspec
+
+    from yet_another_flask_template.config import load_config
+    from yet_another_flask_template.modules.core import jobs
+    from yet_another_flask_template.modules.core.schemas import NewJob
+
+    if kind not in jobs.job_handlers:
+        raise click.BadParameter(f"Known kinds: {', '.join(sorted(jobs.job_handlers))}", param_hint="KIND")
+
+    job = NewJob(kind, msgspec.json.decode(payload), delay, max_attempts)
+    click.echo(f"Enqueued job {asyncio.run(jobs.enqueue(load_config(), job))}")
+
+
+@cli.group()
+def users():
+    """User administration, see `modules/core/users.py`"""
+
+
+@users.command("deactivate")
+@click.argument("user_id", type=int)
+def users_deactivate(user_id: int):
+    """Keeps the user from signing in and revokes their tokens"""
+    import asyncio
+
+    from yet_another_flask_template.config import load_config
+    from yet_another_flask_template.modules.core import users
+
+    asyncio.run(users.deactivate(load_config(), user_id))
+    click.echo(f"Deactivated user {user_id}, their tokens are refused within TOKEN_TTL")
+
+
+@cli.group()
+def loadtest():
+    """Replayable load tests, see `loadtest.py`"""
+
+
+@loadtest.command("generate")
+@click.argument("output", type=click.Path(dir_okay=False))
+@click.option("--users", type=int, default=20, show_default=True, help="Virtual users, each replays its requests sequentially")
+@click.option("--requests", type=int, default=5000, show_default=True)
+@click.option("--categories", type=int, default=10, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+def loadtest_generate(output: str, users: int, requests: int, categories: int, seed: int):
+    """Writes a traffic file"""
+    from yet_another_flask_template import loadtest
+
+    loadtest.save_traffic(loadtest.generate_traffic(users, requests, categories, seed), output)
+
+
+@loadtest.command("run")
+@click.argument("traffic", type=click.Path(exists=True, dir_okay=False))
+@click.option("--url", help="Base URL of a running server, the app runs in-process if not set")
+@click.option("--save", type=click.Path(dir_okay=False), help="Write the report to this JSON file")
+def loadtest_run(traffic: str, url: str | None, save: str | None):
+    """Replays a traffic file and reports latency per route"""
+    import asyncio
+
+    from yet_another_flask_template import loadtest
+
+    requests = loadtest.load_traffic(traffic)
+    report = asyncio.run(
+        loadtest.run_over_http(url, requests) if url else loadtest.run_in_process(requests)
+    )
+    click.echo(loadtest.format_report(report))
+
+    if save:
+        loadtest.save_report(report, save)
+
+
+@loadtest.command("compare")
+@click.argument("before", type=click.Path(exists=True, dir_okay=False))
+@click.argument("after", type=click.Path(exists=True, dir_okay=False))
+def loadtest_compare(before: str, after: str):
+    """Compares two saved reports"""
+    from yet_another_flask_template import loadtest
+
+    click.echo(loadtest.format_comparison(loadtest.load_report(before), loadtest.load_report(after)))
+
 
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,112 @@
+"""Negotiated response compression.
+
+gzip and deflate are always offered, zstd only when the optional `zstandard`
+package is installed. Bodies of responses with an ETag are cached compressed
+by a digest of the body, so unchanged listings aren't compressed again on
+every request.
+"""
+import asyncio
+import gzip
+import hashlib
+import zlib
+from typing import Callable
+
+from quart import Request, Response
+from quart.wrappers.response import DataBody
+
+from yet_another_flask_template.cache import TTLCache
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.metrics import timed
+
+try:
+    import zstandard  # type: ignore
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = frozenset(["application/json", "application/x-ndjson"])
+# zlib releases the GIL, so large bodies are compressed off the event loop
+OFFLOAD_SIZE = 256 * 1024
+
+
+def make_encoders(level: int) -> dict[str, Callable[[bytes], bytes]]:
+    """Encoders in the order of preference for equal client quality"""
+    encoders: dict[str, Callable[[bytes], bytes]] = {}
+
+    if zstandard is not None:
+        # Compressor objects aren't thread-safe, so every call gets its own
+        encoders["zstd"] = lambda body: zstandard.ZstdCompressor(level=level).compress(body)
+
+    encoders["gzip"] = lambda body: gzip.compress(body, compresslevel=level, mtime=0)
+    encoders["deflate"] = lambda body: zlib.compress(body, level)
+    return encoders
+
+
+def is_compressible(response: Response) -> bool:
+    return (
+        response.status_code == 200
+        # Streamed and file bodies are sent as they are produced
+        and isinstance(response.response, DataBody)
+        and "Content-Encoding" not in response.headers
+        and (response.mimetype in COMPRESSIBLE_MIMETYPES or response.mimetype.startswith("text/"))
+    )
+
+
+class Compressor:
+    def __init__(self, min_size: int, level: int, cache_size: int, cache_ttl: float) -> None:
+        self.min_size = min_size
+        self.encoders = make_encoders(level)
+        self.cache: TTLCache[tuple[bytes, str], bytes] = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    @classmethod
+    def from_config(cls, config: Config) -> "Compressor":
+        return cls(
+            min_size=config.COMPRESS_MIN_SIZE,
+            level=config.COMPRESS_LEVEL,
+            cache_size=config.COMPRESS_CACHE_SIZE,
+            cache_ttl=config.COMPRESS_CACHE_TTL,
+        )
+
+    async def _encode(self, encoding: str, body: bytes) -> bytes:
+        encode = self.encoders[encoding]
+
+        if len(body) < OFFLOAD_SIZE:
+            return encode(body)
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, encode, body)
+
+    async def compress(self, request: Request, response: Response) -> Response:
+        if not is_compressible(response):
+            return response
+
+        body = await response.get_data()
+        if len(body) < self.min_size:
+            return response
+
+        response.vary.add("Accept-Encoding")
+
+        encoding = request.accept_encodings.best_match(list(self.encoders))
+        if encoding is None:
+            return response
+
+        etag, weak = response.get_etag()
+        # Only tagged responses are cached, their bodies repeat until the
+        # listing changes; keyed by the body itself, so nothing is shared
+        # between different bodies
+        key = (hashlib.blake2b(body, digest_size=16).digest(), encoding) if etag is not None else None
+        compressed = self.cache.get(key) if key is not None else None
+
+        if compressed is None:
+            with timed("compress"):
+                compressed = await self._encode(encoding, body)
+            if key is not None:
+                self.cache.set(key, compressed)
+
+        response.set_data(compressed)
+        response.headers["Content-Encoding"] = encoding
+
+        if etag is not None and not weak:
+            # The encoded body is a different representation of the same resource
+            response.set_etag(etag, weak=True)
+
+        return response
@@ -1,4 +1,4 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from sqlalchemy import URL
 
@@ -10,18 +10,87 @@ class Config:
     DB_NAME: str = "postgres"
     DB_HOST: str = "localhost"
     DB_PORT: str = "5432"
-    
-    def db_url(self, engine: str ="asyncpg") -> URL:
+    # Pool settings are per event loop: nginx unit runs every thread with its
+    # own loop, so the process may hold up to threads * (size + overflow) connections.
+    DB_POOL_SIZE: int = 5
+    DB_POOL_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: float = 10.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_POOL_WARMUP: int = 2
+    # Runs `modules/core/warmup.py` in before_serving, so the first requests
+    # after a restart don't compile queries and load modules
+    WARMUP_ON_START: bool = True
+    # Seconds before_serving waits for the query warmup
+    WARMUP_TIMEOUT: float = 30.0
+    # Reads are spread over replicas when they are set, same port and credentials as primary
+    DB_REPLICA_HOSTS: list[str] = field(default_factory=list)
+    # After a write, the session keeps reading from primary for this long
+    DB_REPLICA_PIN_SECONDS: float = 5.0
+    # Lifetime of issued auth tokens, in seconds; expired ones are refreshed
+    # on the next request until TOKEN_REFRESH_TTL has passed since sign in
+    TOKEN_TTL: int = 15 * 60
+    TOKEN_REFRESH_TTL: int = 7 * 24 * 60 * 60
+    # Verified tokens, kept until they expire or are evicted
+    TOKEN_CACHE_SIZE: int = 10000
+    # bcrypt hashing pool, "thread" or "process"
+    PASSWORD_POOL_KIND: str = "thread"
+    PASSWORD_POOL_WORKERS: int = 2
+    PASSWORD_POOL_MAX_QUEUE: int = 32
+    BULK_MAX_ITEMS: int = 10000
+    # Peers whose X-Forwarded-For is believed when looking for the client's
+    # address, like the nginx in front of unit; a client connecting from
+    # these networks directly could claim any address
+    TRUSTED_PROXIES: list[str] = field(default_factory=lambda: [
+        "127.0.0.0/8", "::1/128", "10.0.0.0/8", "172.16.0.0/12", "192.168.0.0/16",
+    ])
+    # Token buckets of sign in attempts, shared by all processes through
+    # Postgres: BURST attempts at once, refilled by PER_MINUTE
+    SIGN_IN_RATE_IP_BURST: int = 50
+    SIGN_IN_RATE_IP_PER_MINUTE: float = 20.0
+    SIGN_IN_RATE_USER_BURST: int = 5
+    SIGN_IN_RATE_USER_PER_MINUTE: float = 1.0
+    # Encoded category listings, dropped on change notifications; while the
+    # listener is disconnected they only live for the fallback TTL
+    CATEGORY_CACHE_SIZE: int = 64
+    CATEGORY_CACHE_TTL: float = 600.0
+    CATEGORY_CACHE_FALLBACK_TTL: float = 5.0
+    # How often the LISTEN connection is pinged to notice it dropped
+    DB_LISTEN_CHECK_INTERVAL: float = 5.0
+    # Background jobs, see `modules/core/jobs.py`; in-process workers run
+    # on every loop of every unit process, next to the request handlers
+    JOB_WORKER_IN_PROCESS: bool = False
+    JOB_CONCURRENCY: int = 4
+    JOB_POLL_INTERVAL: float = 1.0
+    # A job not finished by then is run again by another worker
+    JOB_LEASE_SECONDS: float = 300.0
+    # Retries wait BASE * 2 ** (attempt - 1) seconds, up to MAX
+    JOB_BACKOFF_BASE: float = 5.0
+    JOB_MAX_BACKOFF: float = 3600.0
+    # Running jobs are cancelled, and retried later, if they take longer to stop
+    JOB_SHUTDOWN_TIMEOUT: float = 10.0
+    # Deleted entries are purged by the purge_deleted_entries job once they
+    # are this old, in batches that each run as a job of their own
+    ENTRY_PURGE_AFTER: float = 30 * 24 * 60 * 60
+    ENTRY_PURGE_BATCH_SIZE: int = 500
+    ENTRY_PURGE_PAUSE: float = 1.0
+    # Responses smaller than this are sent as is
+    COMPRESS_MIN_SIZE: int = 1024
+    COMPRESS_LEVEL: int = 6
+    # Compressed bodies of responses with an ETag
+    COMPRESS_CACHE_SIZE: int = 256
+    COMPRESS_CACHE_TTL: float = 300.0
+
+    def db_url(self, engine: str ="asyncpg", host: str | None = None) -> URL:
         return URL.create(
             f"postgresql+{engine}",
             username=self.DB_USER,
             password=self.DB_PASS,
             database=self.DB_NAME,
-            host=self.DB_HOST,
+            host=host or self.DB_HOST,
             port=int(self.DB_PORT),
         )
 
 
 def load_config() -> Config:
     return Config()
-
@@ -1,26 +1,36 @@
+import random
+import time
 from dataclasses import dataclass
 from functools import wraps
 from typing import Protocol, Any, Callable, Concatenate, cast
 
-from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 from returns.future import FutureResult, FutureResultE, future_safe
 from returns.io import IOResult, IOSuccess, IOFailure
-from returns.pipeline import flow, managed
-from returns.pointfree import bind_future_result, map_
+from returns.result import Result
+from returns.pipeline import flow, is_successful, managed
+from returns.pointfree import bind_result, map_
 
-from quart import Response, jsonify, request, session
+from quart import Response, request, session
 from quart.sessions import SessionMixin, SessionInterface
 
 from yet_another_flask_template.config import Config
 from yet_another_flask_template.errors import HttpException, ServerErrorException
-from yet_another_flask_template.serialization import MsgSpecRequest, encode_http_exception
+from yet_another_flask_template.serialization import MsgSpecRequest, WithHeaders, http_exception_response, json_response
 from yet_another_flask_template.types import P, QuartRealResponse, QuartResponse, T_msg
-from yet_another_flask_template.database import create_engine
+from yet_another_flask_template.metrics import timed
+from yet_another_flask_template.database import LazyConnection, PooledEngine, engines
+
+
+# Session key holding the time until which reads must go to the primary
+PRIMARY_PIN_KEY = "primary_until"
 
 
 class Context(Protocol):
     @property
-    def db_conn(self) -> AsyncConnection: ...
+    def db_conn(self) -> LazyConnection: ...
+
+    @property
+    def replica_conn(self) -> LazyConnection: ...
 
     @property
     def conf(self) -> Config: ...
@@ -35,62 +45,107 @@ class Context(Protocol):
 
 @dataclass
 class AppContext:
-    db_conn: AsyncConnection
+    db_conn: LazyConnection
+    replica_conn: LazyConnection
     conf: Config
     request: MsgSpecRequest
     session: SessionInterface
 
 
-_create_conn = AsyncEngine.connect
-_start_conn = future_safe(AsyncConnection.start)
+def read_only(fn: Callable[P, QuartResponse]) -> Callable[P, QuartResponse]:
+    """Marks a handler that never writes, so its queries run without a transaction.
+
+    Apply it under `app_context`/`authorized_context`.
+    """
+    setattr(fn, "read_only", True)
+    return fn
+
+
+def autocommit(fn: Callable[P, QuartResponse]) -> Callable[P, QuartResponse]:
+    """Marks a handler whose writes are committed statement by statement.
+
+    They stay even when the handler fails, so they must not depend on each
+    other. Apply it under `app_context`/`authorized_context`.
+    """
+    setattr(fn, "autocommit", True)
+    return fn
 
-def create_context() -> FutureResultE[Context]:
+
+def create_context(read_only: bool = False, autocommit: bool = False) -> FutureResultE[Context]:
     config = Config()
 
     if not isinstance(request, MsgSpecRequest):
         return FutureResultE.from_failure(Exception("Set app.request_class to `MsgSpecRequest` before using this context"))
-    
-    db_conn: FutureResultE[AsyncConnection] = flow(
+
+    def make_context(conn: LazyConnection) -> Result[Context, Exception]:
+        return replica_connection(config, session, conn).map(
+            lambda replica: AppContext(
+                conn,
+                replica,
+                config,
+                request,
+                cast(SessionInterface, session), # type: ignore
+            )
+        )
+
+    # The connection itself is only checked out by the first query
+    return flow(
         config,
-        create_engine,
-        map_(_create_conn),
+        engines.get,
         FutureResultE.from_result,
-        bind_future_result(_start_conn),
+        map_(lambda pooled: LazyConnection(pooled, read_only=read_only, autocommit=autocommit)),
+        bind_result(make_context),
     )
 
-    return FutureResultE.do(
-        AppContext(
-            conn,
-            config,
-            request,
-            cast(SessionInterface, session), # type: ignore
-        )
-        async for conn in db_conn
-    )
+
+def replica_connection(config: Config, session: SessionMixin, primary: LazyConnection) -> Result[LazyConnection, Exception]:
+    """Picks a replica to read from, or the primary if the session wrote recently"""
+    if not config.DB_REPLICA_HOSTS or session.get(PRIMARY_PIN_KEY, 0) > time.time():
+        return Result.from_value(primary)
+
+    host = random.choice(config.DB_REPLICA_HOSTS)
+
+    def make_connection(pooled: PooledEngine) -> LazyConnection:
+        return LazyConnection(pooled, read_only=True)
+
+    return engines.get(config, host).map(make_connection)
 
 
 @future_safe
-async def clean_context(context: Context, *_: Any) -> None:
-    await context.db_conn.commit()
-    await context.db_conn.close()
+async def clean_context(context: Context, result: Result[Any, HttpException]) -> None:
+    committed = await context.db_conn.release(commit=is_successful(result))
+
+    if context.replica_conn is not context.db_conn:
+        await context.replica_conn.release(commit=False)
+
+    # Replicas may not have the write yet, read it back from the primary for a while
+    if committed and context.conf.DB_REPLICA_HOSTS:
+        context.session[PRIMARY_PIN_KEY] = time.time() + context.conf.DB_REPLICA_PIN_SECONDS
+
 
+def quartify(result: IOResult[T_msg | Response, HttpException]) -> tuple[Response, int]:
+    with timed("encode"):
+        return _quartify(result)
 
-def quartify(result: IOResult[T_msg, HttpException]) -> tuple[Response, int]:
+
+def _quartify(result: IOResult[T_msg | Response, HttpException]) -> tuple[Response, int]:
     match result:
         case IOSuccess(v):
-            return jsonify(v.unwrap()), 200
-        case IOFailure(e):
-            f = e.failure()
+            value = v.unwrap()
 
-            resp = flow(
-                f,
-                encode_http_exception,
-                jsonify
-            )
+            # Handlers may build the response themselves, e.g. for streaming
+            if isinstance(value, Response):
+                return value, value.status_code
 
-            return resp, f.status_code
+            if isinstance(value, WithHeaders):
+                return json_response(value.value, headers=value.headers), 200
+
+            return json_response(value), 200
+        case IOFailure(e):
+            f = e.failure()
+            return http_exception_response(f), f.status_code
 
-    return jsonify(encode_http_exception(ServerErrorException())), 500
+    return http_exception_response(ServerErrorException()), 500
 
 
 def app_context(fn: Callable[Concatenate[Context, P], QuartResponse]) -> Callable[P, QuartRealResponse]: 
@@ -100,7 +155,10 @@ def app_context(fn: Callable[Concatenate[Context, P], QuartResponse]) -> Callabl
             return fn(ctx, *args, **kwargs)
 
         res = await flow(
-            create_context(),
+            create_context(
+                read_only=getattr(fn, "read_only", False),
+                autocommit=getattr(fn, "autocommit", False),
+            ),
             managed(context_fn, clean_context),
             FutureResult.awaitable
         )
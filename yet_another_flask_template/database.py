@@ -1,17 +1,234 @@
 """Database management related functionality."""
-from returns.pipeline import flow
+import asyncio
+import threading
+import time
+from asyncio import AbstractEventLoop
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncContextManager, AsyncIterator, Protocol
+
+import msgspec
 from returns.result import safe
 
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy import CursorResult, event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncTransaction, create_async_engine
 
 from yet_another_flask_template.config import Config
+from yet_another_flask_template.logger import logger
+from yet_another_flask_template.metrics import POOL_CHECKED_OUT, POOL_CONNECTS, POOL_WAIT
+
+
+class DbConnection(Protocol):
+    """Part of `AsyncConnection` the queries rely on"""
+
+    async def execute(self, statement: Any, parameters: Any = None) -> CursorResult[Any]: ...
+
+    def begin_nested(self) -> AsyncContextManager[AsyncTransaction]: ...
+
+
+class PoolStats(msgspec.Struct):
+    engines: int
+    size: int
+    checked_out: int
+    overflow: int
+    checkouts: int
+    connects: int
+    wait_total_ms: float
+    wait_max_ms: float
+
+
+@dataclass
+class PoolCounters:
+    checkouts: int = 0
+    connects: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+
+    def record_wait(self, seconds: float) -> None:
+        self.wait_total += seconds
+        self.wait_max = max(self.wait_max, seconds)
+
+
+@dataclass
+class PooledEngine:
+    engine: AsyncEngine
+    counters: PoolCounters = field(default_factory=PoolCounters)
+
+    def __post_init__(self) -> None:
+        pool = self.engine.sync_engine.pool
+        event.listen(pool, "checkout", self._on_checkout)
+        event.listen(pool, "checkin", self._on_checkin)
+        event.listen(pool, "connect", self._on_connect)
+
+    def _on_checkout(self, *_: Any) -> None:
+        self.counters.checkouts += 1
+        POOL_CHECKED_OUT.inc()
+
+    def _on_checkin(self, *_: Any) -> None:
+        POOL_CHECKED_OUT.dec()
+
+    def _on_connect(self, *_: Any) -> None:
+        self.counters.connects += 1
+        POOL_CONNECTS.inc()
+
+    async def connect(self) -> AsyncConnection:
+        """Checks out a connection, recording how long the pool made us wait"""
+        started = time.perf_counter()
+        conn = await self.engine.connect().start()
+        waited = time.perf_counter() - started
+        self.counters.record_wait(waited)
+        POOL_WAIT.observe(waited)
+        return conn
+
+    async def warmup(self, connections: int) -> None:
+        async def ping() -> None:
+            async with self.engine.connect() as conn:
+                await conn.execute(text("SELECT 1"))
+
+        await asyncio.gather(*(ping() for _ in range(connections)))
+
+
+class LazyConnection:
+    """Checks a connection out of the pool on the first query only.
+
+    Read-only and autocommit connections run in autocommit mode, so they
+    never send BEGIN/COMMIT; transactions of the others are finished by
+    `release`. Autocommit is for writes that must stick even when the rest
+    of the work fails, e.g. taken rate limit tokens.
+    """
+
+    def __init__(self, pooled: PooledEngine, read_only: bool = False, autocommit: bool = False) -> None:
+        self.read_only = read_only
+        self.autocommit = autocommit or read_only
+        self._pooled = pooled
+        self._conn: AsyncConnection | None = None
+
+    @property
+    def acquired(self) -> bool:
+        return self._conn is not None
+
+    @property
+    def pooled(self) -> PooledEngine:
+        return self._pooled
+
+    async def connection(self) -> AsyncConnection:
+        if self._conn is None:
+            conn = await self._pooled.connect()
+            if self.autocommit:
+                conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            self._conn = conn
+        return self._conn
+
+    async def execute(self, statement: Any, parameters: Any = None) -> CursorResult[Any]:
+        conn = await self.connection()
+        return await conn.execute(statement, parameters)
+
+    @asynccontextmanager
+    async def begin_nested(self) -> AsyncIterator[AsyncTransaction]:
+        conn = await self.connection()
+        async with conn.begin_nested() as transaction:
+            yield transaction
+
+    async def release(self, commit: bool) -> bool:
+        """Finishes the transaction and returns the connection to the pool.
+
+        Tells whether a transaction was committed.
+        """
+        conn, self._conn = self._conn, None
+
+        if conn is None:
+            return False
+
+        try:
+            if commit and not self.autocommit:
+                await conn.commit()
+                return True
+            return False
+        finally:
+            # Closing rolls back whatever wasn't committed
+            await conn.close()
 
 
 @safe
-def create_engine(config: Config) -> AsyncEngine:
-    return flow(
-        config.db_url(),
-        create_async_engine,
+def create_engine(config: Config, host: str | None = None) -> AsyncEngine:
+    return create_async_engine(
+        config.db_url(host=host),
+        pool_size=config.DB_POOL_SIZE,
+        max_overflow=config.DB_POOL_MAX_OVERFLOW,
+        pool_timeout=config.DB_POOL_TIMEOUT,
+        pool_recycle=config.DB_POOL_RECYCLE,
+        pool_pre_ping=config.DB_POOL_PRE_PING,
     )
 
 
+class EngineRegistry:
+    """Keeps a single pooled engine per running event loop and database host.
+
+    asyncpg connections can only be used from the loop they were opened on,
+    and nginx unit runs each of its threads with a separate loop, so engines
+    can't be shared process-wide. `host=None` stands for the primary.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._engines: dict[tuple[AbstractEventLoop, str | None], PooledEngine] = {}
+
+    @safe
+    def get(self, config: Config, host: str | None = None) -> PooledEngine:
+        key = (asyncio.get_running_loop(), host)
+
+        with self._lock:
+            pooled = self._engines.get(key)
+            if pooled is None:
+                pooled = PooledEngine(create_engine(config, host).unwrap())
+                self._engines[key] = pooled
+
+        return pooled
+
+    async def start(self, config: Config) -> None:
+        warmup = min(config.DB_POOL_WARMUP, config.DB_POOL_SIZE)
+
+        for host in [None, *config.DB_REPLICA_HOSTS]:
+            try:
+                await self.get(config, host).unwrap().warmup(warmup)
+                logger.info(f"Database pool for {host or config.DB_HOST} is warmed up with {warmup} connection(s)")
+            except Exception as e:
+                logger.warning(f"Failed to warm up database pool for {host or config.DB_HOST}")
+                logger.exception(e)
+
+    async def dispose(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            keys = [key for key in self._engines if key[0] is loop]
+            disposed = [self._engines.pop(key) for key in keys]
+
+        if disposed:
+            logger.info(f"Disposing database pools: {self._stats_of(disposed)}")
+
+        for pooled in disposed:
+            await pooled.engine.dispose()
+
+    def stats(self) -> PoolStats:
+        with self._lock:
+            engines = list(self._engines.values())
+
+        return self._stats_of(engines)
+
+    @staticmethod
+    def _stats_of(engines: list[PooledEngine]) -> PoolStats:
+        pools = [pooled.engine.sync_engine.pool for pooled in engines]
+
+        return PoolStats(
+            engines=len(engines),
+            size=sum(pool.size() for pool in pools),  # type: ignore
+            checked_out=sum(pool.checkedout() for pool in pools),  # type: ignore
+            overflow=sum(max(pool.overflow(), 0) for pool in pools),  # type: ignore
+            checkouts=sum(pooled.counters.checkouts for pooled in engines),
+            connects=sum(pooled.counters.connects for pooled in engines),
+            wait_total_ms=sum(pooled.counters.wait_total for pooled in engines) * 1000,
+            wait_max_ms=max((pooled.counters.wait_max for pooled in engines), default=0.0) * 1000,
+        )
+
+
+engines = EngineRegistry()
@@ -15,6 +15,10 @@ class HttpException(Exception):
     error_code: str
     description: str
 
+    def headers(self) -> dict[str, str]:
+        """Extra headers of the error response"""
+        return {}
+
 
 @dataclass(frozen=True)
 class AlreadyExistsException(HttpException):
@@ -72,6 +76,25 @@ class RequestTimedOut(HttpException):
     description: str = "Connection to the service has timed out"
 
 
+@dataclass(frozen=True)
+class ServiceOverloaded(HttpException):
+    status_code: int = 503
+    error_code: str = "service_overloaded"
+    description: str = "Service is overloaded, try again later"
+
+
+@dataclass(frozen=True)
+class TooManyRequests(HttpException):
+    status_code: int = 429
+    error_code: str = "too_many_requests"
+    description: str = "Too many requests, try again later"
+    # Seconds until the request may succeed
+    retry_after: int = 1
+
+    def headers(self) -> dict[str, str]:
+        return {"Retry-After": str(self.retry_after)}
+
+
 def server_exception(e: Exception) -> ServerErrorException:
     logger.warning("Server exception occured")
     logger.exception(e)
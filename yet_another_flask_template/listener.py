@@ -0,0 +1,126 @@
+"""Postgres LISTEN/NOTIFY subscriptions.
+
+Every event loop keeps one dedicated asyncpg connection listening on the
+channels of its subscribers. Dropped connections are detected by a periodic
+ping and reopened with backoff; subscribers are told about both, so they can
+stop trusting their state while notifications may be missed.
+"""
+import asyncio
+import threading
+from asyncio import AbstractEventLoop
+from typing import Any, Mapping, Protocol
+
+import asyncpg  # type: ignore
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.logger import logger
+
+MAX_BACKOFF = 30.0
+
+
+class Subscriber(Protocol):
+    def on_notify(self, payload: str) -> None: ...
+
+    def on_connect(self) -> None: ...
+
+    def on_disconnect(self) -> None: ...
+
+
+class NotificationListener:
+    def __init__(self, config: Config, subscribers: Mapping[str, Subscriber]) -> None:
+        self.config = config
+        self.subscribers = dict(subscribers)
+        self.connected = False
+        self._task: asyncio.Task | None = None
+        self._had_connection = False
+
+    def _dsn(self) -> str:
+        return self.config.db_url().set(drivername="postgresql").render_as_string(hide_password=False)
+
+    def _callback(self, subscriber: Subscriber):
+        def notify(connection: Any, pid: int, channel: str, payload: str) -> None:
+            subscriber.on_notify(payload)
+
+        return notify
+
+    async def _listen(self) -> None:
+        conn = await asyncpg.connect(self._dsn())
+
+        try:
+            for channel, subscriber in self.subscribers.items():
+                await conn.add_listener(channel, self._callback(subscriber))
+
+            self.connected = self._had_connection = True
+            for subscriber in self.subscribers.values():
+                subscriber.on_connect()
+            logger.info(f"Listening on {', '.join(self.subscribers)}")
+
+            try:
+                while True:
+                    await asyncio.sleep(self.config.DB_LISTEN_CHECK_INTERVAL)
+                    await conn.fetchval("SELECT 1")
+            finally:
+                self.connected = False
+                for subscriber in self.subscribers.values():
+                    subscriber.on_disconnect()
+        finally:
+            if not conn.is_closed():
+                await conn.close()
+
+    async def _run(self) -> None:
+        backoff = 1.0
+
+        while True:
+            self._had_connection = False
+
+            try:
+                await self._listen()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if self._had_connection:
+                    backoff = 1.0
+                logger.warning(f"Notification listener disconnected, retrying in {backoff:.0f}s: {e}")
+
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+
+class ListenerRegistry:
+    """A listener per running event loop, like `database.EngineRegistry`"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._listeners: dict[AbstractEventLoop, NotificationListener] = {}
+
+    def start(self, config: Config, subscribers: Mapping[str, Subscriber]) -> NotificationListener:
+        listener = NotificationListener(config, subscribers)
+
+        with self._lock:
+            self._listeners[asyncio.get_running_loop()] = listener
+
+        listener.start()
+        return listener
+
+    async def stop(self) -> None:
+        with self._lock:
+            listener = self._listeners.pop(asyncio.get_running_loop(), None)
+
+        if listener is not None:
+            await listener.stop()
+
+
+listeners = ListenerRegistry()
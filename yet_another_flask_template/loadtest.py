@@ -0,0 +1,351 @@
+"""Replayable load tests of the whole application.
+
+Traffic files are NDJSON, one `TrafficRequest` per line. Setup requests
+(sign ups, sign ins, the categories the rest of the traffic refers to) run
+first and sequentially; the rest is replayed by one task per virtual user,
+every user with its own session cookie and client address, so the sign in
+rate limits count each user on its own. Usernames get a suffix per run,
+replaying a file again signs up new users instead of draining the limits
+of the previous run's.
+
+Requests go either in-process through the ASGI app, with its startup and
+shutdown hooks, or over HTTP to a running server. Both need the database
+from `Config`, e.g. a local Postgres started with docker-compose.
+"""
+import asyncio
+import math
+import random
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from http.cookiejar import CookieJar
+from typing import Any, Protocol, Sequence
+
+import msgspec
+
+from yet_another_flask_template.config import Config
+
+LOADTEST_PASSWORD = "loadtest-password"
+# Mixed in sign ins per user, the setup one takes the last token of the burst
+SIGN_INS_PER_USER = Config.SIGN_IN_RATE_USER_BURST - 1
+
+
+class TrafficRequest(msgspec.Struct, omit_defaults=True):
+    # Label the request is reported under, e.g. "GET /categories/{category}/entries/"
+    route: str
+    method: str
+    # `{name}` placeholders in the path and body strings are filled with ids
+    # saved by earlier requests, `{run}` with an id of the replay
+    path: str
+    user: int = 0
+    body: Any = None
+    # Saves `id` of the JSON response under this name
+    save: str | None = None
+    setup: bool = False
+
+
+class RouteStats(msgspec.Struct):
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+class LoadReport(msgspec.Struct):
+    target: str
+    users: int
+    duration_s: float
+    requests: int
+    rps: float
+    routes: dict[str, RouteStats]
+
+
+class Transport(Protocol):
+    async def request(self, user: int, method: str, path: str, body: Any) -> tuple[int, bytes]: ...
+
+
+def client_address(user: int) -> str:
+    """Address of a virtual user, from 198.18.0.0/15 which is set aside for benchmarks"""
+    return f"198.{18 + user // 65536 % 2}.{user // 256 % 256}.{user % 256}"
+
+
+def fill(value: Any, saved: dict[str, Any]) -> Any:
+    if isinstance(value, str):
+        return value.format(**saved)
+    if isinstance(value, dict):
+        return {key: fill(item, saved) for key, item in value.items()}
+    if isinstance(value, list):
+        return [fill(item, saved) for item in value]
+    return value
+
+
+@dataclass(frozen=True)
+class Sample:
+    route: str
+    status: int
+    seconds: float
+
+
+def generate_traffic(users: int, requests: int, categories: int = 10, seed: int = 0) -> list[TrafficRequest]:
+    """A read-heavy mix of listings, search, sign ins and writes"""
+    rng = random.Random(seed)
+    traffic: list[TrafficRequest] = []
+
+    def credentials(user: int) -> dict:
+        return {"username": f"loadtest-{seed}-{user}-{{run}}", "password": LOADTEST_PASSWORD}
+
+    for user in range(users):
+        traffic.append(TrafficRequest("POST /sign_up/", "POST", "/sign_up/", user, {**credentials(user), "email": f"loadtest-{seed}-{user}-{{run}}@example.com"}, setup=True))
+        traffic.append(TrafficRequest("POST /sign_in/", "POST", "/sign_in/", user, credentials(user), setup=True))
+
+    for i in range(categories):
+        category = {"image": f"image-{i}.png", "name": f"loadtest-{seed}-{i}", "description": "Load test category"}
+        traffic.append(TrafficRequest("POST /categories/", "POST", "/categories/", 0, category, save=f"category{i}", setup=True))
+
+    def category() -> str:
+        return f"{{category{rng.randrange(categories)}}}"
+
+    def entry() -> dict:
+        return {
+            "title": f"Entry {rng.randrange(1_000_000)}",
+            "description": rng.choice(["python async", "postgres index", "quart handler", "msgspec struct"]),
+            "links": "https://example.com",
+            "keywords": rng.choice(["python", "postgres", "quart", "msgspec"]),
+        }
+
+    mix = [
+        (30, lambda user: TrafficRequest("GET /categories/{category}/entries/", "GET", f"/categories/{category()}/entries/?limit=50", user)),
+        (25, lambda user: TrafficRequest("GET /categories/", "GET", "/categories/?limit=100", user)),
+        (15, lambda user: TrafficRequest("POST /categories/{category}/entries/", "POST", f"/categories/{category()}/entries/", user, entry())),
+        (10, lambda user: TrafficRequest("GET /entries/search/", "GET", f"/entries/search/?q={rng.choice(['python', 'postgres', 'quart'])}", user)),
+        (5, lambda user: TrafficRequest("GET /categories/tree/", "GET", "/categories/tree/", user)),
+        (5, lambda user: TrafficRequest("GET /categories/{category}/subtree/entries/", "GET", f"/categories/{category()}/subtree/entries/?limit=50", user)),
+    ]
+    weights = [weight for weight, _ in mix]
+    makers = [make for _, make in mix]
+    # Sign ins past the rate limits would only measure 429s
+    sign_ins: dict[int, int] = defaultdict(int)
+
+    for _ in range(requests):
+        user = rng.randrange(users)
+        if rng.random() < 0.05 and sign_ins[user] < SIGN_INS_PER_USER:
+            sign_ins[user] += 1
+            traffic.append(TrafficRequest("POST /sign_in/", "POST", "/sign_in/", user, credentials(user)))
+        else:
+            make = rng.choices(makers, weights)[0]
+            traffic.append(make(user))
+
+    return traffic
+
+
+def save_traffic(traffic: Sequence[TrafficRequest], path: str) -> None:
+    encoder = msgspec.json.Encoder()
+    with open(path, "wb") as f:
+        for request in traffic:
+            f.write(encoder.encode(request) + b"\n")
+
+
+def load_traffic(path: str) -> list[TrafficRequest]:
+    decoder = msgspec.json.Decoder(TrafficRequest)
+    with open(path, "rb") as f:
+        return [decoder.decode(line) for line in f if line.strip()]
+
+
+class AsgiTransport:
+    """Drives the app in-process, a test client (and cookie jar) per user"""
+
+    def __init__(self, test_app: Any) -> None:
+        self._test_app = test_app
+        self._clients: dict[int, Any] = {}
+
+    async def request(self, user: int, method: str, path: str, body: Any) -> tuple[int, bytes]:
+        client = self._clients.get(user)
+        if client is None:
+            client = self._clients[user] = self._test_app.test_client()
+
+        data = None if body is None else msgspec.json.encode(body)
+        response = await client.open(
+            path,
+            method=method,
+            data=data,
+            headers={"Content-Type": "application/json"},
+            scope_base={"client": (client_address(user), 0)},
+        )
+        return response.status_code, await response.get_data()
+
+
+class HttpTransport:
+    """Sends requests to a running server, blocking calls run on a thread per user.
+
+    The client address goes in X-Forwarded-For, which the server only
+    trusts from `TRUSTED_PROXIES`, e.g. a load generator on localhost.
+    """
+
+    def __init__(self, base_url: str, users: int) -> None:
+        self._base_url = base_url.rstrip("/")
+        self._executor = ThreadPoolExecutor(max_workers=max(users, 1))
+        self._openers: dict[int, urllib.request.OpenerDirector] = {}
+
+    def _send(self, user: int, method: str, path: str, body: Any) -> tuple[int, bytes]:
+        opener = self._openers.get(user)
+        if opener is None:
+            opener = self._openers[user] = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+
+        data = None if body is None else msgspec.json.encode(body)
+        headers = {"Content-Type": "application/json", "X-Forwarded-For": client_address(user)}
+        request = urllib.request.Request(self._base_url + path, data=data, method=method, headers=headers)
+
+        try:
+            with opener.open(request) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    async def request(self, user: int, method: str, path: str, body: Any) -> tuple[int, bytes]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._send, user, method, path, body)
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+async def replay(transport: Transport, traffic: Sequence[TrafficRequest], run: str | None = None) -> tuple[list[Sample], float]:
+    """Replays the traffic, returning samples of the non-setup requests and their wall time"""
+    saved: dict[str, Any] = {"run": run or f"{time.time_ns():x}"}
+
+    async def send(request: TrafficRequest) -> Sample:
+        started = time.perf_counter()
+        status, body = await transport.request(request.user, request.method, fill(request.path, saved), fill(request.body, saved))
+        elapsed = time.perf_counter() - started
+
+        if request.save is not None and status < 400:
+            saved[request.save] = msgspec.json.decode(body)["id"]
+
+        return Sample(request.route, status, elapsed)
+
+    for request in traffic:
+        if request.setup:
+            sample = await send(request)
+            if sample.status >= 400:
+                raise RuntimeError(f"Setup request {request.method} {request.path} failed with {sample.status}")
+
+    by_user: dict[int, list[TrafficRequest]] = defaultdict(list)
+    for request in traffic:
+        if not request.setup:
+            by_user[request.user].append(request)
+
+    async def run_user(requests: list[TrafficRequest]) -> list[Sample]:
+        return [await send(request) for request in requests]
+
+    started = time.perf_counter()
+    per_user = await asyncio.gather(*(run_user(requests) for requests in by_user.values()))
+    duration = time.perf_counter() - started
+
+    return [sample for samples in per_user for sample in samples], duration
+
+
+def percentile(sorted_values: Sequence[float], q: float) -> float:
+    """Nearest-rank percentile of already sorted values"""
+    if not sorted_values:
+        return 0.0
+    index = max(0, math.ceil(q / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def make_report(target: str, users: int, samples: Sequence[Sample], duration: float) -> LoadReport:
+    by_route: dict[str, list[Sample]] = defaultdict(list)
+    for sample in samples:
+        by_route[sample.route].append(sample)
+
+    def route_stats(route_samples: list[Sample]) -> RouteStats:
+        latencies = sorted(sample.seconds * 1000 for sample in route_samples)
+        return RouteStats(
+            requests=len(route_samples),
+            errors=sum(1 for sample in route_samples if sample.status >= 400),
+            rps=len(route_samples) / duration if duration else 0.0,
+            p50_ms=percentile(latencies, 50),
+            p95_ms=percentile(latencies, 95),
+            p99_ms=percentile(latencies, 99),
+            max_ms=latencies[-1] if latencies else 0.0,
+        )
+
+    return LoadReport(
+        target=target,
+        users=users,
+        duration_s=duration,
+        requests=len(samples),
+        rps=len(samples) / duration if duration else 0.0,
+        routes={route: route_stats(route_samples) for route, route_samples in sorted(by_route.items())},
+    )
+
+
+async def run_in_process(traffic: Sequence[TrafficRequest]) -> LoadReport:
+    from yet_another_flask_template.app import app
+
+    users = len({request.user for request in traffic})
+
+    async with app.test_app() as test_app:
+        samples, duration = await replay(AsgiTransport(test_app), traffic)
+
+    return make_report("asgi", users, samples, duration)
+
+
+async def run_over_http(base_url: str, traffic: Sequence[TrafficRequest]) -> LoadReport:
+    users = len({request.user for request in traffic})
+    transport = HttpTransport(base_url, users)
+
+    try:
+        samples, duration = await replay(transport, traffic)
+    finally:
+        transport.close()
+
+    return make_report(base_url, users, samples, duration)
+
+
+def save_report(report: LoadReport, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(msgspec.json.format(msgspec.json.encode(report)))
+
+
+def load_report(path: str) -> LoadReport:
+    with open(path, "rb") as f:
+        return msgspec.json.decode(f.read(), type=LoadReport)
+
+
+def format_report(report: LoadReport) -> str:
+    lines = [
+        f"{report.target}: {report.requests} requests by {report.users} users in {report.duration_s:.2f}s, {report.rps:.1f} req/s",
+        f"{'route':<48} {'reqs':>7} {'errs':>6} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}",
+    ]
+    for route, stats in report.routes.items():
+        lines.append(
+            f"{route:<48} {stats.requests:>7} {stats.errors:>6} {stats.rps:>8.1f} "
+            f"{stats.p50_ms:>8.2f} {stats.p95_ms:>8.2f} {stats.p99_ms:>8.2f}"
+        )
+    return "\n".join(lines)
+
+
+def format_comparison(before: LoadReport, after: LoadReport) -> str:
+    """Relative changes of `after` against `before`, latencies in ms"""
+    def change(old: float, new: float) -> str:
+        return f"{(new / old - 1):+.1%}" if old else "n/a"
+
+    lines = [
+        f"total req/s: {before.rps:.1f} -> {after.rps:.1f} ({change(before.rps, after.rps)})",
+        f"{'route':<48} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}",
+    ]
+    for route, new in after.routes.items():
+        old = before.routes.get(route)
+        if old is None:
+            continue
+        lines.append(
+            f"{route:<48} {change(old.rps, new.rps):>8} {change(old.p50_ms, new.p50_ms):>8} "
+            f"{change(old.p95_ms, new.p95_ms):>8} {change(old.p99_ms, new.p99_ms):>8}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+"""Prometheus metrics and per-request `Server-Timing` breakdown.
+
+Metric objects are thread-safe, which covers nginx unit's threads. To sum
+them up across unit's processes too, set `PROMETHEUS_MULTIPROC_DIR` to an
+empty directory before the application is imported: every process then
+keeps its values in files there and `/metrics` reads all of them. The
+directory must be emptied before unit starts, the container's
+`entrypoint.sh` does that.
+"""
+import atexit
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Callable, Iterator, ParamSpec
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest
+from prometheus_client import multiprocess
+from returns.future import FutureResult
+from returns.io import IOSuccess
+from returns.result import Result
+from returns.unsafe import unsafe_perform_io
+
+from yet_another_flask_template.errors import HttpException
+from yet_another_flask_template.types import T_any
+
+P = ParamSpec("P")
+
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+METRICS_CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+# Phases reported in `Server-Timing`, in this order
+TIMING_PHASES = ("decode", "auth", "db", "encode")
+
+REQUEST_LATENCY = Histogram(
+    "yaft_request_duration_seconds",
+    "Time until the response headers are ready, per route",
+    ["method", "route"],
+)
+REQUESTS = Counter(
+    "yaft_requests_total",
+    "Handled requests, per route and status code",
+    ["method", "route", "status"],
+)
+QUERY_LATENCY = Histogram(
+    "yaft_db_query_duration_seconds",
+    "Time spent in a query function, including waiting for a connection",
+    ["query", "outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+POOL_CHECKED_OUT = Gauge(
+    "yaft_db_pool_checked_out",
+    "Connections currently checked out of the pools",
+    multiprocess_mode="livesum",
+)
+POOL_CONNECTS = Counter(
+    "yaft_db_pool_connects_total",
+    "New database connections opened by the pools",
+)
+POOL_WAIT = Histogram(
+    "yaft_db_pool_wait_seconds",
+    "Time spent waiting for a connection checkout",
+    buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0),
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "yaft_password_hash_seconds",
+    "bcrypt time, including waiting for a free worker",
+    ["operation"],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 2.5, 5.0),
+)
+JOBS = Counter(
+    "yaft_jobs_total",
+    "Attempts of background jobs, per kind and outcome",
+    ["kind", "outcome"],
+)
+RATE_LIMITED = Counter(
+    "yaft_rate_limited_total",
+    "Requests rejected by a rate limit",
+    ["limit"],
+)
+
+_timings: ContextVar[dict[str, float] | None] = ContextVar("timings", default=None)
+
+
+def start_timings() -> dict[str, float]:
+    """Starts collecting phase durations for the current request"""
+    timings = {phase: 0.0 for phase in TIMING_PHASES}
+    _timings.set(timings)
+    return timings
+
+
+def add_timing(phase: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_timing(phase, time.perf_counter() - started)
+
+
+def timed_future(
+    phase: str | None,
+    result: FutureResult[T_any, HttpException],
+    histogram: Histogram | None = None,
+) -> FutureResult[T_any, HttpException]:
+    """Times awaiting of `result` into a `Server-Timing` phase and/or a histogram"""
+    async def run() -> Result[T_any, HttpException]:
+        started = time.perf_counter()
+        try:
+            return unsafe_perform_io(await result)
+        finally:
+            elapsed = time.perf_counter() - started
+            if phase is not None:
+                add_timing(phase, elapsed)
+            if histogram is not None:
+                histogram.observe(elapsed)
+
+    return FutureResult(run())
+
+
+def timed_query(fn: Callable[P, FutureResult[T_any, HttpException]]) -> Callable[P, FutureResult[T_any, HttpException]]:
+    """Records the query function's latency under its own name.
+
+    Put it under `@curry`, and only on query functions that don't call other
+    timed ones, so the `db` phase isn't counted twice.
+    """
+    name = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args: P.args, **kwargs: P.kwargs) -> FutureResult[T_any, HttpException]:
+        result = fn(*args, **kwargs)
+
+        async def run() -> Result[T_any, HttpException]:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                io_result = await result
+                outcome = "ok" if isinstance(io_result, IOSuccess) else "failure"
+                return unsafe_perform_io(io_result)
+            finally:
+                elapsed = time.perf_counter() - started
+                add_timing("db", elapsed)
+                QUERY_LATENCY.labels(query=name, outcome=outcome).observe(elapsed)
+
+        return FutureResult(run())
+
+    return wrapper
+
+
+def server_timing_header(timings: dict[str, float], total: float) -> str:
+    phases = [f"{phase};dur={seconds * 1000:.2f}" for phase, seconds in timings.items()]
+    return ", ".join([*phases, f"total;dur={total * 1000:.2f}"])
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    REQUEST_LATENCY.labels(method=method, route=route).observe(seconds)
+    REQUESTS.labels(method=method, route=route, status=str(status)).inc()
+
+
+def render_metrics() -> bytes:
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return generate_latest(REGISTRY)
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return generate_latest(registry)
+
+
+if MULTIPROC_DIR_ENV in os.environ:
+    # Drops this process' live gauges, e.g. checked out connections, when it exits
+    atexit.register(multiprocess.mark_process_dead, os.getpid())
@@ -0,0 +1,40 @@
+"""Background jobs
+
+Revision ID: 4c8e2a7f61b0
+Revises: 7b3f0c92a5d1
+Create Date: 2026-10-18 15:48:33.592104
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '4c8e2a7f61b0'
+down_revision = '7b3f0c92a5d1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'education.job',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('kind', sa.String(length=64), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('status', sa.String(length=16), server_default='queued', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('max_attempts', sa.Integer(), nullable=False),
+        sa.Column('run_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    # Only pending jobs are claimed, failed ones would bloat the index
+    op.create_index('ix_job_pending_run_at', 'education.job', ['run_at'], postgresql_where=sa.text("status <> 'failed'"))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_job_pending_run_at', table_name='education.job')
+    op.drop_table('education.job')
@@ -0,0 +1,50 @@
+"""Entry search vector
+
+Revision ID: 5e21f3626ae8
+Revises: 9314ff58e401
+Create Date: 2026-10-18 12:04:31.402114
+
+Adding the STORED generated column rewrites the whole entry table under an
+ACCESS EXCLUSIVE lock, reads and writes of entries wait until it's done.
+Run it in a maintenance window on large tables. The GIN index is built
+concurrently afterwards.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '5e21f3626ae8'
+down_revision = '9314ff58e401'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('education.entry', sa.Column(
+        'search_vector',
+        postgresql.TSVECTOR(),
+        sa.Computed(
+            "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, '') || ' ' || coalesce(keywords, ''))",
+            persisted=True,
+        ),
+        nullable=True,
+    ))
+
+    # CONCURRENTLY doesn't block writes but can't run in a transaction. A
+    # failed build leaves an INVALID index behind, drop it before retrying.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_entry_search_vector',
+            'education.entry',
+            ['search_vector'],
+            postgresql_using='gin',
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_entry_search_vector', table_name='education.entry', postgresql_concurrently=True)
+    op.drop_column('education.entry', 'search_vector')
@@ -0,0 +1,30 @@
+"""Rate limit buckets
+
+Revision ID: 7b3f0c92a5d1
+Revises: d1c1e9e9f147
+Create Date: 2026-10-18 15:12:09.304517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7b3f0c92a5d1'
+down_revision = 'd1c1e9e9f147'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'education.rate_limit',
+        sa.Column('key', sa.String(length=320), nullable=False),
+        sa.Column('tokens', sa.Float(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('key'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('education.rate_limit')
@@ -0,0 +1,81 @@
+"""Entry soft delete
+
+Revision ID: a93d5e0b7c24
+Revises: 4c8e2a7f61b0
+Create Date: 2026-10-18 16:21:57.118630
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a93d5e0b7c24'
+down_revision = '4c8e2a7f61b0'
+branch_labels = None
+depends_on = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def backfill(assignment: str, condition: str) -> None:
+    """Updates the matching entries in batches of ids, each committed on its own.
+
+    A single UPDATE would lock every row it changes until the migration ends.
+    Batches walk the primary key from where the last one ended, so none of
+    them scans past the rows already done.
+    """
+    if op.get_context().as_sql:
+        # Offline, there are no results to loop on
+        op.execute(f'UPDATE "education.entry" SET {assignment} WHERE {condition}')
+        return
+
+    # Returns the last id of the batch, NULL past the end of the table
+    statement = sa.text(
+        f'WITH batch AS (SELECT id FROM "education.entry" WHERE id > :last_id ORDER BY id LIMIT {BACKFILL_BATCH_SIZE}), '
+        f'updated AS (UPDATE "education.entry" SET {assignment} WHERE id IN (SELECT id FROM batch) AND {condition}) '
+        f'SELECT max(id) FROM batch'
+    )
+    last_id = 0
+    with op.get_context().autocommit_block():
+        while (last_id := op.get_bind().execute(statement, {"last_id": last_id}).scalar()) is not None:
+            pass
+
+
+def upgrade() -> None:
+    # Neither takes longer than a catalog update
+    op.add_column('education.entry', sa.Column('deleted_at', sa.DateTime(timezone=True), nullable=True))
+    op.alter_column('education.entry', 'is_deleted', existing_type=sa.Boolean(), server_default=sa.text('false'))
+
+    backfill('is_deleted = false', 'is_deleted IS NULL')
+    # Entries deleted before there was deleted_at become purgeable from now on
+    backfill('deleted_at = now()', 'is_deleted AND deleted_at IS NULL')
+
+    # SET NOT NULL alone scans the table under an ACCESS EXCLUSIVE lock. A
+    # validated CHECK proves it already, and VALIDATE lets writes through.
+    op.execute(
+        'ALTER TABLE "education.entry" ADD CONSTRAINT entry_is_deleted_not_null '
+        'CHECK (is_deleted IS NOT NULL) NOT VALID'
+    )
+    with op.get_context().autocommit_block():
+        op.execute('ALTER TABLE "education.entry" VALIDATE CONSTRAINT entry_is_deleted_not_null')
+    op.alter_column('education.entry', 'is_deleted', existing_type=sa.Boolean(), nullable=False)
+    op.drop_constraint('entry_is_deleted_not_null', 'education.entry', type_='check')
+
+    # CONCURRENTLY doesn't block writes but can't run in a transaction. A
+    # failed build leaves an INVALID index behind, drop it before retrying.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_entry_live_category_id_id',
+            'education.entry',
+            ['category_id', 'id'],
+            postgresql_where=sa.text('NOT is_deleted'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_entry_live_category_id_id', table_name='education.entry', postgresql_concurrently=True)
+    op.alter_column('education.entry', 'is_deleted', existing_type=sa.Boolean(), nullable=True, server_default=None)
+    op.drop_column('education.entry', 'deleted_at')
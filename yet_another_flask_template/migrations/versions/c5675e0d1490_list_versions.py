@@ -0,0 +1,28 @@
+"""List versions
+
+Revision ID: c5675e0d1490
+Revises: 5e21f3626ae8
+Create Date: 2026-10-18 13:26:10.517093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5675e0d1490'
+down_revision = '5e21f3626ae8'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table('education.list_version',
+    sa.Column('scope', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('scope')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('education.list_version')
@@ -0,0 +1,38 @@
+"""Category change notifications
+
+Revision ID: d1c1e9e9f147
+Revises: e6c78d4aa9f2
+Create Date: 2026-10-18 14:37:12.871046
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd1c1e9e9f147'
+down_revision = 'e6c78d4aa9f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NOTIFY is delivered on commit, so listeners never see uncommitted changes
+    op.execute("""
+        CREATE FUNCTION notify_category_change() RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify('education_category', TG_OP);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER category_change_notify
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON "education.category"
+        FOR EACH STATEMENT EXECUTE FUNCTION notify_category_change()
+    """)
+
+
+def downgrade() -> None:
+    op.execute('DROP TRIGGER category_change_notify ON "education.category"')
+    op.execute("DROP FUNCTION notify_category_change()")
@@ -0,0 +1,24 @@
+"""User token version
+
+Revision ID: e6c78d4aa9f2
+Revises: c5675e0d1490
+Create Date: 2026-10-18 14:02:41.208355
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e6c78d4aa9f2'
+down_revision = 'c5675e0d1490'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('education.user', sa.Column('token_version', sa.Integer(), server_default='0', nullable=False))
+
+
+def downgrade() -> None:
+    op.drop_column('education.user', 'token_version')
@@ -0,0 +1,43 @@
+"""Category parent and tombstone indexes
+
+Revision ID: f2b61d8c0e37
+Revises: a93d5e0b7c24
+Create Date: 2026-10-18 16:58:40.226913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f2b61d8c0e37'
+down_revision = 'a93d5e0b7c24'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Entries by category use ix_entry_live_category_id_id, which the soft
+    # delete migration builds concurrently as well
+    # CONCURRENTLY doesn't block writes but can't run in a transaction. A
+    # failed build leaves an INVALID index behind, drop it before retrying.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_category_parent_id',
+            'education.category',
+            ['parent_id'],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            'ix_entry_tombstone_deleted_at',
+            'education.entry',
+            ['deleted_at'],
+            postgresql_where=sa.text('is_deleted'),
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_entry_tombstone_deleted_at', table_name='education.entry', postgresql_concurrently=True)
+        op.drop_index('ix_category_parent_id', table_name='education.category', postgresql_concurrently=True)
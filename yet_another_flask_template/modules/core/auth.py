@@ -1,5 +1,6 @@
 import hmac
-from typing import Concatenate, Protocol, Callable
+import time
+from typing import Concatenate, NamedTuple, Protocol, Callable
 from functools import wraps
 from dataclasses import dataclass
 
@@ -7,30 +8,53 @@ import bcrypt
 import jwt
 from jwt import InvalidTokenError
 
-from returns.result import Result
+from returns.result import Result, Success
 from returns.future import FutureResult
 from returns.curry import curry
 from returns.pipeline import flow
 from returns.pointfree import bind_result, bind_future_result, map_
 
-from sqlalchemy.ext.asyncio import AsyncConnection
 from quart import Request, request
 from quart.sessions import SessionMixin
 
+from yet_another_flask_template.cache import TTLCache
 from yet_another_flask_template.config import Config
 from yet_another_flask_template.context import Context, app_context
+from yet_another_flask_template.database import DbConnection, LazyConnection
 from yet_another_flask_template.errors import HttpException, AuthenticationFailedException, InvalidAuthToken, NotAuthorised, server_exception
+from yet_another_flask_template.metrics import PASSWORD_HASH_LATENCY, timed_future
 from yet_another_flask_template.serialization import MsgSpecRequest
 from yet_another_flask_template.types import P, QuartRealResponse, QuartResponse
+from yet_another_flask_template.workers import BoundedExecutor
 
-from .schemas import User
-from .queries import get_user_by_id
+from .schemas import TokenState, User, UserClaims
+from .queries import QueryContext, get_token_state
 
 
 DEFAULT_ENCODING = "utf-8"
 HMAC_DIGEST_MODE = "sha256"
 JWT_SIGN_ALGORITHM = "HS256"
 
+_config = Config()
+
+
+class VerifiedToken(NamedTuple):
+    claims: UserClaims
+    not_before: float
+    expires_at: float
+    # When the user signed in, refreshed tokens keep it
+    auth_time: int
+
+
+# Single tokens can't be revoked. `bump_token_version` revokes all tokens of
+# a user: they are refused at their next refresh, at most `TOKEN_TTL` later.
+token_cache: TTLCache[str, VerifiedToken] = TTLCache(maxsize=_config.TOKEN_CACHE_SIZE, ttl=_config.TOKEN_TTL)
+password_pool = BoundedExecutor(
+    kind=_config.PASSWORD_POOL_KIND,
+    workers=_config.PASSWORD_POOL_WORKERS,
+    max_queue=_config.PASSWORD_POOL_MAX_QUEUE,
+)
+
 
 class AuthContext(Protocol):
     @property
@@ -45,67 +69,213 @@ def _pepper_pwd(ctx: AuthContext, pwd: str, salt: bytes, encoding: str = DEFAULT
     return seasoned.digest()
 
 
-def secure_password(ctx: AuthContext, pwd: str, encoding: str = DEFAULT_ENCODING) -> str:
-    salt = bcrypt.gensalt() 
+def _hashpw(peppered: bytes, salt: bytes) -> bytes:
+    return bcrypt.hashpw(peppered, salt)
+
+
+def _checkpw(peppered: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(peppered, hashed)
+
+
+def secure_password(ctx: AuthContext, pwd: str, encoding: str = DEFAULT_ENCODING) -> FutureResult[str, HttpException]:
+    salt = bcrypt.gensalt()
     peppered = _pepper_pwd(ctx, pwd, salt)
-    return bcrypt.hashpw(peppered, salt).decode(encoding)
+    return flow(
+        password_pool.run(_hashpw, peppered, salt),
+        lambda hashed: timed_future(None, hashed, PASSWORD_HASH_LATENCY.labels(operation="hash")),
+        map_(lambda h: h.decode(encoding)),
+    )
 
 
-def check_password(ctx: AuthContext, this: str, against: str, /, encoding: str = DEFAULT_ENCODING) -> Result[bool, HttpException]: 
+def check_password(ctx: AuthContext, this: str, against: str, /, encoding: str = DEFAULT_ENCODING) -> FutureResult[bool, HttpException]: 
+    def to_result(matches: bool) -> Result[bool, HttpException]:
+        if matches:
+            return Result.from_value(True)
+        return Result.from_failure(AuthenticationFailedException())
+
     bsalt = against[:29].encode("utf-8")
     peppered = _pepper_pwd(ctx, this, bsalt)
-    
-    if bcrypt.checkpw(peppered, against.encode(encoding)):
-        return Result.from_value(True)
-    
-    return Result.from_failure(AuthenticationFailedException())
 
-@curry
-def make_token(ctx: AuthContext, user: User) -> str:
-    return jwt.encode({"user_id": user.id}, ctx.conf.SECRET_KEY, algorithm=JWT_SIGN_ALGORITHM)
+    return flow(
+        password_pool.run(_checkpw, peppered, against.encode(encoding)),
+        lambda matches: timed_future(None, matches, PASSWORD_HASH_LATENCY.labels(operation="check")),
+        bind_result(to_result),
+    )
+
+def user_claims(user: User) -> UserClaims:
+    return UserClaims(id=user.id, username=user.username, email=user.email, token_version=user.token_version)
 
 
 @curry
-def get_user_id_from_token(ctx: AuthContext, token: str) -> Result[int, HttpException]:
+def make_token(ctx: AuthContext, claims: UserClaims, auth_time: int | None = None) -> str:
+    """Token with everything authorized handlers need about the user.
+
+    It lives for `TOKEN_TTL` only; after that `authorized_context` refreshes
+    it until `TOKEN_REFRESH_TTL` has passed since `auth_time`.
+    """
+    now = int(time.time())
+    payload = {
+        "user_id": claims.id,
+        "username": claims.username,
+        "email": claims.email,
+        "ver": claims.token_version,
+        "auth_time": now if auth_time is None else auth_time,
+        "iat": now,
+        "nbf": now,
+        "exp": now + ctx.conf.TOKEN_TTL,
+    }
+    return jwt.encode(payload, ctx.conf.SECRET_KEY, algorithm=JWT_SIGN_ALGORITHM)
+
+
+def verify_token(ctx: AuthContext, token: str) -> Result[VerifiedToken, HttpException]:
+    """Full signature and claims check, except for expiration.
+
+    Expired tokens still carry valid claims to be refreshed from.
+    """
     try:
-        payload = jwt.decode(token, ctx.conf.SECRET_KEY, algorithms=[JWT_SIGN_ALGORITHM])
-        return Result.from_value(payload["user_id"])
+        payload = jwt.decode(
+            token,
+            ctx.conf.SECRET_KEY,
+            algorithms=[JWT_SIGN_ALGORITHM],
+            options={"require": ["exp", "nbf"], "verify_exp": False},
+        )
+        claims = UserClaims(
+            id=payload["user_id"],
+            username=payload["username"],
+            email=payload["email"],
+            token_version=payload["ver"],
+        )
+        return Result.from_value(VerifiedToken(claims, payload["nbf"], payload["exp"], payload["auth_time"]))
     except (KeyError, InvalidTokenError) as e:
         return Result.from_failure(InvalidAuthToken(description=str(e)))
     except Exception as e:
         return Result.from_failure(server_exception(e))
 
 
+@curry
+def get_verified_token(ctx: AuthContext, token: str) -> Result[VerifiedToken, HttpException]:
+    """Verifies the token once, later calls only check `nbf` of the cached claims"""
+    verified = token_cache.get(token)
+
+    if verified is None:
+        result = verify_token(ctx, token)
+        if not isinstance(result, Success):
+            return result
+
+        verified = result.unwrap()
+        ttl = verified.expires_at - time.time()
+        if ttl > 0:
+            token_cache.set(token, verified, ttl=ttl)
+
+    if time.time() < verified.not_before:
+        return Result.from_failure(InvalidAuthToken(description="The token is not yet valid (nbf)"))
+
+    return Result.from_value(verified)
+
+
+def is_expired(verified: VerifiedToken) -> bool:
+    return time.time() >= verified.expires_at
+
+
+@curry
+def get_claims_from_token(ctx: AuthContext, token: str) -> Result[UserClaims, HttpException]:
+    """Claims of a valid, unexpired token"""
+    def unexpired(verified: VerifiedToken) -> Result[UserClaims, HttpException]:
+        if is_expired(verified):
+            return Result.from_failure(InvalidAuthToken(description="Signature has expired"))
+        return Result.from_value(verified.claims)
+
+    return flow(
+        get_verified_token(ctx, token),
+        bind_result(unexpired),
+    )
+
+
+class RefreshContext(QueryContext, Protocol):
+    @property
+    def conf(self) -> Config: ...
+
+    @property
+    def session(self) -> SessionMixin: ...
+
+
+def refresh_claims(ctx: RefreshContext, verified: VerifiedToken) -> FutureResult[UserClaims, HttpException]:
+    """Issues a new token for expired claims, unless they have been revoked.
+
+    Only the token version and whether the user is active are read,
+    `bump_token_version` revokes every token issued before it.
+    """
+    claims = verified.claims
+
+    def unless_revoked(state: TokenState) -> Result[UserClaims, HttpException]:
+        if not state.is_active:
+            return Result.from_failure(InvalidAuthToken(description="User has been deactivated"))
+        if state.token_version != claims.token_version:
+            return Result.from_failure(InvalidAuthToken(description="Token has been revoked"))
+        return Result.from_value(claims)
+
+    def reissue(fresh: UserClaims) -> UserClaims:
+        set_auth_cookie(ctx, make_token(ctx, fresh, auth_time=verified.auth_time))
+        return fresh
+
+    return flow(
+        get_token_state(ctx, claims.id),
+        bind_result(unless_revoked),
+        map_(reissue),
+    )
+
+
+@curry
+def fresh_claims(ctx: RefreshContext, verified: VerifiedToken) -> FutureResult[UserClaims, HttpException]:
+    if not is_expired(verified):
+        return FutureResult.from_value(verified.claims)
+
+    if time.time() >= verified.auth_time + ctx.conf.TOKEN_REFRESH_TTL:
+        return FutureResult.from_failure(InvalidAuthToken(description="Signature has expired"))
+
+    return refresh_claims(ctx, verified)
+
+
 class AuthorizedContext(Protocol):
     @property
-    def db_conn(self) -> AsyncConnection: ...
+    def db_conn(self) -> DbConnection: ...
+
+    @property
+    def replica_conn(self) -> LazyConnection: ...
 
     @property
     def conf(self) -> Config: ...
 
     @property
-    def user(self) -> User: ...
+    def user(self) -> UserClaims: ...
 
     @property
     def request(self) -> MsgSpecRequest: ...
 
+    @property
+    def session(self) -> SessionMixin: ...
+
 
 @dataclass(frozen=True)
 class AuthorizedContextReal:
-    db_conn: AsyncConnection
+    db_conn: DbConnection
+    replica_conn: LazyConnection
     conf: Config
-    user: User
+    user: UserClaims
     request: MsgSpecRequest
+    session: SessionMixin
 
 
 def authorized_context(fn: Callable[Concatenate[AuthorizedContext, P], QuartResponse]) -> Callable[Concatenate[P], QuartRealResponse]:
     @curry
-    def to_auth_context(ctx: Context, user: User) -> AuthorizedContext:
+    def to_auth_context(ctx: Context, user: UserClaims) -> AuthorizedContext:
         return AuthorizedContextReal(
             db_conn=ctx.db_conn,
+            replica_conn=ctx.replica_conn,
             conf=ctx.conf,
             user=user,
             request=ctx.request,
+            session=ctx.session,
         )
 
     @wraps(fn)
@@ -115,10 +285,15 @@ def authorized_context(fn: Callable[Concatenate[AuthorizedContext, P], QuartResp
         
         token = get_auth_cookie(ctx)
 
-        return flow(
+        # Claims come from the token, the database is only hit to refresh it
+        user = flow(
             FutureResult.from_result(token),
-            bind_result(get_user_id_from_token(ctx)),
-            bind_future_result(get_user_by_id(ctx)),
+            bind_result(get_verified_token(ctx)),
+            bind_future_result(fresh_claims(ctx)),
+        )
+
+        return flow(
+            timed_future("auth", user),
             map_(to_auth_context(ctx)),
             bind_future_result(auth_fn)
         ) 
@@ -1,18 +1,24 @@
 from quart import Blueprint
 
-from yet_another_flask_template.modules.core.handlers.auth import sign_in, sign_up
-from yet_another_flask_template.modules.core.handlers.categories import create_category, list_categories, update_category
-from yet_another_flask_template.modules.core.handlers.entries import create_entry, list_category_entries
+from yet_another_flask_template.modules.core.handlers.auth import change_password, sign_in, sign_up
+from yet_another_flask_template.modules.core.handlers.categories import category_tree, create_category, list_categories, update_category
+from yet_another_flask_template.modules.core.handlers.entries import create_entries_bulk, create_entry, delete_entry, list_category_entries, list_subtree_entries, find_entries
 
 
 def create_blueprint():
     blueprint = Blueprint(name="core", import_name="core")
     blueprint.add_url_rule("/sign_in/", view_func=sign_in, methods=["POST"])
     blueprint.add_url_rule("/sign_up/", view_func=sign_up, methods=["POST"])
+    blueprint.add_url_rule("/password/", view_func=change_password, methods=["PUT"])
     blueprint.add_url_rule("/categories/", view_func=create_category, methods=["POST"])
     blueprint.add_url_rule("/categories/", view_func=list_categories, methods=["GET"])
+    blueprint.add_url_rule("/categories/tree/", view_func=category_tree, methods=["GET"])
     blueprint.add_url_rule("/categories/<int:category_id>/", view_func=update_category, methods=["PUT"])
     blueprint.add_url_rule("/categories/<int:category_id>/entries/", view_func=create_entry, methods=["POST"])
     blueprint.add_url_rule("/categories/<int:category_id>/entries/", view_func=list_category_entries, methods=["GET"])
+    blueprint.add_url_rule("/categories/<int:category_id>/entries/<int:entry_id>/", view_func=delete_entry, methods=["DELETE"])
+    blueprint.add_url_rule("/categories/<int:category_id>/entries/bulk/", view_func=create_entries_bulk, methods=["POST"])
+    blueprint.add_url_rule("/categories/<int:category_id>/subtree/entries/", view_func=list_subtree_entries, methods=["GET"])
+    blueprint.add_url_rule("/entries/search/", view_func=find_entries, methods=["GET"])
     return blueprint
 
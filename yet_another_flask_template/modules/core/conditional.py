@@ -0,0 +1,117 @@
+import hashlib
+from typing import Any, Callable, NamedTuple, Protocol
+
+import msgspec
+from quart import Response
+from werkzeug.http import quote_etag, unquote_etag
+from returns.curry import curry
+from returns.future import FutureResult
+from returns.pipeline import flow
+from returns.pointfree import bind_future_result
+
+from yet_another_flask_template.cache import NotifiedCache
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.serialization import JSON_MIMETYPE, MsgSpecRequest, WithHeaders, json_encoder
+from yet_another_flask_template.types import QuartResponse
+
+from .queries import ReadQueryContext, get_list_version
+
+
+class ConditionalContext(ReadQueryContext, Protocol):
+    @property
+    def request(self) -> MsgSpecRequest: ...
+
+
+def make_etag(scope: str, version: int, query_string: bytes) -> str:
+    # Pages of the same listing are different representations. The digest
+    # must be collision resistant, bodies are cached and shared by their tag
+    digest = hashlib.blake2b(query_string, digest_size=16).hexdigest()
+    return f"{scope}-{version}-{digest}"
+
+
+@curry
+def with_etag(etag: str, value: msgspec.Struct | Response) -> WithHeaders | Response:
+    """Tags are weak, so `200`s and `304`s carry the same validator whatever
+    content coding `compression.py` picks for the body"""
+    if not isinstance(value, Response):
+        return WithHeaders(value, {"ETag": quote_etag(etag, weak=True)})
+
+    value.set_etag(etag, weak=True)
+    return value
+
+
+def conditional_response(ctx: ConditionalContext, scope: str, respond: Callable[[], QuartResponse]) -> QuartResponse:
+    """Tags the listing with its version and answers `304` if the client has it.
+
+    The version is read before any rows, so a concurrent write can only make
+    the tag older than the data, never newer.
+    """
+    def respond_if_changed(version: int) -> QuartResponse:
+        etag = make_etag(scope, version, ctx.request.query_string)
+
+        if ctx.request.if_none_match.contains_weak(etag):
+            return FutureResult.from_value(with_etag(etag, Response(status=304)))
+
+        return respond().map(with_etag(etag))
+
+    return flow(
+        get_list_version(ctx, scope),
+        bind_future_result(respond_if_changed),
+    )
+
+
+class CachedBody(NamedTuple):
+    body: bytes
+    etag: str | None
+
+
+_config = Config()
+# Category listings change rarely and are read on almost every page view
+category_cache: NotifiedCache[str, CachedBody] = NotifiedCache(
+    maxsize=_config.CATEGORY_CACHE_SIZE,
+    ttl=_config.CATEGORY_CACHE_TTL,
+    fallback_ttl=_config.CATEGORY_CACHE_FALLBACK_TTL,
+)
+
+
+def cached_body_response(ctx: ConditionalContext, cached: CachedBody) -> Response:
+    if cached.etag is not None and ctx.request.if_none_match.contains_weak(cached.etag):
+        response = Response(status=304)
+    else:
+        response = Response(cached.body, mimetype=JSON_MIMETYPE)
+
+    if cached.etag is not None:
+        response.set_etag(cached.etag, weak=True)
+
+    return response
+
+
+def cached_response(
+    ctx: ConditionalContext,
+    cache: NotifiedCache[str, CachedBody],
+    key: str,
+    respond: Callable[[], QuartResponse],
+) -> QuartResponse:
+    """Serves the encoded response from the cache, filling it on a miss.
+
+    Responses built by the handler itself, like streams and `304`s, aren't cached.
+    """
+    cached = cache.get(key)
+
+    if cached is not None:
+        return FutureResult.from_value(cached_body_response(ctx, cached))
+
+    generation = cache.generation
+
+    def store(value: Any) -> Response:
+        if isinstance(value, Response):
+            return value
+
+        etag = None
+        if isinstance(value, WithHeaders):
+            etag = unquote_etag(value.headers["ETag"])[0] if "ETag" in value.headers else None
+            value = value.value
+
+        return cached_body_response(ctx, cache.set(key, CachedBody(json_encoder.encode(value), etag), generation))
+
+    return respond().map(store)
@@ -1,51 +1,62 @@
-from returns.pointfree import bind_future_result, bind_result, map_
+from dataclasses import replace
+
+from returns.pointfree import bind_future_result, map_
 from returns.pipeline import flow
 from returns.curry import curry
-from returns.result import Result
 from returns.future import FutureResult
 from returns.functions import tap
 
 from yet_another_flask_template.types import QuartResponse
-from yet_another_flask_template.context import app_context, Context
+from yet_another_flask_template.context import app_context, autocommit, Context
 from yet_another_flask_template.errors import HttpException
 
-from ..auth import secure_password, check_password, make_token, set_auth_cookie
-from ..queries import create_user, get_user_by_name
-from ..schemas import UserSignUpRequest, UserModel, User, UserLoginRequest, UserSignInResponse
+from ..auth import AuthorizedContext, authorized_context, secure_password, check_password, make_token, set_auth_cookie, user_claims
+from ..queries import change_user_password, create_user, get_user_by_id, get_user_by_name
+from ..rate_limit import check_rate_limit, client_ip, sign_in_ip_limit, sign_in_user_limit
+from ..schemas import ChangePasswordRequest, UpdateItemResponse, UserClaims, UserSignUpRequest, UserModel, User, UserLoginRequest, UserSignInResponse
 
 
 @app_context
 def sign_up(ctx: Context) -> QuartResponse:
-    @curry
-    def _prepare_create(user: UserSignUpRequest) -> UserModel:
-        return UserModel(
-            username=user.username,
-            secure_password=secure_password(ctx, user.password),
-            email=user.email,
-        )
+    def _prepare_create(user: UserSignUpRequest) -> FutureResult[UserModel, HttpException]:
+        def to_model(pwd: str) -> UserModel:
+            return UserModel(
+                username=user.username,
+                secure_password=pwd,
+                email=user.email,
+            )
+
+        return secure_password(ctx, user.password).map(to_model)
 
     return flow(
         ctx.request.get_json_typed(UserSignUpRequest),
-        map_(_prepare_create),
+        bind_future_result(_prepare_create),
         bind_future_result(create_user(ctx)),
     )
 
 
 @app_context
+@autocommit
 def sign_in(ctx: Context) -> QuartResponse:
+    # Limits are checked before the user lookup and bcrypt; autocommit keeps
+    # the taken tokens when the attempt fails
+    def _check_user_limit(req: UserLoginRequest) -> FutureResult[UserLoginRequest, HttpException]:
+        return check_rate_limit(ctx, sign_in_user_limit(ctx.conf), req.username, req)
+
     def _get_user_if_valid_pass(req: UserLoginRequest) -> FutureResult[User, HttpException]:
         @curry
-        def check_pass(pwd: str, user: User) -> Result[User, HttpException]:
+        def check_pass(pwd: str, user: User) -> FutureResult[User, HttpException]:
             return check_password(ctx, pwd, user.secure_password).map(lambda _: user)
 
         return flow(
             get_user_by_name(ctx, req.username),
-            bind_result(check_pass(req.password)),
+            bind_future_result(check_pass(req.password)),
         )
 
     def set_token(user: User):
         flow(
             user,
+            user_claims,
             make_token(ctx),
             set_auth_cookie(ctx)
         )
@@ -56,10 +67,46 @@ def sign_in(ctx: Context) -> QuartResponse:
             username=user.username,
         )
 
+    ip = client_ip(ctx.request.remote_addr, ctx.request.headers.get("X-Forwarded-For"), ctx.conf.TRUSTED_PROXIES)
+
     return flow(
-        ctx.request.get_json_typed(UserLoginRequest),
+        check_rate_limit(ctx, sign_in_ip_limit(ctx.conf), ip, None),
+        bind_future_result(lambda _: ctx.request.get_json_typed(UserLoginRequest)),
+        bind_future_result(_check_user_limit),
         bind_future_result(_get_user_if_valid_pass),
         map_(tap(set_token)),
         map_(make_response),
     )
 
+
+
+@authorized_context
+def change_password(ctx: AuthorizedContext) -> QuartResponse:
+    # Revokes every token of the user, this session gets a new one. Checked
+    # on primary, a lagging replica could still hold the previous password.
+    primary = replace(ctx, replica_conn=ctx.db_conn)
+
+    def _check_current(req: ChangePasswordRequest) -> FutureResult[ChangePasswordRequest, HttpException]:
+        return flow(
+            get_user_by_id(primary, ctx.user.id),
+            bind_future_result(lambda user: check_password(ctx, req.password, user.secure_password)),
+            map_(lambda _: req),
+        )
+
+    def _store(req: ChangePasswordRequest) -> FutureResult[int, HttpException]:
+        return flow(
+            secure_password(ctx, req.new_password),
+            bind_future_result(change_user_password(ctx, ctx.user.id)),
+        )
+
+    def set_token(token_version: int):
+        claims = UserClaims(id=ctx.user.id, username=ctx.user.username, email=ctx.user.email, token_version=token_version)
+        set_auth_cookie(ctx, make_token(ctx, claims))
+
+    return flow(
+        ctx.request.get_json_typed(ChangePasswordRequest),
+        bind_future_result(_check_current),
+        bind_future_result(_store),
+        map_(tap(set_token)),
+        map_(lambda _: UpdateItemResponse(id=ctx.user.id)),
+    )
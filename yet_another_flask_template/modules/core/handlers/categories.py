@@ -1,19 +1,45 @@
+from dataclasses import replace
+
 from returns.pointfree import bind_future_result, map_
 from returns.pipeline import flow
 
+from yet_another_flask_template.context import read_only
 from yet_another_flask_template.types import QuartResponse
 
 from ..auth import AuthorizedContext, authorized_context
-from ..queries import get_categories, update_category_by_id, create_category_returning_id
+from ..conditional import cached_response, category_cache, conditional_response
+from ..pagination import list_response
+from ..queries import CATEGORIES_SCOPE, get_categories, get_category_tree, stream_categories, update_category_by_id, create_category_returning_id
 from ..schemas import CreateItemResponse, ListResponse, NewCategoryRequest, UpdateItemResponse, UpdateCategoryRequest
 
 
 @authorized_context
+@read_only
 def list_categories(ctx: AuthorizedContext) -> QuartResponse:
-    return flow(
-        get_categories(ctx),
+    # Cache fills read from primary, a lagging replica could bring back
+    # categories older than the change notification
+    primary = replace(ctx, replica_conn=ctx.db_conn)
+
+    return cached_response(ctx, category_cache, f"list?{ctx.request.query_string.decode()}", lambda: conditional_response(
+        primary,
+        CATEGORIES_SCOPE,
+        lambda: list_response(
+            ctx.request.args,
+            get_categories(primary),
+            lambda page: stream_categories(ctx, page),
+        ),
+    ))
+
+
+@authorized_context
+@read_only
+def category_tree(ctx: AuthorizedContext) -> QuartResponse:
+    primary = replace(ctx, replica_conn=ctx.db_conn)
+
+    return cached_response(ctx, category_cache, "tree", lambda: flow(
+        get_category_tree(primary),
         map_(ListResponse),
-    )
+    ))
 
 
 @authorized_context
@@ -32,4 +58,3 @@ def update_category(ctx: AuthorizedContext, category_id: int) -> QuartResponse:
         bind_future_result(update_category_by_id(ctx, category_id)),
         map_(UpdateItemResponse),
     )
-
@@ -1,11 +1,22 @@
-from returns.pointfree import bind_future_result, map_
+from returns.pointfree import bind_future_result, bind_result, map_
 from returns.pipeline import flow
+from returns.future import FutureResult
+from returns.pipeline import is_successful
+from returns.result import Result
 
+from yet_another_flask_template.errors import HttpException
+from yet_another_flask_template.serialization import decode_json_items
+
+from yet_another_flask_template.context import read_only
 from yet_another_flask_template.types import QuartResponse
 
 from ..auth import AuthorizedContext, authorized_context
-from ..queries import create_entry_returning_id, get_entries
-from ..schemas import CreateItemResponse, ListResponse, NewEntryRequest
+from ..conditional import conditional_response
+from ..pagination import list_response, search_from_args, to_search_response
+from ..queries import entries_scope, create_entries_returning_ids, create_entry_returning_id, get_entries, get_subtree_entries, search_entries, soft_delete_entry, stream_entries, stream_subtree_entries
+from ..schemas import BulkCreateResponse, BulkItemError, CreateItemResponse, DeleteItemResponse, NewEntryRequest, SearchQuery
+
+NDJSON_MIMETYPE = "application/x-ndjson"
 
 
 @authorized_context
@@ -18,10 +29,86 @@ def create_entry(ctx: AuthorizedContext, category_id: int) -> QuartResponse:
 
 
 @authorized_context
-def list_category_entries(ctx: AuthorizedContext, category_id: int) -> QuartResponse:
+def create_entries_bulk(ctx: AuthorizedContext, category_id: int) -> QuartResponse:
+    """Accepts a JSON array or NDJSON of `NewEntryRequest`"""
+    def decode(body: bytes) -> Result[list[Result[NewEntryRequest, HttpException]], HttpException]:
+        return decode_json_items(
+            NewEntryRequest,
+            body,
+            ndjson=ctx.request.mimetype == NDJSON_MIMETYPE,
+            max_items=ctx.conf.BULK_MAX_ITEMS,
+        )
+
+    def insert_valid(items: list[Result[NewEntryRequest, HttpException]]) -> FutureResult[BulkCreateResponse, HttpException]:
+        valid = [i for i, item in enumerate(items) if is_successful(item)]
+
+        def make_response(inserted: list[Result[int, HttpException]]) -> BulkCreateResponse:
+            outcomes: dict[int, Result] = dict(enumerate(items))
+            outcomes.update(zip(valid, inserted))
+
+            ids: list[int | None] = [None] * len(items)
+            errors: list[BulkItemError] = []
+
+            for i, outcome in outcomes.items():
+                if is_successful(outcome):
+                    ids[i] = outcome.unwrap()
+                else:
+                    e = outcome.failure()
+                    errors.append(BulkItemError(index=i, error_code=e.error_code, description=e.description))
+
+            return BulkCreateResponse(ids=ids, errors=errors)
+
+        return flow(
+            [items[i].unwrap() for i in valid],
+            create_entries_returning_ids(ctx, category_id),
+            map_(make_response),
+        )
+
+    return flow(
+        ctx.request.get_data_safe(),
+        bind_result(decode),
+        bind_future_result(insert_valid),
+    )
+
+
+@authorized_context
+def delete_entry(ctx: AuthorizedContext, category_id: int, entry_id: int) -> QuartResponse:
     return flow(
-        category_id,
-        get_entries(ctx),
-        map_(ListResponse),
+        soft_delete_entry(ctx, category_id, entry_id),
+        map_(DeleteItemResponse),
+    )
+
+
+@authorized_context
+@read_only
+def list_category_entries(ctx: AuthorizedContext, category_id: int) -> QuartResponse:
+    return conditional_response(ctx, entries_scope(category_id), lambda: list_response(
+        ctx.request.args,
+        get_entries(ctx, category_id),
+        lambda page: stream_entries(ctx, category_id, page),
+    ))
+
+
+@authorized_context
+@read_only
+def list_subtree_entries(ctx: AuthorizedContext, category_id: int) -> QuartResponse:
+    return list_response(
+        ctx.request.args,
+        get_subtree_entries(ctx, category_id),
+        lambda page: stream_subtree_entries(ctx, category_id, page),
     )
 
+
+@authorized_context
+@read_only
+def find_entries(ctx: AuthorizedContext) -> QuartResponse:
+    def search_page(query: SearchQuery) -> QuartResponse:
+        return flow(
+            search_entries(ctx, query),
+            map_(to_search_response(query)),
+        )
+
+    return flow(
+        FutureResult.from_result(search_from_args(ctx.request.args)),
+        bind_future_result(search_page),
+    )
@@ -0,0 +1,257 @@
+"""Durable background jobs on top of the `education.job` table.
+
+Handlers add jobs with `enqueue_job` in their own transaction and return.
+Workers claim due jobs with `FOR UPDATE SKIP LOCKED`, so any number of them
+can share the table. A job runs in a transaction of its own and is deleted
+in it when it succeeds; failed attempts are retried with exponential backoff
+until `max_attempts`, then the job is kept as "failed".
+
+Workers run either from `cli.py jobs work` or inside the unit processes,
+one per event loop, with `JOB_WORKER_IN_PROCESS`.
+"""
+import asyncio
+import signal
+import threading
+from asyncio import AbstractEventLoop
+from dataclasses import dataclass
+from typing import Any, Callable, Mapping
+
+from returns.future import FutureResult
+from returns.pipeline import flow, is_successful
+from returns.pointfree import bind_future_result
+from returns.result import Failure, Result
+from returns.unsafe import unsafe_perform_io
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import LazyConnection, engines
+from yet_another_flask_template.errors import HttpException
+from yet_another_flask_template.logger import logger
+from yet_another_flask_template.metrics import JOBS
+
+from .queries import claim_jobs, complete_job, delete_entry_tombstones, delete_stale_rate_buckets, enqueue_job, fail_job, retry_job
+from .schemas import Job, NewJob
+
+# Far longer than any sign in bucket takes to refill
+RATE_BUCKET_IDLE_SECONDS = 24 * 60 * 60
+
+
+@dataclass(frozen=True)
+class JobContext:
+    db_conn: LazyConnection
+    replica_conn: LazyConnection
+    conf: Config
+
+
+JobHandler = Callable[[JobContext, Any], FutureResult[Any, HttpException]]
+
+job_handlers: dict[str, JobHandler] = {}
+
+
+def job_handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Registers the handler of jobs of this kind, it gets their payload"""
+    def register(fn: JobHandler) -> JobHandler:
+        job_handlers[kind] = fn
+        return fn
+
+    return register
+
+
+@job_handler("purge_rate_limits")
+def purge_rate_limits(ctx: JobContext, payload: Any) -> FutureResult[int, HttpException]:
+    return delete_stale_rate_buckets(ctx, RATE_BUCKET_IDLE_SECONDS)
+
+
+@job_handler("purge_deleted_entries")
+def purge_deleted_entries(ctx: JobContext, payload: Any) -> FutureResult[int, HttpException]:
+    """Deletes a batch of old tombstones, a full batch queues the next one"""
+    def continue_if_full(deleted: int) -> FutureResult[int, HttpException]:
+        if deleted < ctx.conf.ENTRY_PURGE_BATCH_SIZE:
+            return FutureResult.from_value(deleted)
+
+        next_batch = NewJob("purge_deleted_entries", delay=ctx.conf.ENTRY_PURGE_PAUSE)
+        return enqueue_job(ctx, next_batch).map(lambda _: deleted)
+
+    return flow(
+        delete_entry_tombstones(ctx, ctx.conf.ENTRY_PURGE_AFTER, ctx.conf.ENTRY_PURGE_BATCH_SIZE),
+        bind_future_result(continue_if_full),
+    )
+
+
+def retry_delay(config: Config, attempts: int) -> float:
+    return min(config.JOB_MAX_BACKOFF, config.JOB_BACKOFF_BASE * 2 ** (attempts - 1))
+
+
+def job_context(config: Config, autocommit: bool = False) -> JobContext:
+    conn = LazyConnection(engines.get(config).unwrap(), autocommit=autocommit)
+    # Jobs run behind the requests, so they don't need replicas
+    return JobContext(conn, conn, config)
+
+
+class JobWorker:
+    def __init__(self, config: Config, handlers: Mapping[str, JobHandler]) -> None:
+        self.config = config
+        self.handlers = dict(handlers)
+        self._running: set[asyncio.Task] = set()
+        self._task: asyncio.Task | None = None
+
+    async def claim(self, limit: int) -> list[Job]:
+        # In autocommit, so the lease is taken as soon as the statement ends
+        ctx = job_context(self.config, autocommit=True)
+        try:
+            return unsafe_perform_io(await claim_jobs(ctx, limit, self.config.JOB_LEASE_SECONDS)).unwrap()
+        finally:
+            await ctx.db_conn.release(commit=False)
+
+    async def _attempt(self, job: Job) -> Result[Any, Exception]:
+        handler = self.handlers.get(job.kind)
+        if handler is None:
+            return Failure(LookupError(f"No handler for jobs of kind {job.kind!r}"))
+
+        ctx = job_context(self.config)
+        try:
+            try:
+                # Deleted in the job's transaction, so its work is done once only
+                result = unsafe_perform_io(await handler(ctx, job.payload).bind(lambda _: complete_job(ctx, job)))
+            except Exception as e:
+                result = Failure(e)
+
+            await ctx.db_conn.release(commit=is_successful(result))
+            return result
+        finally:
+            # Rolls back if the job was cancelled or the commit failed
+            await ctx.db_conn.release(commit=False)
+
+    async def _reschedule(self, job: Job, error: str) -> None:
+        ctx = job_context(self.config, autocommit=True)
+        try:
+            if job.attempts >= job.max_attempts:
+                logger.warning(f"Job {job.id} ({job.kind}) failed after {job.attempts} attempt(s): {error}")
+                result = unsafe_perform_io(await fail_job(ctx, job, error))
+            else:
+                delay = retry_delay(self.config, job.attempts)
+                logger.info(f"Job {job.id} ({job.kind}) failed, retrying in {delay:.0f}s: {error}")
+                result = unsafe_perform_io(await retry_job(ctx, job, delay, error))
+
+            if not is_successful(result):
+                logger.warning(f"Failed to reschedule job {job.id}: {result.failure().description}")
+        finally:
+            await ctx.db_conn.release(commit=False)
+
+    async def _execute(self, job: Job) -> None:
+        if job.attempts > job.max_attempts:
+            # Its lease ran out on the last attempt, e.g. the worker was killed
+            result: Result[Any, Exception] = Failure(TimeoutError("Lease expired"))
+        else:
+            try:
+                result = await self._attempt(job)
+            except Exception as e:
+                result = Failure(e)
+
+        JOBS.labels(kind=job.kind, outcome="ok" if is_successful(result) else "failure").inc()
+
+        if not is_successful(result):
+            try:
+                await self._reschedule(job, repr(result.failure()))
+            except Exception as e:
+                # The lease runs out and the job is retried anyway
+                logger.warning(f"Failed to reschedule job {job.id}: {e}")
+
+    async def run(self) -> None:
+        concurrency = self.config.JOB_CONCURRENCY
+
+        while True:
+            free = concurrency - len(self._running)
+            claimed: list[Job] = []
+
+            if free > 0:
+                try:
+                    claimed = await self.claim(free)
+                except Exception as e:
+                    logger.warning(f"Failed to claim jobs: {e}")
+
+            for job in claimed:
+                task = asyncio.create_task(self._execute(job))
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+            if len(self._running) >= concurrency:
+                await asyncio.wait(set(self._running), return_when=asyncio.FIRST_COMPLETED)
+            elif len(claimed) < free:
+                # Otherwise more jobs may be due already
+                await asyncio.sleep(self.config.JOB_POLL_INTERVAL)
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self.run())
+
+    async def stop(self) -> None:
+        task, self._task = self._task, None
+
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+        if self._running:
+            _, pending = await asyncio.wait(set(self._running), timeout=self.config.JOB_SHUTDOWN_TIMEOUT)
+            for running in pending:
+                running.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+class JobWorkerRegistry:
+    """A worker per running event loop, like `listener.ListenerRegistry`"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._workers: dict[AbstractEventLoop, JobWorker] = {}
+
+    def start(self, config: Config, handlers: Mapping[str, JobHandler]) -> JobWorker:
+        worker = JobWorker(config, handlers)
+
+        with self._lock:
+            self._workers[asyncio.get_running_loop()] = worker
+
+        worker.start()
+        return worker
+
+    async def stop(self) -> None:
+        with self._lock:
+            worker = self._workers.pop(asyncio.get_running_loop(), None)
+
+        if worker is not None:
+            await worker.stop()
+
+
+job_workers = JobWorkerRegistry()
+
+
+async def enqueue(config: Config, job: NewJob) -> int:
+    """Adds a job outside of any request, e.g. from cron through the CLI"""
+    ctx = job_context(config)
+    try:
+        job_id = unsafe_perform_io(await enqueue_job(ctx, job)).unwrap()
+        await ctx.db_conn.release(commit=True)
+        return job_id
+    finally:
+        await ctx.db_conn.release(commit=False)
+        await engines.dispose()
+
+
+async def work(config: Config) -> None:
+    """Runs a standalone worker until SIGINT or SIGTERM"""
+    await engines.start(config)
+    job_workers.start(config, job_handlers)
+
+    stopped = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+
+    logger.info(f"Job worker started, running up to {config.JOB_CONCURRENCY} job(s) at once")
+    try:
+        await stopped.wait()
+    finally:
+        await job_workers.stop()
+        await engines.dispose()
@@ -1,36 +1,76 @@
-from typing import Any
-from sqlalchemy import Row
+from operator import itemgetter
+from typing import Any, Generic, Iterable, Mapping, Sequence, TypeVar
+
+import msgspec
+from sqlalchemy import Column
 
 from .schemas import Entry, Category, User
+from .metadata import entry_table, category_table, user_table
+
+T = TypeVar("T", bound=msgspec.Struct)
+
+
+class RowDecoder(Generic[T]):
+    """Builds structs positionally from rows of `select(*decoder.columns)`.
+
+    Works on raw asyncpg records as well as on SQLAlchemy rows. Values are
+    used as returned by the driver, so columns must not need result processing.
+    """
+
+    def __init__(self, schema: type[T], columns: Sequence[Column], renames: Mapping[str, str] | None = None) -> None:
+        renames = renames or {}
+        positions = {renames.get(column.name, column.name): i for i, column in enumerate(columns)}
+        indexes = [positions[field] for field in schema.__struct_fields__]
+
+        self.schema = schema
+        self.columns = tuple(columns)
+
+        if indexes == list(range(len(columns))):
+            self._values = None
+        elif len(indexes) == 1:
+            self._values = lambda record: (record[indexes[0]],)
+        else:
+            self._values = itemgetter(*indexes)
+
+    def decode(self, record: Sequence[Any]) -> T:
+        if self._values is None:
+            return self.schema(*record)
+        return self.schema(*self._values(record))
+
+    def decode_all(self, records: Iterable[Sequence[Any]]) -> list[T]:
+        schema, values = self.schema, self._values
+
+        if values is None:
+            return [schema(*record) for record in records]
+        return [schema(*values(record)) for record in records]
+
 
+entry_decoder = RowDecoder(Entry, [
+    entry_table.c.id,
+    entry_table.c.title,
+    entry_table.c.description,
+    entry_table.c.keywords,
+    entry_table.c.links,
+    entry_table.c.category_id,
+    entry_table.c.is_deleted,
+])
 
-def entry_from_row(row: Row[tuple[Any]]) -> Entry:
-    return Entry(
-        id=row.id,
-        title=row.title,
-        description=row.description,
-        is_deleted=row.is_deleted,
-        keywords=row.keywords,
-        links=row.links,
-        category_id=row.category_id,
-    )
-
-
-def category_from_row(row: Row[tuple[Any]]) -> Category:
-    return Category(
-        id=row.id,
-        name=row.name,
-        image=row.image,
-        description=row.description,
-        parent_id=row.parent_id,
-    )
-
-
-def user_from_row(row: Row[tuple[Any]]) -> User:
-    return User(
-        id=row.id,
-        username=row.username,
-        secure_password=row.password,
-        email=row.email,
-    )
+category_decoder = RowDecoder(Category, [
+    category_table.c.id,
+    category_table.c.image,
+    category_table.c.name,
+    category_table.c.description,
+    category_table.c.parent_id,
+])
 
+user_decoder = RowDecoder(
+    User,
+    [
+        user_table.c.id,
+        user_table.c.username,
+        user_table.c.password,
+        user_table.c.email,
+        user_table.c.token_version,
+    ],
+    renames={"password": "secure_password"},
+)
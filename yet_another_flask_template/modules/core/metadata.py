@@ -7,9 +7,15 @@ from sqlalchemy import (
     DateTime,
     Boolean,
     Text,
+    Float,
     ForeignKey,
     Boolean,
+    Computed,
+    Index,
+    func,
+    text,
 )
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR
 from datetime import datetime
 
 
@@ -25,6 +31,8 @@ user_table = Table(
     Column("email", String(254), nullable=True),
     Column("is_superuser", Boolean, default=False),
     Column("is_active", Boolean, default=True),
+    # Bumped to make claims in issued tokens stale
+    Column("token_version", Integer, nullable=False, server_default="0"),
     Column("date_joined", DateTime, default=datetime.utcnow),
 )
 
@@ -36,6 +44,8 @@ category_table = Table(
     Column("name", String(120), nullable=False),
     Column("description", Text, nullable=False),
     Column("parent_id", ForeignKey("category.id"), nullable=True),
+    # Walked by the recursive subtree queries
+    Index("ix_category_parent_id", "parent_id"),
 )
 
 entry_table = Table(
@@ -47,6 +57,56 @@ entry_table = Table(
     Column("keywords", String, nullable=False),  # ArrayField is not supported in SQLAlchemy Core
     Column("links", String, nullable=True),  # ArrayField is not supported in SQLAlchemy Core
     Column("category_id", ForeignKey("category.id"), nullable=True),
-    Column("is_deleted", Boolean, default=False),
+    # Deleted entries are kept hidden until they are purged, see `jobs.py`
+    Column("is_deleted", Boolean, nullable=False, default=False, server_default=text("false")),
+    Column("deleted_at", DateTime(timezone=True), nullable=True),
+    Column(
+        "search_vector",
+        TSVECTOR,
+        Computed(
+            "to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, '') || ' ' || coalesce(keywords, ''))",
+            persisted=True,
+        ),
+    ),
+    # Listings only read live entries, predicates must use `NOT is_deleted`
+    Index("ix_entry_live_category_id_id", "category_id", "id", postgresql_where=text("NOT is_deleted")),
+    # Old tombstones for the purge job
+    Index("ix_entry_tombstone_deleted_at", "deleted_at", postgresql_where=text("is_deleted")),
 )
 
+
+# Bumped on every write to a listing, used for ETags
+list_version_table = Table(
+    "education.list_version",
+    metadata,
+    Column("scope", String(64), primary_key=True),
+    Column("version", BigInteger, nullable=False),
+)
+
+
+# Token buckets of the rate limits, see `rate_limit.py`
+rate_limit_table = Table(
+    "education.rate_limit",
+    metadata,
+    Column("key", String(320), primary_key=True),
+    Column("tokens", Float, nullable=False),
+    Column("updated_at", DateTime(timezone=True), nullable=False),
+)
+
+
+# Deferred work, see `jobs.py`. Finished jobs are deleted, the ones out of
+# attempts stay as "failed". `run_at` of a running job is the end of its lease.
+job_table = Table(
+    "education.job",
+    metadata,
+    Column("id", BigInteger, primary_key=True, autoincrement=True),
+    Column("kind", String(64), nullable=False),
+    Column("payload", JSONB, nullable=True),
+    Column("status", String(16), nullable=False, server_default="queued"),
+    Column("attempts", Integer, nullable=False, server_default="0"),
+    Column("max_attempts", Integer, nullable=False),
+    Column("run_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Column("last_error", Text, nullable=True),
+    Column("created_at", DateTime(timezone=True), nullable=False, server_default=func.now()),
+    Index("ix_job_pending_run_at", "run_at", postgresql_where=text("status <> 'failed'")),
+)
@@ -0,0 +1,130 @@
+from collections.abc import AsyncIterator
+from typing import Callable, Sequence
+
+from quart import Response
+from returns.curry import curry
+from returns.future import FutureResult
+from returns.pipeline import flow
+from returns.pointfree import bind_future_result, map_
+from returns.result import Result
+from werkzeug.datastructures import MultiDict
+
+from sqlalchemy import Column, Select
+
+from yet_another_flask_template.errors import HttpException, ValidationFailed
+from yet_another_flask_template.serialization import JSON_MIMETYPE, stream_list_response
+from yet_another_flask_template.types import QuartResponse
+
+from .schemas import ListResponse, PageQuery, SearchQuery
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+DEFAULT_SEARCH_PAGE_SIZE = 20
+# Deep pages of ranked results get expensive, so search can't go past this
+MAX_SEARCH_OFFSET = 1000
+
+
+def _int_arg(args: MultiDict, name: str, default: int | None = None) -> int | None:
+    value = args.get(name)
+    return default if value is None else int(value)
+
+
+def page_from_args(args: MultiDict) -> Result[PageQuery, HttpException]:
+    """Reads `limit`, `after` and `stream` query parameters"""
+    try:
+        limit = _int_arg(args, "limit", DEFAULT_PAGE_SIZE)
+        after = _int_arg(args, "after")
+    except ValueError as e:
+        return Result.from_failure(ValidationFailed(description=str(e)))
+
+    if limit is None or not 0 < limit <= MAX_PAGE_SIZE:
+        return Result.from_failure(ValidationFailed(description=f"limit must be between 1 and {MAX_PAGE_SIZE}"))
+
+    return Result.from_value(
+        PageQuery(
+            limit=limit,
+            after=after,
+            stream=args.get("stream", "").lower() in ("1", "true"),
+        )
+    )
+
+
+def search_from_args(args: MultiDict) -> Result[SearchQuery, HttpException]:
+    """Reads `q`, `limit` and `offset` query parameters"""
+    q = args.get("q", "").strip()
+
+    if not q:
+        return Result.from_failure(ValidationFailed(description="q must not be empty"))
+
+    try:
+        limit = _int_arg(args, "limit", DEFAULT_SEARCH_PAGE_SIZE)
+        offset = _int_arg(args, "offset", 0)
+    except ValueError as e:
+        return Result.from_failure(ValidationFailed(description=str(e)))
+
+    if limit is None or not 0 < limit <= MAX_PAGE_SIZE:
+        return Result.from_failure(ValidationFailed(description=f"limit must be between 1 and {MAX_PAGE_SIZE}"))
+
+    if offset is None or not 0 <= offset <= MAX_SEARCH_OFFSET:
+        return Result.from_failure(ValidationFailed(description=f"offset must be between 0 and {MAX_SEARCH_OFFSET}"))
+
+    return Result.from_value(SearchQuery(q=q, limit=limit, offset=offset))
+
+
+def paginate(stmt: Select, id_column: Column, page: PageQuery) -> Select:
+    """Keyset pagination over `id_column`.
+
+    Fetches one extra row to know whether there is a next page. Streamed
+    responses go through the whole listing, so no limit is applied to them.
+    """
+    if page.after is not None:
+        stmt = stmt.where(id_column > page.after)
+
+    stmt = stmt.order_by(id_column)
+
+    if page.stream:
+        return stmt
+
+    return stmt.limit(page.limit + 1)
+
+
+@curry
+def to_list_response(page: PageQuery, items: Sequence) -> ListResponse:
+    if len(items) <= page.limit:
+        return ListResponse(results=items)
+
+    results = items[:page.limit]
+    return ListResponse(results=results, next_cursor=results[-1].id)
+
+
+@curry
+def to_search_response(search: SearchQuery, items: Sequence) -> ListResponse:
+    """For ranked results the cursor is the offset of the next page"""
+    if len(items) <= search.limit:
+        return ListResponse(results=items)
+
+    return ListResponse(results=items[:search.limit], next_cursor=search.offset + search.limit)
+
+
+def list_response(
+    args: MultiDict,
+    fetch: Callable[[PageQuery], FutureResult[Sequence, HttpException]],
+    stream: Callable[[PageQuery], AsyncIterator[list]],
+) -> QuartResponse:
+    """Responds with a single page, or with the streamed listing if asked to"""
+    def respond(page: PageQuery) -> QuartResponse:
+        if page.stream:
+            return FutureResult.from_value(
+                Response(stream_list_response(stream(page)), mimetype=JSON_MIMETYPE)
+            )
+
+        return flow(
+            fetch(page),
+            map_(to_list_response(page)),
+        )
+
+    return flow(
+        FutureResult.from_result(page_from_args(args)),
+        bind_future_result(respond),
+    )
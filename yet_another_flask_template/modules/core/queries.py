@@ -1,34 +1,66 @@
-from collections.abc import Iterable
+from collections.abc import AsyncIterator, Iterable
+from datetime import timedelta
 import msgspec
 
 from typing import Any, NamedTuple, Protocol, Sequence, Callable
 
-from returns.result import Result
+from returns.result import Result, Success
 from returns.future import future_safe, FutureResult
 from returns.curry import curry
 from returns.pipeline import flow
-from returns.pointfree import alt, bind_result, map_
+from returns.pointfree import alt, bind_future_result, bind_result, map_
 
 from asyncpg.exceptions import ForeignKeyViolationError, UniqueViolationError # type: ignore
 
-from sqlalchemy import CursorResult, Table, select, insert, Row, update
+from sqlalchemy import CTE, ColumnElement, CursorResult, Select, Table, delete, func, literal, literal_column, select, insert, Row, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.ext.asyncio import AsyncConnection
 from sqlalchemy.sql.selectable import TypedReturnsRows
-from sqlalchemy.exc import IntegrityError
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 
+from yet_another_flask_template.database import DbConnection, LazyConnection
 from yet_another_flask_template.errors import HttpException, NotFoundException, AlreadyExistsException, ServerErrorException
 from yet_another_flask_template.logger import logger
+from yet_another_flask_template.metrics import timed_query
 from yet_another_flask_template.serialization import encode_json_typed
 from yet_another_flask_template.types import T_any
 
-from .mappers import entry_from_row, category_from_row, user_from_row
-from .schemas import Category, Entry, NewCategoryRequest, NewEntryRequest, UpdateCategoryRequest, User, UserModel, UserSignUpResponse
-from .metadata import user_table, category_table, entry_table
+from .mappers import RowDecoder, entry_decoder, category_decoder, user_decoder
+from .pagination import paginate
+from .schemas import Category, CategoryNode, Entry, Job, NewJob, PageQuery, SearchQuery, NewCategoryRequest, NewEntryRequest, TokenState, UpdateCategoryRequest, User, UserModel, UserSignUpResponse
+from .metadata import user_table, category_table, entry_table, list_version_table, rate_limit_table, job_table
+
+
+CATEGORIES_SCOPE = "categories"
+# Notified by a trigger on every change of the category table
+CATEGORIES_CHANNEL = "education_category"
+
+STREAM_PARTITION_SIZE = 500
+BULK_INSERT_CHUNK_SIZE = 1000
+# Guards the recursive queries against cycles in category parents
+MAX_CATEGORY_DEPTH = 64
+# Must match the configuration of the generated `search_vector` column
+SEARCH_CONFIG = literal_column("'english'::regconfig")
 
 
 class QueryContext(Protocol):
     @property
-    def db_conn(self) -> AsyncConnection: ...
+    def db_conn(self) -> DbConnection: ...
+
+
+class ReadQueryContext(Protocol):
+    """Queries that tolerate replication lag read through `replica_conn`.
+
+    It is the primary connection itself when no replicas are configured or
+    the session has written recently, so the user always reads their writes.
+    """
+    @property
+    def replica_conn(self) -> DbConnection: ...
+
+
+class StreamContext(Protocol):
+    @property
+    def replica_conn(self) -> LazyConnection: ...
 
 
 async def list_users(conn: AsyncConnection) -> list[User]:
@@ -63,6 +95,15 @@ def execute_query(ctx: QueryContext, stmt: TypedReturnsRows[tuple[Row[Any]]]) ->
     )
 
 
+@curry
+def execute_read_query(ctx: ReadQueryContext, stmt: TypedReturnsRows[tuple[Row[Any]]]) -> FutureResult[CursorResult[tuple[Any]], HttpException]:
+    return flow(
+        stmt,
+        future_safe(ctx.replica_conn.execute),
+        alt(handle_query_exception)
+    )
+
+
 @curry
 def insert_returning_id(
     ctx: QueryContext,
@@ -104,24 +145,146 @@ def fetch_all(result: CursorResult[tuple[Any]]) -> Sequence[Row[tuple[Any]]]:
 
 
 @curry
+def fetch_structs(decoder: RowDecoder[Any], result: CursorResult[tuple[Any]]) -> list[Any]:
+    """Decodes the driver's records directly, without building `Row` objects"""
+    cursor = result.cursor
+    records = result.fetchall() if cursor is None else cursor.fetchall()
+    result.close()
+    return decoder.decode_all(records)
+
+
+def entries_scope(category_id: int) -> str:
+    return f"entries:{category_id}"
+
+
+@curry
+@timed_query
+def get_list_version(ctx: ReadQueryContext, scope: str) -> FutureResult[int, HttpException]:
+    """Version of a listing, 0 if it was never written to"""
+    def get_version(result: CursorResult[tuple[Any]]) -> int:
+        version = result.scalar()
+        return 0 if version is None else version
+
+    return flow(
+        select(list_version_table.c.version).where(list_version_table.c.scope == scope),
+        execute_read_query(ctx),
+        map_(get_version),
+    )
+
+
+@curry
+def bump_list_version(ctx: QueryContext, scope: str, value: T_any) -> FutureResult[T_any, HttpException]:
+    """Bumps the listing version in the write's transaction, passing `value` through"""
+    query = pg_insert(list_version_table).values(scope=scope, version=1)
+    query = query.on_conflict_do_update(
+        index_elements=[list_version_table.c.scope],
+        set_={"version": list_version_table.c.version + 1},
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        map_(lambda _: value),
+    )
+
+
+@curry
+@timed_query
 def create_category_returning_id(ctx: QueryContext, category: NewCategoryRequest) -> FutureResult[int, HttpException]:
     return flow(
         category,
         encode_json_typed,
         insert_returning_id(ctx, category_table),
+        bind_future_result(bump_list_version(ctx, CATEGORIES_SCOPE)),
     )
 
 
-def get_categories(ctx: QueryContext) -> FutureResult[Sequence[Category], HttpException]:
+def select_categories(page: PageQuery) -> Select:
+    return paginate(select(*category_decoder.columns), category_table.c.id, page)
+
+
+@curry
+@timed_query
+def get_categories(ctx: ReadQueryContext, page: PageQuery) -> FutureResult[Sequence[Category], HttpException]:
     return flow(
-        select(category_table),
-        execute_query(ctx),
-        map_(fetch_all),
-        map_(map_rows_to_list(category_from_row)),
+        select_categories(page),
+        execute_read_query(ctx),
+        map_(fetch_structs(category_decoder)),
+    )
+
+
+def category_subtree(root_id: int | None) -> CTE:
+    """Recursive CTE over the category and all of its descendants.
+
+    With `root_id=None` it walks every tree starting from the root categories.
+    """
+    start = (
+        category_table.c.parent_id.is_(None)
+        if root_id is None
+        else category_table.c.id == root_id
+    )
+
+    tree = (
+        select(*category_decoder.columns, literal(0).label("depth"))
+        .where(start)
+        .cte("category_tree", recursive=True)
+    )
+
+    child = category_table.alias("child")
+
+    return tree.union_all(
+        select(
+            child.c.id,
+            child.c.image,
+            child.c.name,
+            child.c.description,
+            child.c.parent_id,
+            tree.c.depth + 1,
+        )
+        .where(child.c.parent_id == tree.c.id)
+        .where(tree.c.depth < MAX_CATEGORY_DEPTH)
+    )
+
+
+def build_category_tree(categories: Sequence[Category]) -> list[CategoryNode]:
+    """Expects parents to come before their children"""
+    nodes: dict[int, CategoryNode] = {}
+    roots: list[CategoryNode] = []
+
+    for category in categories:
+        node = CategoryNode(
+            id=category.id,
+            image=category.image,
+            name=category.name,
+            description=category.description,
+            parent_id=category.parent_id,
+        )
+        nodes[node.id] = node
+
+        parent = nodes.get(node.parent_id) if node.parent_id is not None else None
+        (roots if parent is None else parent.children).append(node)
+
+    return roots
+
+
+@timed_query
+def get_category_tree(ctx: ReadQueryContext) -> FutureResult[list[CategoryNode], HttpException]:
+    tree = category_subtree(None)
+    query = (
+        select(tree.c.id, tree.c.image, tree.c.name, tree.c.description, tree.c.parent_id)
+        .order_by(tree.c.depth, tree.c.id)
+    )
+
+    return flow(
+        query,
+        execute_read_query(ctx),
+        map_(fetch_structs(category_decoder)),
+        map_(build_category_tree),
     )
 
 
 @curry
+@timed_query
 def update_category_by_id(ctx: QueryContext, category_id: int, item: UpdateCategoryRequest) -> FutureResult[int, HttpException]:
     query = (
         update(category_table)
@@ -134,14 +297,88 @@ def update_category_by_id(ctx: QueryContext, category_id: int, item: UpdateCateg
         query,
         execute_query(ctx), 
         bind_result(fetch_id),
+        bind_future_result(bump_list_version(ctx, CATEGORIES_SCOPE)),
     )
 
 
 @curry
+@timed_query
 def create_entry_returning_id(ctx: QueryContext, category_id: int, entry: NewEntryRequest) -> FutureResult[int, HttpException]:
     entry_dict = encode_json_typed(entry)
     entry_dict.update({"category_id": category_id})
-    return insert_returning_id(ctx, entry_table, entry_dict) 
+    return flow(
+        entry_dict,
+        insert_returning_id(ctx, entry_table),
+        bind_future_result(bump_list_version(ctx, entries_scope(category_id))),
+    )
+
+
+@curry
+@timed_query
+def create_entries_returning_ids(
+    ctx: QueryContext,
+    category_id: int,
+    entries: Sequence[NewEntryRequest],
+) -> FutureResult[list[Result[int, HttpException]], HttpException]:
+    """Inserts entries in multi-row chunks, each chunk under its own savepoint.
+
+    A failing chunk is rolled back and inserted again row by row, so only
+    the entries that fail on their own are reported; the rest of the batch
+    is still inserted. A missing category fails the whole request up front,
+    every row would fail its foreign key otherwise.
+    """
+    # FOR KEY SHARE keeps the category from being deleted until the rows are in
+    category = (
+        select(category_table.c.id)
+        .where(category_table.c.id == category_id)
+        .with_for_update(read=True, key_share=True)
+    )
+    query = insert(entry_table).returning(entry_table.c.id, sort_by_parameter_order=True)
+
+    async def insert_rows(rows: list[dict[str, Any]]) -> list[int]:
+        async with ctx.db_conn.begin_nested():
+            result = await ctx.db_conn.execute(query, rows)
+            return list(result.scalars())
+
+    async def insert_row(row: dict[str, Any]) -> Result[int, HttpException]:
+        try:
+            return Result.from_value((await insert_rows([row]))[0])
+        except SQLAlchemyError as e:
+            return Result.from_failure(handle_query_exception(e))
+
+    async def insert_chunk(chunk: Sequence[NewEntryRequest]) -> list[Result[int, HttpException]]:
+        rows = [{**encode_json_typed(entry), "category_id": category_id} for entry in chunk]
+
+        try:
+            return [Result.from_value(id_) for id_ in await insert_rows(rows)]
+        except SQLAlchemyError as e:
+            if len(rows) == 1:
+                return [Result.from_failure(handle_query_exception(e))]
+
+        return [await insert_row(row) for row in rows]
+
+    @future_safe
+    async def insert_all() -> list[Result[int, HttpException]]:
+        results: list[Result[int, HttpException]] = []
+        for start in range(0, len(entries), BULK_INSERT_CHUNK_SIZE):
+            results.extend(await insert_chunk(entries[start:start + BULK_INSERT_CHUNK_SIZE]))
+        return results
+
+    def bump_if_inserted(results: list[Result[int, HttpException]]) -> FutureResult[list[Result[int, HttpException]], HttpException]:
+        if any(isinstance(result, Success) for result in results):
+            return bump_list_version(ctx, entries_scope(category_id), results)
+        return FutureResult.from_value(results)
+
+    def insert_entries(_: int) -> FutureResult[list[Result[int, HttpException]], HttpException]:
+        return insert_all().alt(handle_query_exception)
+
+    return flow(
+        category,
+        execute_query(ctx),
+        bind_result(fetch_id),
+        bind_future_result(insert_entries),
+        bind_future_result(bump_if_inserted),
+    )
 
 
 @curry
@@ -149,18 +386,145 @@ def map_rows_to_list(c: Callable[[Row[tuple[Any]]], T_any], items: Iterable[Row[
     return [c(item) for item in items]
 
 
+# Written as `NOT is_deleted` to match the predicate of the partial index
+LIVE_ENTRY = ~entry_table.c.is_deleted
+
+
+def select_entries(category_id: int, page: PageQuery) -> Select:
+    return paginate(
+        select(*entry_decoder.columns).where(entry_table.c.category_id == category_id, LIVE_ENTRY),
+        entry_table.c.id,
+        page,
+    )
+
+
+def select_subtree_entries(category_id: int, page: PageQuery) -> Select:
+    tree = category_subtree(category_id)
+
+    return paginate(
+        select(*entry_decoder.columns).where(entry_table.c.category_id.in_(select(tree.c.id)), LIVE_ENTRY),
+        entry_table.c.id,
+        page,
+    )
+
+
+@curry
+@timed_query
+def get_subtree_entries(ctx: ReadQueryContext, category_id: int, page: PageQuery) -> FutureResult[Sequence[Entry], HttpException]:
+    return flow(
+        select_subtree_entries(category_id, page),
+        execute_read_query(ctx),
+        map_(fetch_structs(entry_decoder)),
+    )
+
+
 @curry
-def get_entries(ctx: QueryContext, category_id: int) -> FutureResult[Sequence[Entry], HttpException]:
+@timed_query
+def get_entries(ctx: ReadQueryContext, category_id: int, page: PageQuery) -> FutureResult[Sequence[Entry], HttpException]:
+    return flow(
+        select_entries(category_id, page),
+        execute_read_query(ctx),
+        map_(fetch_structs(entry_decoder)),
+    )
+
+
+@curry
+@timed_query
+def soft_delete_entry(ctx: QueryContext, category_id: int, entry_id: int) -> FutureResult[int, HttpException]:
+    """Hides the entry from listings, deleting it again is `NotFoundException`"""
+    query = (
+        update(entry_table)
+        .where(entry_table.c.id == entry_id, entry_table.c.category_id == category_id, LIVE_ENTRY)
+        .values(is_deleted=True, deleted_at=func.now())
+        .returning(entry_table.c.id)
+    )
+
     return flow(
-        (
-            select(entry_table)
-            .where(entry_table.c.category_id == category_id)
-        ),
+        query,
         execute_query(ctx),
-        map_(fetch_all),
-        map_(map_rows_to_list(entry_from_row)),
+        bind_result(fetch_id),
+        bind_future_result(bump_list_version(ctx, entries_scope(category_id))),
+    )
+
+
+@curry
+@timed_query
+def delete_entry_tombstones(ctx: QueryContext, older_than_seconds: float, limit: int) -> FutureResult[int, HttpException]:
+    """Removes up to `limit` entries deleted long enough ago.
+
+    Small batches keep the locks short and leave vacuum time to catch up;
+    rows locked by a concurrent purge are skipped.
+    """
+    tombstones = (
+        select(entry_table.c.id)
+        .where(entry_table.c.is_deleted, entry_table.c.deleted_at < func.now() - timedelta(seconds=older_than_seconds))
+        .limit(limit)
+        .with_for_update(skip_locked=True)
     )
 
+    return flow(
+        delete(entry_table).where(entry_table.c.id.in_(tombstones.scalar_subquery())),
+        execute_query(ctx),
+        map_(lambda result: result.rowcount),
+    )
+
+
+def select_search_entries(search: SearchQuery) -> Select:
+    ts_query = func.websearch_to_tsquery(SEARCH_CONFIG, search.q)
+
+    return (
+        select(*entry_decoder.columns)
+        .where(entry_table.c.search_vector.op("@@")(ts_query), LIVE_ENTRY)
+        .order_by(func.ts_rank_cd(entry_table.c.search_vector, ts_query).desc(), entry_table.c.id)
+        .offset(search.offset)
+        .limit(search.limit + 1)
+    )
+
+
+@timed_query
+def search_entries(ctx: ReadQueryContext, search: SearchQuery) -> FutureResult[Sequence[Entry], HttpException]:
+    return flow(
+        select_search_entries(search),
+        execute_read_query(ctx),
+        map_(fetch_structs(entry_decoder)),
+    )
+
+
+async def stream_rows(
+    ctx: StreamContext,
+    stmt: Select,
+    decoder: RowDecoder[Any],
+) -> AsyncIterator[list[Any]]:
+    """Reads rows through a server-side cursor, partition by partition.
+
+    Streamed bodies are consumed after the handler's context is cleaned up,
+    so the cursor gets a connection of its own, from the same pool as the
+    context's reads.
+    """
+    conn = await ctx.replica_conn.pooled.connect()
+
+    try:
+        result = await conn.stream(stmt.execution_options(yield_per=STREAM_PARTITION_SIZE))
+        async for rows in result.partitions():
+            yield decoder.decode_all(rows)
+    except Exception as e:
+        handle_query_exception(e)
+        raise
+    finally:
+        await conn.close()
+
+
+def stream_categories(ctx: StreamContext, page: PageQuery) -> AsyncIterator[list[Category]]:
+    return stream_rows(ctx, select_categories(page), category_decoder)
+
+
+def stream_entries(ctx: StreamContext, category_id: int, page: PageQuery) -> AsyncIterator[list[Entry]]:
+    return stream_rows(ctx, select_entries(category_id, page), entry_decoder)
+
+
+def stream_subtree_entries(ctx: StreamContext, category_id: int, page: PageQuery) -> AsyncIterator[list[Entry]]:
+    return stream_rows(ctx, select_subtree_entries(category_id, page), entry_decoder)
+
 
 class PasswordWithSalt(NamedTuple):
     pwd: str
@@ -168,6 +532,7 @@ class PasswordWithSalt(NamedTuple):
 
 
 @curry
+@timed_query
 def create_user(ctx: QueryContext, user: UserModel) -> FutureResult[UserModel, HttpException]:
     def construct_user(id_: int):
         return UserSignUpResponse(id=id_, username=user.username, email=user.email)
@@ -192,26 +557,113 @@ def create_user(ctx: QueryContext, user: UserModel) -> FutureResult[UserModel, H
 
 
 @curry
-def get_user_by_id(ctx: QueryContext, user_id: int) -> FutureResult[User, HttpException]:
+@timed_query
+def get_user_by_id(ctx: ReadQueryContext, user_id: int) -> FutureResult[User, HttpException]:
     query = (
-        select(user_table)
+        select(*user_decoder.columns)
         .where(user_table.c.id == user_id)
         .limit(1)
     )
 
+    return flow(
+        query,
+        execute_read_query(ctx),
+        bind_result(fetchone),
+        map_(user_decoder.decode)
+    )
+
+
+@curry
+@timed_query
+def get_token_state(ctx: QueryContext, user_id: int) -> FutureResult[TokenState, HttpException]:
+    """From the primary, a lagging replica would refresh a token revoked moments ago"""
+    query = (
+        select(user_table.c.token_version, user_table.c.is_active)
+        .where(user_table.c.id == user_id)
+        .limit(1)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(fetchone),
+        # `is_active` is nullable, only an explicit false deactivates
+        map_(lambda row: TokenState(token_version=row.token_version, is_active=row.is_active is not False)),
+    )
+
+
+@curry
+def _bump_token_version(ctx: QueryContext, user_id: int) -> FutureResult[int, HttpException]:
+    """Untimed, for the queries that bump the version as part of their own work"""
+    query = (
+        update(user_table)
+        .where(user_table.c.id == user_id)
+        .values(token_version=user_table.c.token_version + 1)
+        .returning(user_table.c.token_version)
+    )
+
     return flow(
         query,
         execute_query(ctx),
         bind_result(fetchone),
-        map_(user_from_row)
+        map_(lambda row: row.token_version),
     )
 
 
 @curry
+@timed_query
+def bump_token_version(ctx: QueryContext, user_id: int) -> FutureResult[int, HttpException]:
+    """Revokes the user's tokens issued so far, they aren't refreshed anymore.
+
+    Returns the new version.
+    """
+    return _bump_token_version(ctx, user_id)
+
+
+@curry
+@timed_query
+def change_user_password(ctx: QueryContext, user_id: int, secure_password: str) -> FutureResult[int, HttpException]:
+    """Stores the new password and revokes the tokens, returns the new token version"""
+    query = (
+        update(user_table)
+        .where(user_table.c.id == user_id)
+        .values(password=secure_password)
+        .returning(user_table.c.id)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(fetch_id),
+        bind_future_result(_bump_token_version(ctx)),
+    )
+
+
+@curry
+@timed_query
+def deactivate_user(ctx: QueryContext, user_id: int) -> FutureResult[int, HttpException]:
+    """Keeps the user from signing in and revokes their tokens"""
+    query = (
+        update(user_table)
+        .where(user_table.c.id == user_id)
+        .values(is_active=False)
+        .returning(user_table.c.id)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(fetch_id),
+        bind_future_result(_bump_token_version(ctx)),
+    )
+
+
+@curry
+@timed_query
 def get_user_by_name(ctx: QueryContext, username: str) -> FutureResult[User, HttpException]:
     query = (
-        select(user_table)
-        .where(user_table.c.username == username)
+        select(*user_decoder.columns)
+        .where(user_table.c.username == username, user_table.c.is_active.isnot(False))
         .limit(1)
     )
 
@@ -219,6 +671,159 @@ def get_user_by_name(ctx: QueryContext, username: str) -> FutureResult[User, Htt
         query,
         execute_query(ctx),
         bind_result(fetchone),
-        map_(user_from_row)
+        map_(user_decoder.decode)
     )
 
+
+
+@curry
+@timed_query
+def take_rate_token(ctx: QueryContext, key: str, burst: int, per_second: float) -> FutureResult[float, HttpException]:
+    """Refills the bucket for the time since its last use and takes a token.
+
+    Returns the tokens left, negative if there was none to take. Rejected
+    attempts spend a token too, down to -1: once empty, the next attempt
+    waits up to one refill interval longer. One statement, so concurrent
+    workers can't both take the last token.
+    """
+    bucket = rate_limit_table.c
+    elapsed = func.extract("epoch", func.now() - bucket.updated_at)
+    refilled = func.least(burst, bucket.tokens + elapsed * per_second)
+
+    query = pg_insert(rate_limit_table).values(key=key, tokens=burst - 1, updated_at=func.now())
+    query = query.on_conflict_do_update(
+        index_elements=[bucket.key],
+        set_={"tokens": func.greatest(refilled - 1, -1), "updated_at": func.now()},
+    ).returning(bucket.tokens)
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(fetchone),
+        map_(lambda row: row.tokens),
+    )
+
+
+@curry
+@timed_query
+def delete_stale_rate_buckets(ctx: QueryContext, idle_seconds: float) -> FutureResult[int, HttpException]:
+    """Buckets idle for longer than it takes to refill are the same as no bucket"""
+    query = (
+        delete(rate_limit_table)
+        .where(rate_limit_table.c.updated_at < func.now() - timedelta(seconds=idle_seconds))
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        map_(lambda result: result.rowcount),
+    )
+
+
+@curry
+@timed_query
+def enqueue_job(ctx: QueryContext, job: NewJob) -> FutureResult[int, HttpException]:
+    """Adds a job in the caller's transaction, so it only runs if that commits"""
+    query = (
+        insert(job_table)
+        .values(
+            kind=job.kind,
+            payload=job.payload,
+            max_attempts=job.max_attempts,
+            run_at=func.now() + timedelta(seconds=job.delay),
+        )
+        .returning(job_table.c.id)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(fetch_id),
+    )
+
+
+@curry
+@timed_query
+def claim_jobs(ctx: QueryContext, limit: int, lease_seconds: float) -> FutureResult[list[Job], HttpException]:
+    """Takes up to `limit` due jobs, skipping the ones other workers are claiming.
+
+    Must run in autocommit, so the lease holds once the statement is done.
+    Jobs whose lease ran out, e.g. of a killed worker, are due again.
+    """
+    due = (
+        select(job_table.c.id)
+        .where(job_table.c.status != "failed", job_table.c.run_at <= func.now())
+        .order_by(job_table.c.run_at)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    query = (
+        update(job_table)
+        .where(job_table.c.id.in_(due.scalar_subquery()))
+        .values(
+            status="running",
+            attempts=job_table.c.attempts + 1,
+            run_at=func.now() + timedelta(seconds=lease_seconds),
+        )
+        .returning(job_table.c.id, job_table.c.kind, job_table.c.payload, job_table.c.attempts, job_table.c.max_attempts)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        map_(lambda result: [Job(*row) for row in result.fetchall()]),
+    )
+
+
+def _own_job(job: Job) -> ColumnElement[bool]:
+    # A job taken over after its lease ran out belongs to the other worker
+    return (job_table.c.id == job.id) & (job_table.c.attempts == job.attempts)
+
+
+def _still_owned(job: Job, result: CursorResult[tuple[Any]]) -> Result[None, HttpException]:
+    if result.rowcount == 0:
+        return Result.from_failure(NotFoundException(description=f"Job {job.id} was taken over after its lease ran out"))
+    return Result.from_value(None)
+
+
+@curry
+@timed_query
+def complete_job(ctx: QueryContext, job: Job) -> FutureResult[None, HttpException]:
+    """Fails if another worker took the job over, the handler's work must not commit"""
+    return flow(
+        delete(job_table).where(_own_job(job)),
+        execute_query(ctx),
+        bind_result(lambda result: _still_owned(job, result)),
+    )
+
+
+@curry
+@timed_query
+def retry_job(ctx: QueryContext, job: Job, delay: float, error: str) -> FutureResult[None, HttpException]:
+    query = (
+        update(job_table)
+        .where(_own_job(job))
+        .values(status="queued", run_at=func.now() + timedelta(seconds=delay), last_error=error)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(lambda result: _still_owned(job, result)),
+    )
+
+
+@curry
+@timed_query
+def fail_job(ctx: QueryContext, job: Job, error: str) -> FutureResult[None, HttpException]:
+    query = (
+        update(job_table)
+        .where(_own_job(job))
+        .values(status="failed", last_error=error)
+    )
+
+    return flow(
+        query,
+        execute_query(ctx),
+        bind_result(lambda result: _still_owned(job, result)),
+    )
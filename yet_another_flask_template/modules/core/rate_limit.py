@@ -0,0 +1,102 @@
+"""Token bucket rate limits shared by all workers.
+
+nginx unit runs several processes, so the buckets live in Postgres: every
+check is a single upsert that refills the bucket and takes a token. Checks
+must run on an autocommit connection (an `autocommit` handler), otherwise
+the attempts of failed requests would be rolled back with them.
+
+Behind nginx every request comes from the proxy, so limits per client take
+its address from X-Forwarded-For, see `client_ip`.
+"""
+import math
+from dataclasses import dataclass
+from functools import lru_cache
+from ipaddress import IPv4Network, IPv6Network, ip_address, ip_network
+from typing import Sequence
+
+from returns.curry import curry
+from returns.future import FutureResult
+from returns.pipeline import flow
+from returns.pointfree import bind_result
+from returns.result import Failure, Result, Success
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.errors import HttpException, TooManyRequests
+from yet_another_flask_template.metrics import RATE_LIMITED
+from yet_another_flask_template.types import T_any
+
+from .queries import QueryContext, take_rate_token
+
+# Longer subjects can't be valid usernames, and must fit the bucket key
+MAX_SUBJECT_LENGTH = 256
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    name: str
+    burst: int
+    per_minute: float
+
+    @property
+    def per_second(self) -> float:
+        return self.per_minute / 60
+
+    def key(self, subject: str) -> str:
+        return f"{self.name}:{subject[:MAX_SUBJECT_LENGTH]}"
+
+    def retry_after(self, tokens: float) -> int:
+        """Seconds until a bucket with `tokens` left has a whole token again"""
+        return max(1, math.ceil((1 - tokens) / self.per_second))
+
+
+@lru_cache(maxsize=None)
+def proxy_networks(proxies: tuple[str, ...]) -> tuple[IPv4Network | IPv6Network, ...]:
+    return tuple(ip_network(proxy) for proxy in proxies)
+
+
+def is_trusted_proxy(address: str, networks: Sequence[IPv4Network | IPv6Network]) -> bool:
+    try:
+        ip = ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in networks)
+
+
+def client_ip(remote_addr: str | None, forwarded_for: str | None, trusted_proxies: Sequence[str]) -> str:
+    """Address of whoever connected to the outermost trusted proxy.
+
+    X-Forwarded-For is read from the right, one hop per trusted proxy that
+    added it; hops further left were sent by the client and can be anything.
+    """
+    networks = proxy_networks(tuple(trusted_proxies))
+    hops = [hop.strip() for hop in (forwarded_for or "").split(",") if hop.strip()]
+    address = remote_addr or "unknown"
+
+    while hops and is_trusted_proxy(address, networks):
+        address = hops.pop()
+
+    return address
+
+
+def sign_in_ip_limit(config: Config) -> RateLimit:
+    return RateLimit("sign_in_ip", config.SIGN_IN_RATE_IP_BURST, config.SIGN_IN_RATE_IP_PER_MINUTE)
+
+
+def sign_in_user_limit(config: Config) -> RateLimit:
+    return RateLimit("sign_in_user", config.SIGN_IN_RATE_USER_BURST, config.SIGN_IN_RATE_USER_PER_MINUTE)
+
+
+@curry
+def check_rate_limit(ctx: QueryContext, limit: RateLimit, subject: str, value: T_any) -> FutureResult[T_any, HttpException]:
+    """Takes a token from the subject's bucket, passing `value` through"""
+    def allow(tokens: float) -> Result[T_any, HttpException]:
+        if tokens >= 0:
+            return Success(value)
+
+        RATE_LIMITED.labels(limit.name).inc()
+        return Failure(TooManyRequests(retry_after=limit.retry_after(tokens)))
+
+    return flow(
+        take_rate_token(ctx, limit.key(subject), limit.burst, limit.per_second),
+        bind_result(allow),
+    )
@@ -1,12 +1,33 @@
-from typing import Sequence
+from typing import Annotated, Any, Sequence
 import msgspec
 
+# Sizes of the columns request fields are stored in, see `metadata.py`, so
+# a value that wouldn't fit fails validation instead of the insert
+Title = Annotated[str, msgspec.Meta(max_length=120)]
+Username = Annotated[str, msgspec.Meta(max_length=150)]
+Email = Annotated[str, msgspec.Meta(max_length=254)]
+
 
 class User(msgspec.Struct):
     id: int
     username: str
     secure_password: str
     email: str
+    token_version: int = 0
+
+
+class UserClaims(msgspec.Struct):
+    """What auth tokens carry about the user"""
+    id: int
+    username: str
+    email: str
+    token_version: int
+
+
+class TokenState(msgspec.Struct):
+    """What refreshing a token checks against"""
+    token_version: int
+    is_active: bool
 
 
 class Category(msgspec.Struct):
@@ -17,11 +38,20 @@ class Category(msgspec.Struct):
     parent_id: int | None = None
 
 
-class NewCategoryRequest(msgspec.Struct):
+class CategoryNode(msgspec.Struct):
+    id: int
     image: str
     name: str
     description: str
     parent_id: int | None = None
+    children: list["CategoryNode"] = []
+
+
+class NewCategoryRequest(msgspec.Struct):
+    image: str
+    name: Title
+    description: str
+    parent_id: int | None = None
 
 
 class Entry(msgspec.Struct):
@@ -35,7 +65,7 @@ class Entry(msgspec.Struct):
 
 
 class NewEntryRequest(msgspec.Struct):
-    title: str
+    title: Title
     description: str
     links: str
     keywords: str
@@ -46,21 +76,37 @@ class CreateItemResponse(msgspec.Struct):
     id: int
 
 
+class BulkItemError(msgspec.Struct):
+    index: int
+    error_code: str
+    description: str
+
+
+class BulkCreateResponse(msgspec.Struct):
+    # Aligned with the request items, `None` for the items that failed
+    ids: list[int | None]
+    errors: list[BulkItemError]
+
+
 class UpdateItemResponse(msgspec.Struct):
     id: int
 
 
+class DeleteItemResponse(msgspec.Struct):
+    id: int
+
+
 class UpdateCategoryRequest(msgspec.Struct):
     image: str
-    name: str
+    name: Title
     description: str
     parent_id: int | None
 
 
 class UserSignUpRequest(msgspec.Struct):
-    username: str
+    username: Username
     password: str
-    email: str
+    email: Email
 
 
 class UserSignUpResponse(msgspec.Struct):
@@ -74,6 +120,11 @@ class UserLoginRequest(msgspec.Struct):
     password: str
 
 
+class ChangePasswordRequest(msgspec.Struct):
+    password: str
+    new_password: str
+
+
 class UserModel(msgspec.Struct):
     username: str
     secure_password: str
@@ -85,6 +136,36 @@ class UserSignInResponse(msgspec.Struct):
     username: str
 
 
+class NewJob(msgspec.Struct):
+    kind: str
+    payload: Any = None
+    # Seconds before the job may run
+    delay: float = 0.0
+    max_attempts: int = 5
+
+
+class Job(msgspec.Struct):
+    id: int
+    kind: str
+    payload: Any
+    # Including the current one
+    attempts: int
+    max_attempts: int
+
+
 class ListResponse(msgspec.Struct):
     results: Sequence[msgspec.Struct]
+    next_cursor: int | None = None
+
+
+class SearchQuery(msgspec.Struct):
+    q: str
+    limit: int
+    offset: int = 0
+
+
+class PageQuery(msgspec.Struct):
+    limit: int
+    after: int | None = None
+    stream: bool = False
 
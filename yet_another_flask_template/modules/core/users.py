@@ -0,0 +1,29 @@
+"""Administration of users outside of requests, through `cli.py users`"""
+from dataclasses import dataclass
+
+from returns.unsafe import unsafe_perform_io
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import LazyConnection, engines
+
+from .queries import deactivate_user
+
+
+@dataclass(frozen=True)
+class AdminContext:
+    db_conn: LazyConnection
+    replica_conn: LazyConnection
+    conf: Config
+
+
+async def deactivate(config: Config, user_id: int) -> int:
+    """Keeps the user from signing in, their tokens are refused at the next refresh"""
+    conn = LazyConnection(engines.get(config).unwrap())
+    ctx = AdminContext(conn, conn, config)
+    try:
+        token_version = unsafe_perform_io(await deactivate_user(ctx, user_id)).unwrap()
+        await conn.release(commit=True)
+        return token_version
+    finally:
+        await conn.release(commit=False)
+        await engines.dispose()
@@ -0,0 +1,160 @@
+"""Warms up a worker before it serves its first request.
+
+Runs from `before_serving` with `WARMUP_ON_START`, on every event loop, after
+`EngineRegistry.start` opened the pools. The read queries run once on each
+of the opened connections, with arguments matching few or no rows, so their
+SQL is in SQLAlchemy's compiled cache and prepared by asyncpg before clients
+need it. Writes aren't warmed, they would need rows to change. A connection
+stops warming at its first failure, and all of it at `WARMUP_TIMEOUT`, so an
+unreachable database doesn't hold up serving.
+
+Process-wide, the msgspec decoders of the request schemas are built and the
+password pool starts its first worker, so the first sign in doesn't wait on it.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+from returns.future import FutureResult
+from returns.pipeline import is_successful
+from returns.unsafe import unsafe_perform_io
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import LazyConnection, PooledEngine, engines
+from yet_another_flask_template.errors import HttpException, NotFoundException
+from yet_another_flask_template.logger import logger
+from yet_another_flask_template.serialization import encode_http_exception_bytes, json_decoder, json_encoder
+
+from .auth import password_pool
+from .queries import (
+    CATEGORIES_SCOPE,
+    get_categories,
+    get_entries,
+    get_list_version,
+    get_subtree_entries,
+    get_token_state,
+    get_user_by_id,
+    get_user_by_name,
+    search_entries,
+)
+from .schemas import (
+    Category,
+    CreateItemResponse,
+    Entry,
+    ListResponse,
+    NewCategoryRequest,
+    NewEntryRequest,
+    PageQuery,
+    SearchQuery,
+    UpdateCategoryRequest,
+    UserLoginRequest,
+    UserSignUpRequest,
+)
+
+# Ids start at 1
+MISSING_ID = 0
+REQUEST_SCHEMAS: tuple[Any, ...] = (
+    NewCategoryRequest,
+    UpdateCategoryRequest,
+    NewEntryRequest,
+    UserSignUpRequest,
+    UserLoginRequest,
+)
+
+
+@dataclass(frozen=True)
+class WarmupContext:
+    db_conn: LazyConnection
+    replica_conn: LazyConnection
+    conf: Config
+
+
+WarmupQuery = Callable[[WarmupContext], FutureResult[Any, HttpException]]
+
+
+def warmup_queries() -> list[WarmupQuery]:
+    first = PageQuery(limit=1)
+    # Later pages add the keyset condition, a statement of its own
+    later = PageQuery(limit=1, after=MISSING_ID)
+
+    return [
+        lambda ctx: get_list_version(ctx, CATEGORIES_SCOPE),
+        lambda ctx: get_categories(ctx, first),
+        lambda ctx: get_categories(ctx, later),
+        lambda ctx: get_entries(ctx, MISSING_ID, first),
+        lambda ctx: get_entries(ctx, MISSING_ID, later),
+        lambda ctx: get_subtree_entries(ctx, MISSING_ID, first),
+        lambda ctx: search_entries(ctx, SearchQuery(q="warmup", limit=1)),
+        lambda ctx: get_user_by_id(ctx, MISSING_ID),
+        lambda ctx: get_token_state(ctx, MISSING_ID),
+        lambda ctx: get_user_by_name(ctx, ""),
+    ]
+
+
+async def warm_connection(config: Config, pooled: PooledEngine, queries: list[WarmupQuery]) -> bool:
+    """Runs the queries on one connection, False if it stopped at a failure"""
+    conn = LazyConnection(pooled, read_only=True)
+    ctx = WarmupContext(conn, conn, config)
+
+    try:
+        for query in queries:
+            # Nothing is found for the missing ids. Any other failure is logged
+            # by the query already; without a connection, each of the rest
+            # would wait DB_POOL_TIMEOUT for one too.
+            result = unsafe_perform_io(await query(ctx))
+            if not is_successful(result) and not isinstance(result.failure(), NotFoundException):
+                return False
+    finally:
+        await conn.release(commit=False)
+
+    return True
+
+
+async def warm_queries(config: Config) -> None:
+    queries = warmup_queries()
+    connections = min(config.DB_POOL_WARMUP, config.DB_POOL_SIZE)
+
+    for host in [None, *config.DB_REPLICA_HOSTS]:
+        try:
+            pooled = engines.get(config, host).unwrap()
+            # Concurrently, so every query runs once on each warm connection
+            warmed = await asyncio.gather(*(
+                warm_connection(config, pooled, queries) for _ in range(max(connections, 1))
+            ))
+            if not all(warmed):
+                logger.warning(f"Warmup stopped on {warmed.count(False)} of {len(warmed)} connection(s) to {host or config.DB_HOST}")
+        except Exception as e:
+            logger.warning(f"Failed to warm up queries on {host or config.DB_HOST}")
+            logger.exception(e)
+
+
+def warm_serialization() -> None:
+    for schema in REQUEST_SCHEMAS:
+        json_decoder(schema)
+
+    category = Category(id=MISSING_ID, image="", name="", description="")
+    entry = Entry(id=MISSING_ID, title="", description="", keywords="", links="", category_id=MISSING_ID, is_deleted=False)
+    json_encoder.encode(ListResponse(results=[category, entry]))
+    json_encoder.encode(CreateItemResponse(id=MISSING_ID))
+    encode_http_exception_bytes(NotFoundException())
+
+
+async def warmup(config: Config) -> None:
+    started = time.perf_counter()
+
+    warm_serialization()
+
+    try:
+        # Any call starts a worker
+        unsafe_perform_io(await password_pool.run(int)).unwrap()
+    except Exception as e:
+        logger.warning("Failed to start the password pool")
+        logger.exception(e)
+
+    try:
+        await asyncio.wait_for(warm_queries(config), config.WARMUP_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"Query warmup didn't finish in {config.WARMUP_TIMEOUT}s, serving without it")
+
+    logger.info(f"Warmed up in {(time.perf_counter() - started) * 1000:.0f} ms")
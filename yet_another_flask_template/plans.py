@@ -0,0 +1,294 @@
+"""Query plan regression checks.
+
+Runs every query function of `queries.py` against the database from
+`Config`, which should hold production-like data (see `seed.py`). Each statement they send
+is EXPLAINed first, with the same parameters, and everything is rolled back
+afterwards. The check fails on sequential scans of tables a query isn't
+expected to read whole, and, against a saved baseline, on estimated costs
+growing past a threshold. See the `explain` command in `cli.py`.
+
+`benchmarks/plans.json` is the baseline of a database migrated to head and
+filled by `yaft seed --users 100000 --categories 20000 --entries 1000000`.
+"""
+import json
+import random
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, NamedTuple, Sequence
+
+import msgspec
+from returns.future import FutureResult
+from sqlalchemy import Select, event, func, select
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import create_engine
+from yet_another_flask_template.errors import HttpException
+from yet_another_flask_template.modules.core.metadata import entry_table, user_table
+from yet_another_flask_template.modules.core.queries import (
+    bump_token_version,
+    change_user_password,
+    claim_jobs,
+    complete_job,
+    create_category_returning_id,
+    create_entries_returning_ids,
+    create_entry_returning_id,
+    create_user,
+    deactivate_user,
+    delete_entry_tombstones,
+    delete_stale_rate_buckets,
+    enqueue_job,
+    entries_scope,
+    fail_job,
+    get_categories,
+    get_category_tree,
+    get_entries,
+    get_list_version,
+    get_subtree_entries,
+    get_token_state,
+    get_user_by_id,
+    get_user_by_name,
+    retry_job,
+    search_entries,
+    soft_delete_entry,
+    take_rate_token,
+    update_category_by_id,
+)
+from yet_another_flask_template.modules.core.schemas import (
+    Job,
+    NewCategoryRequest,
+    NewEntryRequest,
+    NewJob,
+    PageQuery,
+    SearchQuery,
+    UpdateCategoryRequest,
+    UserModel,
+)
+
+DEFAULT_THRESHOLD = 0.5
+# Tables analyzed before the run, so the planner has fresh statistics
+ANALYZED_TABLES = ("education.user", "education.category", "education.entry", "education.list_version", "education.rate_limit", "education.job")
+
+
+class Sample(NamedTuple):
+    """Existing rows the queries are run with"""
+    category_id: int
+    entry_id: int
+    user_id: int
+    username: str
+
+
+@dataclass(frozen=True)
+class PlanContext:
+    db_conn: AsyncConnection
+    replica_conn: AsyncConnection
+    conf: Config
+
+
+@dataclass(frozen=True)
+class PlanCase:
+    name: str
+    run: Callable[[PlanContext, Sample], FutureResult[Any, HttpException]]
+    # Tables the query reads whole by design, or that are always tiny
+    seq_scan_allowed: frozenset[str] = frozenset()
+
+
+class StatementPlan(msgspec.Struct):
+    sql: str
+    total_cost: float
+    seq_scans: list[str]
+
+
+class PlanReport(msgspec.Struct):
+    created: float
+    cases: dict[str, list[StatementPlan]]
+
+
+@dataclass(frozen=True)
+class Problem:
+    case: str
+    sql: str
+    message: str
+
+
+def collect_cases() -> list[PlanCase]:
+    page = PageQuery(limit=50)
+    job = Job(id=0, kind="plan_check", payload=None, attempts=1, max_attempts=1)
+    category = NewCategoryRequest(image="plan.png", name="Plan check", description="Plan check")
+    entry = NewEntryRequest(title="Plan check", description="Plan check", links="https://example.com", keywords="plan")
+
+    return [
+        PlanCase("get_list_version", lambda ctx, s: get_list_version(ctx, entries_scope(s.category_id)), frozenset({"education.list_version"})),
+        PlanCase("create_category_returning_id", lambda ctx, s: create_category_returning_id(ctx, category), frozenset({"education.list_version"})),
+        PlanCase("get_categories", lambda ctx, s: get_categories(ctx, page)),
+        PlanCase("get_category_tree", lambda ctx, s: get_category_tree(ctx), frozenset({"education.category"})),
+        PlanCase(
+            "update_category_by_id",
+            lambda ctx, s: update_category_by_id(ctx, s.category_id, UpdateCategoryRequest(category.image, category.name, category.description, None)),
+            frozenset({"education.list_version"}),
+        ),
+        PlanCase("create_entry_returning_id", lambda ctx, s: create_entry_returning_id(ctx, s.category_id, entry), frozenset({"education.list_version"})),
+        # Statements sent as executemany are not EXPLAINed
+        PlanCase("create_entries_returning_ids", lambda ctx, s: create_entries_returning_ids(ctx, s.category_id, [entry, entry]), frozenset({"education.list_version"})),
+        PlanCase("get_entries", lambda ctx, s: get_entries(ctx, s.category_id, page)),
+        PlanCase("get_subtree_entries", lambda ctx, s: get_subtree_entries(ctx, s.category_id, page)),
+        # Seeded text has few distinct words, each matching most entries, so
+        # search the id from an entry's title to get a selective term
+        PlanCase("search_entries", lambda ctx, s: search_entries(ctx, SearchQuery(q=str(s.entry_id), limit=20))),
+        PlanCase("soft_delete_entry", lambda ctx, s: soft_delete_entry(ctx, s.category_id, s.entry_id), frozenset({"education.list_version"})),
+        PlanCase("delete_entry_tombstones", lambda ctx, s: delete_entry_tombstones(ctx, 0, 500)),
+        PlanCase("create_user", lambda ctx, s: create_user(ctx, UserModel("plan-check", "plan-check", "plan-check@example.com"))),
+        PlanCase("get_user_by_id", lambda ctx, s: get_user_by_id(ctx, s.user_id)),
+        PlanCase("get_token_state", lambda ctx, s: get_token_state(ctx, s.user_id)),
+        PlanCase("bump_token_version", lambda ctx, s: bump_token_version(ctx, s.user_id)),
+        PlanCase("change_user_password", lambda ctx, s: change_user_password(ctx, s.user_id, "plan-check")),
+        PlanCase("deactivate_user", lambda ctx, s: deactivate_user(ctx, s.user_id)),
+        PlanCase("get_user_by_name", lambda ctx, s: get_user_by_name(ctx, s.username)),
+        PlanCase("take_rate_token", lambda ctx, s: take_rate_token(ctx, "plan_check:127.0.0.1", 5, 1.0)),
+        # Only ever holds the buckets of the last day
+        PlanCase("delete_stale_rate_buckets", lambda ctx, s: delete_stale_rate_buckets(ctx, 24 * 60 * 60), frozenset({"education.rate_limit"})),
+        PlanCase("enqueue_job", lambda ctx, s: enqueue_job(ctx, NewJob("plan_check"))),
+        # Finished jobs are deleted, so the queue stays short
+        PlanCase("claim_jobs", lambda ctx, s: claim_jobs(ctx, 4, 300.0), frozenset({"education.job"})),
+        PlanCase("complete_job", lambda ctx, s: complete_job(ctx, job), frozenset({"education.job"})),
+        PlanCase("retry_job", lambda ctx, s: retry_job(ctx, job, 1.0, "plan check"), frozenset({"education.job"})),
+        PlanCase("fail_job", lambda ctx, s: fail_job(ctx, job, "plan check"), frozenset({"education.job"})),
+    ]
+
+
+def seq_scans(node: dict[str, Any]) -> list[str]:
+    found = [node["Relation Name"]] if node.get("Node Type") == "Seq Scan" else []
+    for child in node.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def is_explainable(sql: str) -> bool:
+    # Not e.g. SAVEPOINT, sent by `begin_nested`
+    return sql.lstrip().split(None, 1)[0].upper() in ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+
+def one_line(sql: str) -> str:
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+async def load_sample(conn: AsyncConnection, rng: random.Random | None = None) -> Sample:
+    """The first live entry and user, or ones at random ids with `rng`"""
+    async def first_from(stmt: Select, id_column: Any) -> Any:
+        start = 0
+        if rng is not None:
+            start = rng.randint(0, (await conn.execute(select(func.max(id_column)))).scalar() or 0)
+
+        row = (await conn.execute(stmt.where(id_column >= start).order_by(id_column).limit(1))).first()
+        if row is None and start:
+            row = (await conn.execute(stmt.order_by(id_column).limit(1))).first()
+        return row
+
+    entry = await first_from(
+        select(entry_table.c.category_id, entry_table.c.id).where(~entry_table.c.is_deleted, entry_table.c.category_id.is_not(None)),
+        entry_table.c.id,
+    )
+    user = await first_from(select(user_table.c.id, user_table.c.username), user_table.c.id)
+
+    if entry is None or user is None:
+        raise RuntimeError("The database has no entries or users, seed it first")
+
+    return Sample(entry.category_id, entry.id, user.id, user.username)
+
+
+async def explain_case(conn: AsyncConnection, config: Config, case: PlanCase, sample: Sample) -> list[StatementPlan]:
+    plans: list[StatementPlan] = []
+
+    def explain(connection: Any, cursor: Any, statement: str, parameters: Any, context: Any, executemany: bool) -> None:
+        if executemany or not is_explainable(statement):
+            return
+
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        plan = cursor.fetchall()[0][0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        root = plan[0]["Plan"]
+        plans.append(StatementPlan(one_line(statement), root["Total Cost"], seq_scans(root)))
+
+    transaction = await conn.begin()
+    event.listen(conn.sync_connection, "before_cursor_execute", explain)
+
+    try:
+        # Failures are fine as long as the statements ran, e.g. a taken username
+        await case.run(PlanContext(conn, conn, config), sample)
+    finally:
+        event.remove(conn.sync_connection, "before_cursor_execute", explain)
+        await transaction.rollback()
+
+    return plans
+
+
+async def run(config: Config, cases: Sequence[PlanCase], analyze: bool = True) -> PlanReport:
+    engine = create_engine(config).unwrap()
+    report = PlanReport(created=time.time(), cases={})
+
+    try:
+        async with engine.connect() as conn:
+            if analyze:
+                await conn.execution_options(isolation_level="AUTOCOMMIT")
+                for table in ANALYZED_TABLES:
+                    await conn.exec_driver_sql(f'ANALYZE "{table}"')
+
+        async with engine.connect() as conn:
+            sample = await load_sample(conn)
+            await conn.rollback()
+
+            for case in cases:
+                report.cases[case.name] = await explain_case(conn, config, case, sample)
+    finally:
+        await engine.dispose()
+
+    return report
+
+
+def unexpected_seq_scans(report: PlanReport, cases: Sequence[PlanCase]) -> list[Problem]:
+    allowed = {case.name: case.seq_scan_allowed for case in cases}
+
+    return [
+        Problem(name, plan.sql, f"Seq Scan on {table}")
+        for name, plans in report.cases.items()
+        for plan in plans
+        for table in plan.seq_scans
+        if table not in allowed.get(name, frozenset())
+    ]
+
+
+def cost_regressions(baseline: PlanReport, report: PlanReport, threshold: float = DEFAULT_THRESHOLD) -> list[Problem]:
+    """Statements estimated to cost more than `threshold` over the baseline's.
+
+    Statements are matched by their position in the case, a case sending a
+    different number of statements than before is reported as a whole.
+    """
+    problems: list[Problem] = []
+
+    for name, plans in report.cases.items():
+        old_plans = baseline.cases.get(name)
+        if old_plans is None:
+            continue
+
+        if len(old_plans) != len(plans):
+            problems.append(Problem(name, "", f"Sends {len(plans)} statement(s), {len(old_plans)} in the baseline"))
+            continue
+
+        for old, new in zip(old_plans, plans):
+            if old.total_cost and new.total_cost > old.total_cost * (1 + threshold):
+                problems.append(Problem(name, new.sql, f"Cost {old.total_cost:.2f} -> {new.total_cost:.2f}"))
+
+    return problems
+
+
+def save_report(report: PlanReport, path: str) -> None:
+    with open(path, "wb") as f:
+        f.write(msgspec.json.format(msgspec.json.encode(report)))
+
+
+def load_report(path: str) -> PlanReport:
+    with open(path, "rb") as f:
+        return msgspec.json.decode(f.read(), type=PlanReport)
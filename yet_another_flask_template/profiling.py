@@ -0,0 +1,100 @@
+"""cProfile of requests handled in-process, and import times of modules.
+
+The app runs with its startup and shutdown hooks against the database from
+`Config`. Only the event loop's thread is profiled, so bcrypt on the
+password pool shows up as waiting.
+
+Import times come from `python -X importtime` in a fresh interpreter, which
+is what every unit process pays before it serves.
+"""
+import cProfile
+import subprocess
+import sys
+from typing import Any, NamedTuple
+
+import msgspec
+
+from yet_another_flask_template.seed import SEED_PASSWORD
+
+
+class ImportTime(NamedTuple):
+    module: str
+    # Microseconds, cumulative includes the imports of the module
+    self_us: int
+    cumulative_us: int
+    # 0 for the imports of the profiled module itself
+    depth: int
+
+
+async def profile_requests(
+    method: str,
+    path: str,
+    body: Any = None,
+    requests: int = 100,
+    username: str | None = None,
+    password: str = SEED_PASSWORD,
+) -> cProfile.Profile:
+    """Signs in if `username` is set, warms up with one request, then profiles the rest"""
+    from yet_another_flask_template.app import app
+
+    headers = {"Content-Type": "application/json"}
+    data = None if body is None else msgspec.json.encode(body)
+    profiler = cProfile.Profile()
+
+    async with app.test_app() as test_app:
+        client = test_app.test_client()
+
+        if username is not None:
+            response = await client.post("/sign_in/", data=msgspec.json.encode({"username": username, "password": password}), headers=headers)
+            if response.status_code != 200:
+                raise RuntimeError(f"Signing in as {username} failed with {response.status_code}")
+
+        response = await client.open(path, method=method, data=data, headers=headers)
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {path} failed with {response.status_code}: {(await response.get_data())[:200]!r}")
+
+        profiler.enable()
+        try:
+            for _ in range(requests):
+                response = await client.open(path, method=method, data=data, headers=headers)
+                await response.get_data()
+        finally:
+            profiler.disable()
+
+    return profiler
+
+
+def import_times(module: str) -> list[ImportTime]:
+    """Modules imported by `module`, in the order their imports finished"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: list[ImportTime] = []
+
+    # Lines look like "import time:       312 |       1045 |   quart.app"
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        if not self_us.strip().isdigit():
+            continue
+
+        indent = len(name) - len(name.lstrip())
+        times.append(ImportTime(name.strip(), int(self_us), int(cumulative_us), (indent - 1) // 2))
+
+    return times
+
+
+def top_level_times(times: list[ImportTime]) -> dict[str, int]:
+    """Self times summed per top-level package, e.g. all of `sqlalchemy`"""
+    packages: dict[str, int] = {}
+
+    for t in times:
+        package = t.module.partition(".")[0]
+        packages[package] = packages.get(package, 0) + t.self_us
+
+    return packages
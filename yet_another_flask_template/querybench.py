@@ -0,0 +1,80 @@
+"""Latency of the query functions against a real database.
+
+Runs the cases of `plans.py`, with rows picked at random from the database
+(see `seed.py`), every call in a transaction that is rolled back, so writes
+can be measured too without changing the data.
+"""
+import random
+import statistics
+import time
+from typing import Callable, Sequence
+
+import msgspec
+
+from yet_another_flask_template.config import Config
+from yet_another_flask_template.database import create_engine
+from yet_another_flask_template.loadtest import percentile
+from yet_another_flask_template.plans import PlanCase, PlanContext, load_sample
+
+
+class QueryStats(msgspec.Struct):
+    calls: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+
+
+def make_stats(seconds: Sequence[float]) -> QueryStats:
+    latencies = sorted(s * 1000 for s in seconds)
+    return QueryStats(
+        calls=len(latencies),
+        mean_ms=statistics.fmean(latencies),
+        p50_ms=percentile(latencies, 50),
+        p95_ms=percentile(latencies, 95),
+        p99_ms=percentile(latencies, 99),
+        max_ms=latencies[-1],
+    )
+
+
+async def run(
+    config: Config,
+    cases: Sequence[PlanCase],
+    calls: int,
+    samples: int = 20,
+    seed: int = 0,
+    on_result: Callable[[str, QueryStats], None] = lambda name, stats: None,
+) -> dict[str, QueryStats]:
+    rng = random.Random(seed)
+    engine = create_engine(config).unwrap()
+    results: dict[str, QueryStats] = {}
+
+    try:
+        async with engine.connect() as conn:
+            sample_rows = [await load_sample(conn, rng) for _ in range(samples)]
+            await conn.rollback()
+            ctx = PlanContext(conn, conn, config)
+
+            for case in cases:
+                seconds: list[float] = []
+
+                # The first call prepares the statements
+                for i in range(calls + 1):
+                    transaction = await conn.begin()
+                    started = time.perf_counter()
+                    try:
+                        await case.run(ctx, sample_rows[i % len(sample_rows)])
+                    finally:
+                        elapsed = time.perf_counter() - started
+                        await transaction.rollback()
+
+                    if i:
+                        seconds.append(elapsed)
+
+                results[case.name] = make_stats(seconds)
+                on_result(case.name, results[case.name])
+    finally:
+        await engine.dispose()
+
+    return results
@@ -0,0 +1,167 @@
+"""Production-scale fake data for local databases.
+
+Rows are written with COPY through a plain asyncpg connection, in a single
+transaction. Ids continue after the existing rows and the id sequences are
+moved past the new ones, so the app keeps inserting as usual afterwards.
+
+Seeded users are named `seed-<id>` and all sign in with `SEED_PASSWORD`.
+"""
+import random
+from bisect import bisect
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Callable, Iterator
+
+import asyncpg  # type: ignore
+from returns.unsafe import unsafe_perform_io
+
+from yet_another_flask_template.config import Config
+
+SEED_PASSWORD = "seed-password"
+# Categories are roots this often, the others hang under an earlier one
+ROOT_SHARE = 0.02
+DELETED_SHARE = 0.01
+# Popularity of categories falls off like rank ** -CATEGORY_SKEW
+CATEGORY_SKEW = 0.8
+
+WORDS = (
+    "python", "postgres", "quart", "msgspec", "asyncio", "index", "query", "cache", "pool", "latency",
+    "stream", "cursor", "json", "schema", "migration", "replica", "token", "worker", "queue", "profile",
+    "tree", "search", "vector", "lock", "vacuum", "plan", "batch", "copy", "benchmark", "deploy",
+)
+
+
+@dataclass(frozen=True)
+class SeedContext:
+    conf: Config
+
+
+@dataclass(frozen=True)
+class SeedSize:
+    users: int
+    categories: int
+    entries: int
+    # Levels of the category tree, 1 for flat
+    depth: int
+    seed: int = 0
+
+
+def words(rng: random.Random, count: int) -> str:
+    return " ".join(rng.choices(WORDS, k=count))
+
+
+def user_rows(start: int, count: int, password: str) -> Iterator[tuple]:
+    joined = datetime.utcnow()
+    for id_ in range(start, start + count):
+        yield (id_, f"seed-{id_}", password, f"seed-{id_}@example.com", False, True, 0, joined)
+
+
+def category_parents(count: int, depth: int, rng: random.Random) -> list[int | None]:
+    """Parents by position in the batch, each parent comes before its children"""
+    parents: list[int | None] = []
+    levels: list[int] = []
+    # Positions of the categories that may still get children
+    open_parents: list[int] = []
+
+    for i in range(count):
+        if not open_parents or rng.random() < ROOT_SHARE:
+            parent, level = None, 0
+        else:
+            parent = rng.choice(open_parents)
+            level = levels[parent] + 1
+
+        parents.append(parent)
+        levels.append(level)
+        if level < depth - 1:
+            open_parents.append(i)
+
+    return parents
+
+
+def category_rows(start: int, count: int, depth: int, rng: random.Random) -> Iterator[tuple]:
+    for i, parent in enumerate(category_parents(count, depth, rng)):
+        yield (
+            start + i,
+            f"category-{start + i}.png",
+            f"Category {start + i} {words(rng, 2)}"[:120],
+            words(rng, rng.randint(5, 20)),
+            None if parent is None else start + parent,
+        )
+
+
+def entry_rows(start: int, count: int, category_start: int, categories: int, rng: random.Random) -> Iterator[tuple]:
+    cum_weights = list(accumulate(1 / (rank + 1) ** CATEGORY_SKEW for rank in range(categories)))
+    total = cum_weights[-1]
+    now = datetime.now(timezone.utc)
+
+    for id_ in range(start, start + count):
+        category_id = category_start + bisect(cum_weights, rng.random() * total)
+        deleted = rng.random() < DELETED_SHARE
+        yield (
+            id_,
+            f"Entry {id_} {words(rng, 3)}"[:120],
+            words(rng, rng.randint(10, 40)),
+            words(rng, rng.randint(1, 3)),
+            f"https://example.com/{id_}",
+            min(category_id, category_start + categories - 1),
+            deleted,
+            now - timedelta(days=rng.uniform(0, 60)) if deleted else None,
+        )
+
+
+async def next_id(conn: asyncpg.Connection, table: str) -> int:
+    return await conn.fetchval(f'SELECT coalesce(max(id), 0) + 1 FROM "{table}"')
+
+
+async def hashed_seed_password(config: Config) -> str:
+    from yet_another_flask_template.modules.core.auth import password_pool, secure_password
+
+    try:
+        return unsafe_perform_io(await secure_password(SeedContext(config), SEED_PASSWORD)).unwrap()
+    finally:
+        password_pool.shutdown()
+
+
+async def seed(config: Config, size: SeedSize, on_table: Callable[[str, int], None] = lambda table, rows: None) -> None:
+    rng = random.Random(size.seed)
+    password = await hashed_seed_password(config)
+    dsn = config.db_url().set(drivername="postgresql").render_as_string(hide_password=False)
+    conn = await asyncpg.connect(dsn)
+
+    try:
+        async with conn.transaction():
+            user_start = await next_id(conn, "education.user")
+            await conn.copy_records_to_table(
+                "education.user",
+                columns=["id", "username", "password", "email", "is_superuser", "is_active", "token_version", "date_joined"],
+                records=user_rows(user_start, size.users, password),
+            )
+            on_table("education.user", size.users)
+
+            category_start = await next_id(conn, "education.category")
+            await conn.copy_records_to_table(
+                "education.category",
+                columns=["id", "image", "name", "description", "parent_id"],
+                records=category_rows(category_start, size.categories, size.depth, rng),
+            )
+            on_table("education.category", size.categories)
+
+            entry_start = await next_id(conn, "education.entry")
+            await conn.copy_records_to_table(
+                "education.entry",
+                columns=["id", "title", "description", "keywords", "links", "category_id", "is_deleted", "deleted_at"],
+                records=entry_rows(entry_start, size.entries, category_start, size.categories, rng),
+            )
+            on_table("education.entry", size.entries)
+
+            # Listings changed under clients' cached ETags
+            await conn.execute('UPDATE "education.list_version" SET version = version + 1')
+
+            for table in ("education.user", "education.category", "education.entry"):
+                await conn.execute(f"SELECT setval(pg_get_serial_sequence('\"{table}\"', 'id'), (SELECT max(id) FROM \"{table}\"))")
+
+        for table in ("education.user", "education.category", "education.entry"):
+            await conn.execute(f'ANALYZE "{table}"')
+    finally:
+        await conn.close()
@@ -1,7 +1,10 @@
-from typing import Type, TypeVar, Any, Union, cast
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Generic, Type, TypeVar, Any, Union, cast
 
 import msgspec
-from quart import Request
+from quart import Request, Response
 from quart.json.provider import JSONProvider
 from returns.curry import curry
 from returns.result import Result
@@ -10,20 +13,66 @@ from returns.pointfree import bind_result
 from returns.pipeline import flow
 
 from yet_another_flask_template.errors import HttpException, RequestTimedOut, ValidationFailed, server_exception, ExceptionResponse
+from yet_another_flask_template.metrics import timed
 from yet_another_flask_template.types import T_msg
 
 T = TypeVar("T")
 
+JSON_MIMETYPE = "application/json"
+
+# Encoders and decoders are thread-safe, so they are shared by the whole process
+json_encoder = msgspec.json.Encoder()
+
+
+@lru_cache(maxsize=None)
+def json_decoder(schema: Type[T]) -> Callable[[bytes], Result[T, HttpException]]:
+    """Typed decoder for the schema, built once per schema"""
+    decode = msgspec.json.Decoder(schema).decode
+
+    def decoder(value: bytes) -> Result[T, HttpException]:
+        try:
+            return Result.from_value(decode(value))
+        except msgspec.DecodeError as e:
+            # Malformed JSON as well as a schema mismatch (`ValidationError`)
+            return Result.from_failure(ValidationFailed(description=str(e)))
+        except Exception as e:
+            return Result.from_failure(server_exception(e))
+
+    return decoder
+
 
 @curry
 def decode_json(schema: Type[T], value: bytes) -> Result[T, HttpException]:
     """Decodes value into result"""
+    return json_decoder(schema)(value)
+
+
+def decode_json_items(
+    schema: Type[T],
+    value: bytes,
+    ndjson: bool = False,
+    max_items: int | None = None,
+) -> Result[list[Result[T, HttpException]], HttpException]:
+    """Decodes a JSON array (or NDJSON lines) keeping a result per item.
+
+    Items are counted against `max_items` before any of them is decoded.
+    Splitting the array into raw items only scans it, each item is then
+    decoded once into `schema`.
+    """
     try:
-        return Result.from_value(msgspec.json.decode(value, type=schema))
-    except msgspec.ValidationError as e:
+        items = (
+            [line for line in value.splitlines() if line.strip()]
+            if ndjson
+            else msgspec.json.decode(value, type=list[msgspec.Raw])
+        )
+    except msgspec.DecodeError as e:
         return Result.from_failure(ValidationFailed(description=str(e)))
-    except Exception as e:
-        return Result.from_failure(server_exception(e))
+
+    if max_items is not None and len(items) > max_items:
+        return Result.from_failure(ValidationFailed(description=f"At most {max_items} items per request"))
+
+    decode = json_decoder(schema)
+    return Result.from_value([decode(item) for item in items])
 
 
 def encode_json_typed(obj: msgspec.Struct) -> dict:
@@ -34,6 +83,19 @@ def encode_list_typed(items: list[T_msg]) -> list:
     return [msgspec.to_builtins(i) for i in items]
 
 
+async def stream_list_response(chunks: AsyncIterator[list[T_msg]]) -> AsyncIterator[bytes]:
+    """Writes `ListResponse`-shaped JSON as item chunks arrive"""
+    yield b'{"results":['
+    separator = b""
+
+    async for chunk in chunks:
+        if chunk:
+            yield separator + b",".join(json_encoder.encode(item) for item in chunk)
+            separator = b","
+
+    yield b'],"next_cursor":null}'
+
+
 def encode_http_exception(exc: HttpException) -> ExceptionResponse:
     return ExceptionResponse(
         error_code = exc.error_code,
@@ -41,6 +103,32 @@ def encode_http_exception(exc: HttpException) -> ExceptionResponse:
     )
 
 
+@lru_cache(maxsize=256)
+def encode_http_exception_bytes(exc: HttpException) -> bytes:
+    """Error payloads are mostly the same few constants, so they are encoded once"""
+    return json_encoder.encode(encode_http_exception(exc))
+
+
+@dataclass(frozen=True)
+class WithHeaders(Generic[T]):
+    """Handler result to be sent with extra headers.
+
+    Keeps the encoding out of the handler, which runs while a connection is
+    still checked out.
+    """
+    value: T
+    headers: dict[str, str]
+
+
+def json_response(obj: Any, status: int = 200, headers: dict[str, str] | None = None) -> Response:
+    """Encodes straight into the response body, skipping the JSON provider"""
+    return Response(json_encoder.encode(obj), status=status, headers=headers, mimetype=JSON_MIMETYPE)
+
+
+def http_exception_response(exc: HttpException) -> Response:
+    return Response(encode_http_exception_bytes(exc), status=exc.status_code, mimetype=JSON_MIMETYPE, headers=exc.headers())
+
+
 class MsgSpecRequest(Request): 
     def get_data_safe(self, cache: bool = False) -> FutureResult[bytes, HttpException]:
         @future_safe
@@ -50,15 +138,21 @@ class MsgSpecRequest(Request):
         return safe_wrapper().alt(lambda _: RequestTimedOut())
  
     def get_json_typed(self, schema: Type[T], cache: bool = False) -> FutureResult[T, HttpException]:
+        decode = json_decoder(schema)
+
+        def timed_decode(data: bytes) -> Result[T, HttpException]:
+            with timed("decode"):
+                return decode(data)
+
         return flow(
             self.get_data_safe(cache=cache),
-            bind_result(decode_json(schema)),
+            bind_result(timed_decode),
         )
 
 
 class MsgSpecJSONProvider(JSONProvider):
     def dumps(self, object_: Any, **kwargs: Any) -> str:
-        return msgspec.json.encode(object_).decode()
+        return json_encoder.encode(object_).decode()
 
     def loads(self, object_: Union[str, bytes], **kwargs: Any) -> Any:
         raise Exception("This method shouldn't be called")
@@ -13,6 +13,6 @@ T_msg = TypeVar("T_msg", bound=msgspec.Struct)
 
 P = ParamSpec("P")
 
-QuartResponse = FutureResult[T_msg, HttpException]
+QuartResponse = FutureResult[T_msg | Response, HttpException]
 QuartRealResponse = Awaitable[tuple[Response, int]]
 
@@ -0,0 +1,79 @@
+"""Offloading of CPU-bound work from the event loop."""
+import asyncio
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, TypeVar
+
+from returns.future import FutureResult
+from returns.result import Failure, Result, Success
+
+from yet_another_flask_template.errors import HttpException, ServiceOverloaded, server_exception
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """Runs blocking functions on a shared pool with a cap on pending calls.
+
+    `workers` limits how many calls run at once, `max_queue` limits how many
+    may be running or waiting; calls above that fail with `ServiceOverloaded`
+    right away instead of piling up behind the pool.
+    """
+
+    def __init__(self, kind: str, workers: int, max_queue: int) -> None:
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.kind = kind
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor: Executor | None = None
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = (
+                    ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="yaft-worker")
+                    if self.kind == "thread"
+                    else ProcessPoolExecutor(max_workers=self.workers)
+                )
+            return self._executor
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self.pending >= self.max_queue:
+                return False
+            self.pending += 1
+            return True
+
+    def _release(self) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    async def _run(self, fn: Callable[..., T], *args: Any) -> Result[T, HttpException]:
+        if not self._acquire():
+            return Failure(ServiceOverloaded())
+
+        try:
+            loop = asyncio.get_running_loop()
+            value = await loop.run_in_executor(self._get_executor(), partial(fn, *args))
+        except Exception as e:
+            return Failure(server_exception(e))
+        finally:
+            self._release()
+
+        return Success(value)
+
+    def run(self, fn: Callable[..., T], *args: Any) -> FutureResult[T, HttpException]:
+        """Function and arguments must be picklable for the process pool"""
+        return FutureResult(self._run(fn, *args))
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)